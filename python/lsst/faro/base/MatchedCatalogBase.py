@@ -23,9 +23,10 @@ import lsst.afw.table as afwTable
 import lsst.pipe.base as pipeBase
 import lsst.pex.config as pexConfig
 import lsst.geom as geom
-from lsst.utils.logging import PeriodicLogger
 import numpy as np
 
+from lsst.faro.utils.matched_table import matchedCatalogToTable
+from lsst.faro.utils.kdtree_matcher import ambiguousObjects
 from lsst.faro.utils.matcher import matchCatalogs
 
 __all__ = (
@@ -62,6 +63,16 @@ class MatchedBaseConnections(
         dimensions=("skymap",),
     )
 
+    def __init__(self, *, config=None):
+        super().__init__(config=config)
+        if not config.doWriteTable and "outputTable" in self.outputs:
+            self.outputs.remove("outputTable")
+        if not config.doIncremental:
+            if "previousCatalog" in self.inputs:
+                self.inputs.remove("previousCatalog")
+            if "outputState" in self.outputs:
+                self.outputs.remove("outputState")
+
 
 class MatchedBaseConfig(
     pipeBase.PipelineTaskConfig, pipelineConnections=MatchedBaseConnections
@@ -86,6 +97,67 @@ class MatchedBaseConfig(
     selectExtended = pexConfig.Field(
         doc="Whether to select extended sources", dtype=bool, default=False
     )
+    matcher = pexConfig.ChoiceField(
+        doc="Backend matching the sources of the visits into objects.",
+        dtype=str,
+        default="multiMatch",
+        allowed={
+            "multiMatch": "lsst.afw.table.MultiMatch, matching against the first source of each object.",
+            "kdTree": "k-d tree of the object centroids, as unit vectors, queried once per catalog; "
+            "records are only mapped to the output schema when the match is finished.",
+        },
+    )
+    matchCellSize = pexConfig.Field(
+        doc="Size in pixels of the square cells in which the sources are matched separately, "
+        "each with a margin of match_radius, before stitching the objects across the cells. "
+        "With 0, all the sources are matched at once.",
+        dtype=int,
+        default=0,
+        check=lambda n: n >= 0,
+    )
+    doWriteTable = pexConfig.Field(
+        doc="Also write the matched catalog as a table sorted by object ID, persisted as Parquet, "
+        "from which the measurement tasks can read only the columns they need, e.g. "
+        "TractMatchedTableMeasurementTask.",
+        dtype=bool,
+        default=False,
+    )
+    doIncremental = pexConfig.Field(
+        doc="Also write the state of the match, the untrimmed matched catalog with its ambiguous "
+        "objects (outputState), and, if the state of an earlier run with the same configuration is "
+        "given as previousCatalog, only match the visits and detectors that are not in it, against "
+        "its objects. The matched catalog is then the same as when matching all the visits at once, "
+        "provided the new visits come after the earlier ones. As a task cannot read and write the "
+        "same dataset type, the earlier state must be read under a different name than the one "
+        "written, e.g. by setting connections.previousCatalog to the outputState name of the earlier "
+        "run. Requires the kdTree matcher.",
+        dtype=bool,
+        default=False,
+    )
+    numWorkers = pexConfig.Field(
+        doc="Number of workers preparing the per-detector catalogs before matching, "
+        "and matching the cells if matchCellSize is not 0. "
+        "With 1, the catalogs are prepared serially.",
+        dtype=int,
+        default=1,
+        check=lambda n: n >= 1,
+    )
+    workerPoolType = pexConfig.ChoiceField(
+        doc="Type of the pool of workers preparing the per-detector catalogs.",
+        dtype=str,
+        default="thread",
+        allowed={
+            "thread": "Threads sharing the input catalogs; no copies are made.",
+            "process": "Processes; the catalogs and calibrations are pickled to and from "
+            "the workers, but the preparation is not limited by the GIL.",
+        },
+    )
+
+    def validate(self):
+        super().validate()
+        if self.doIncremental and self.matcher != "kdTree":
+            msg = "Incremental matching requires the kdTree matcher."
+            raise pexConfig.FieldValidationError(MatchedBaseConfig.doIncremental, self, msg)
 
 
 class MatchedBaseTask(pipeBase.PipelineTask):
@@ -106,32 +178,107 @@ class MatchedBaseTask(pipeBase.PipelineTask):
         dataIds,
         wcs,
         box,
+        previousCatalog=None,
     ):
         self.log.info("Running catalog matching")
-        periodicLog = PeriodicLogger(self.log)
         radius = geom.Angle(self.radius, geom.arcseconds)
-        if len(sourceCatalogs) < 2:
+        if previousCatalog is not None and len(previousCatalog) == 0:
+            previousCatalog = None
+        if previousCatalog is not None:
+            sourceCatalogs, photoCalibs, astromCalibs, dataIds = self.selectNewInputs(
+                previousCatalog, sourceCatalogs, photoCalibs, astromCalibs, dataIds
+            )
+            self.log.info("%s new input catalogs to match with %s previously matched sources.",
+                          len(sourceCatalogs), len(previousCatalog))
+        if previousCatalog is not None and len(sourceCatalogs) == 0:
+            matched = previousCatalog
+        elif previousCatalog is None and len(sourceCatalogs) < 2:
             self.log.warning("%s valid input catalogs: ", len(sourceCatalogs))
-            out_matched = afwTable.SimpleCatalog()
+            matched = None
         else:
-            srcvis, matched = matchCatalogs(
+            _, matched = matchCatalogs(
                 sourceCatalogs, photoCalibs, astromCalibs, dataIds, radius,
-                self.config, logger=self.log
+                self.config, logger=self.log, wcs=wcs, box=box, keepSources=False,
+                previousMatched=previousCatalog,
+                removeAmbiguous=not self.config.doIncremental,
             )
             self.log.verbose("Finished matching catalogs.")
 
+        if matched is None:
+            state = out_matched = afwTable.SimpleCatalog()
+        else:
             # Trim the output to the patch bounding box
-            out_matched = type(matched)(matched.schema)
             self.log.info("%s sources in matched catalog.", len(matched))
-            for record_index, record in enumerate(matched):
-                if box.contains(wcs.skyToPixel(record.getCoord())):
-                    out_matched.append(record)
-                periodicLog.log("Checked %d records for trimming out of %d.", record_index + 1, len(matched))
+            if not matched.isContiguous():
+                matched = matched.copy(deep=True)
+            state = matched
+            selected = self.inBox(matched, wcs, box)
+            if self.config.doIncremental:
+                # The state of the match keeps the ambiguous objects, so that
+                # they are found again when matching more visits
+                selected &= ~np.isin(matched["object"], ambiguousObjects(matched))
+            out_matched = matched[selected].copy(deep=True)
 
             self.log.info(
                 "%s sources when trimmed to %s boundaries.", len(out_matched), self.level
             )
-        return pipeBase.Struct(outputCatalog=out_matched)
+        outputs = pipeBase.Struct(outputCatalog=out_matched)
+        if self.config.doIncremental:
+            outputs.outputState = state
+        if self.config.doWriteTable:
+            outputs.outputTable = matchedCatalogToTable(out_matched)
+        return outputs
+
+    @staticmethod
+    def selectNewInputs(previousCatalog, sourceCatalogs, photoCalibs, astromCalibs, dataIds):
+        """Select the input catalogs that are not in a previously matched
+        catalog.
+
+        Parameters
+        ----------
+        previousCatalog : `lsst.afw.table.SimpleCatalog`
+            Previously matched catalog, with ``visit`` and ``detector``
+            fields.
+        sourceCatalogs, photoCalibs, astromCalibs, dataIds : `list`
+            Inputs of `run`.
+
+        Returns
+        -------
+        sourceCatalogs, photoCalibs, astromCalibs, dataIds : `list`
+            Inputs whose visit and detector are not in ``previousCatalog``.
+        """
+        if not previousCatalog.isContiguous():
+            previousCatalog = previousCatalog.copy(deep=True)
+        matched = set(zip(previousCatalog["visit"].tolist(), previousCatalog["detector"].tolist()))
+        new = [i for i, dataId in enumerate(dataIds)
+               if (dataId["visit"], dataId["detector"]) not in matched]
+        return tuple([inputs[i] for i in new]
+                     for inputs in (sourceCatalogs, photoCalibs, astromCalibs, dataIds))
+
+    @staticmethod
+    def inBox(catalog, wcs, box):
+        """Select the records of a catalog within a bounding box.
+
+        Parameters
+        ----------
+        catalog : `lsst.afw.table.SimpleCatalog`
+            Contiguous catalog with ``coord_ra`` and ``coord_dec`` fields.
+        wcs : `lsst.afw.geom.SkyWcs`
+            WCS of the pixel coordinates of the box.
+        box : `lsst.geom.Box2D`
+            Bounding box.
+
+        Returns
+        -------
+        inBox : `numpy.array` [`bool`]
+            Whether the position of each record is in the box, with the
+            half-open convention of `lsst.geom.Box2D.contains`.
+        """
+        x, y = wcs.skyToPixelArray(catalog["coord_ra"], catalog["coord_dec"], degrees=False)
+        return (
+            (x >= box.getMinX()) & (x < box.getMaxX())
+            & (y >= box.getMinY()) & (y < box.getMaxY())
+        )
 
     def get_box_wcs(self, skymap, oid):
         tract_info = skymap.generateTract(oid["tract"])
@@ -155,13 +302,14 @@ class MatchedBaseTask(pipeBase.PipelineTask):
         inputs["box"] = box
         visitSummary = inputs.pop("visitSummary")
 
-        flatVisitSummaryList = np.hstack(visitSummary)
-        visitSummaryVisitIdList = np.array(
-            [calib["visit"] for calib in flatVisitSummaryList]
-        )
-        visitSummaryDetectorIdList = np.array(
-            [calib["id"] for calib in flatVisitSummaryList]
-        )
+        # Index the visit summary rows by (visit, detector); the calibrations
+        # are only read for the rows used by the input catalogs.
+        summaryRows = {}
+        for summary in visitSummary:
+            if not summary.isContiguous():
+                summary = summary.copy(deep=True)
+            for index, key in enumerate(zip(summary["visit"].tolist(), summary["id"].tolist())):
+                summaryRows.setdefault(key, (summary, index))
 
         remove_indices = []
         inputs["photoCalibs"] = [None] * len(inputs["dataIds"])
@@ -171,10 +319,8 @@ class MatchedBaseTask(pipeBase.PipelineTask):
             dataId = inputs["dataIds"][i]
             detector = dataId["detector"]
             visit = dataId["visit"]
-            row_find = (visitSummaryVisitIdList == visit) & (
-                visitSummaryDetectorIdList == detector
-            )
-            if np.sum(row_find) < 1:
+            found = summaryRows.get((visit, detector))
+            if found is None:
                 self.log.warning("Detector id %s not found in visit summary "
                                  "for visit %s and will not be used.",
                                  detector, visit)
@@ -182,9 +328,10 @@ class MatchedBaseTask(pipeBase.PipelineTask):
                 inputs["astromCalibs"][i] = None
                 remove_indices.append(i)
             else:
-                row = flatVisitSummaryList[row_find]
-                inputs["photoCalibs"][i] = row[0].getPhotoCalib()
-                inputs["astromCalibs"][i] = row[0].getWcs()
+                summary, index = found
+                row = summary[index]
+                inputs["photoCalibs"][i] = row.getPhotoCalib()
+                inputs["astromCalibs"][i] = row.getWcs()
 
         # Remove datasets that didn't have matching external calibs
         remove_indices = np.unique(np.array(remove_indices))
@@ -0,0 +1,337 @@
+# This file is part of faro.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+
+import lsst.pipe.base as pipeBase
+import lsst.pex.config as pexConfig
+from lsst.verify.tasks import MetricComputationError
+
+from lsst.faro.base.CatalogMeasurementBase import CatalogMeasurementBaseTask
+from lsst.faro.measurement.MatchedCatalogMeasurementTasks import (
+    PA1Task,
+    PF1Task,
+    AMxTask,
+    ADxTask,
+    AFxTask,
+    ModelPhotRepTask,
+)
+from lsst.faro.utils.matched_cache import getMatchedCatalogCache
+
+__all__ = (
+    "TractMatchedFusedMeasurementConnections",
+    "TractMatchedFusedMeasurementConfig",
+    "TractMatchedFusedMeasurementTask",
+)
+
+# Metrics computed by TractMatchedFusedMeasurementTask, as in
+# pipelines/measurement/measurement_matched.yaml. Each entry gives the label
+# of the metric, which is also the name of its output connection, the name of
+# the metric and the input connection of the matched catalog it is measured
+# on. The measurement subtask of each metric is the config field
+# "measure_" + label.
+_METRICS = (
+    ("PA1", "PA1", "matchedCatalog"),
+    ("PF1_design", "PF1_design_gri", "matchedCatalog"),
+    ("AM1", "AM1", "matchedCatalogAstrom"),
+    ("AM2", "AM2", "matchedCatalogAstrom"),
+    ("AM3", "AM3", "matchedCatalogAstrom"),
+    ("AD1_design", "AD1_design", "matchedCatalogAstrom"),
+    ("AD2_design", "AD2_design", "matchedCatalogAstrom"),
+    ("AD3_design", "AD3_design", "matchedCatalogAstrom"),
+    ("AF1_design", "AF1_design", "matchedCatalogAstrom"),
+    ("AF2_design", "AF2_design", "matchedCatalogAstrom"),
+    ("AF3_design", "AF3_design", "matchedCatalogAstrom"),
+    ("modelPhotRepGal1", "modelPhotRepGal1", "matchedCatalogGalaxies"),
+    ("modelPhotRepGal2", "modelPhotRepGal2", "matchedCatalogGalaxies"),
+    ("modelPhotRepGal3", "modelPhotRepGal3", "matchedCatalogGalaxies"),
+    ("modelPhotRepGal4", "modelPhotRepGal4", "matchedCatalogGalaxies"),
+    ("modelPhotRepStar1", "modelPhotRepStar1", "matchedCatalogStars"),
+    ("modelPhotRepStar2", "modelPhotRepStar2", "matchedCatalogStars"),
+    ("modelPhotRepStar3", "modelPhotRepStar3", "matchedCatalogStars"),
+    ("modelPhotRepStar4", "modelPhotRepStar4", "matchedCatalogStars"),
+    ("psfPhotRepStar1", "psfPhotRepStar1", "matchedCatalogStars"),
+    ("psfPhotRepStar2", "psfPhotRepStar2", "matchedCatalogStars"),
+    ("psfPhotRepStar3", "psfPhotRepStar3", "matchedCatalogStars"),
+    ("psfPhotRepStar4", "psfPhotRepStar4", "matchedCatalogStars"),
+)
+
+
+def _matchedCatalogInput(name):
+    return pipeBase.connectionTypes.Input(
+        doc="Input matched catalog.",
+        dimensions=("tract", "instrument", "band"),
+        storageClass="SimpleCatalog",
+        name=name,
+    )
+
+
+def _metricOutput(metric):
+    return pipeBase.connectionTypes.Output(
+        doc=f"Measured value of the {metric} metric.",
+        dimensions=("tract", "instrument", "band"),
+        storageClass="MetricValue",
+        name=f"metricvalue_{{package}}_{metric}",
+    )
+
+
+class TractMatchedFusedMeasurementConnections(
+    pipeBase.PipelineTaskConnections,
+    dimensions=("tract", "instrument", "band", "skymap"),
+    defaultTemplates={"package": "validate_drp"},
+):
+    matchedCatalog = _matchedCatalogInput("matchedCatalogTract")
+    matchedCatalogAstrom = _matchedCatalogInput("matchedCatalogTractMag17to21p5")
+    matchedCatalogGalaxies = _matchedCatalogInput("matchedCatalogTractGxsSNR5to80")
+    matchedCatalogStars = _matchedCatalogInput("matchedCatalogTractStarsSNR5to80")
+
+    PA1 = _metricOutput("PA1")
+    PF1_design = _metricOutput("PF1_design_gri")
+    AM1 = _metricOutput("AM1")
+    AM2 = _metricOutput("AM2")
+    AM3 = _metricOutput("AM3")
+    AD1_design = _metricOutput("AD1_design")
+    AD2_design = _metricOutput("AD2_design")
+    AD3_design = _metricOutput("AD3_design")
+    AF1_design = _metricOutput("AF1_design")
+    AF2_design = _metricOutput("AF2_design")
+    AF3_design = _metricOutput("AF3_design")
+    modelPhotRepGal1 = _metricOutput("modelPhotRepGal1")
+    modelPhotRepGal2 = _metricOutput("modelPhotRepGal2")
+    modelPhotRepGal3 = _metricOutput("modelPhotRepGal3")
+    modelPhotRepGal4 = _metricOutput("modelPhotRepGal4")
+    modelPhotRepStar1 = _metricOutput("modelPhotRepStar1")
+    modelPhotRepStar2 = _metricOutput("modelPhotRepStar2")
+    modelPhotRepStar3 = _metricOutput("modelPhotRepStar3")
+    modelPhotRepStar4 = _metricOutput("modelPhotRepStar4")
+    psfPhotRepStar1 = _metricOutput("psfPhotRepStar1")
+    psfPhotRepStar2 = _metricOutput("psfPhotRepStar2")
+    psfPhotRepStar3 = _metricOutput("psfPhotRepStar3")
+    psfPhotRepStar4 = _metricOutput("psfPhotRepStar4")
+
+    def __init__(self, *, config=None):
+        super().__init__(config=config)
+        metrics = set(config.metrics)
+        for label, _, _ in _METRICS:
+            if label not in metrics:
+                self.outputs.remove(label)
+        inputs = {inputName for label, _, inputName in _METRICS if label in metrics}
+        for inputName in ("matchedCatalog", "matchedCatalogAstrom",
+                          "matchedCatalogGalaxies", "matchedCatalogStars"):
+            if inputName not in inputs:
+                self.inputs.remove(inputName)
+
+
+class TractMatchedFusedMeasurementConfig(
+    pipeBase.PipelineTaskConfig, pipelineConnections=TractMatchedFusedMeasurementConnections
+):
+    """Configuration for TractMatchedFusedMeasurementTask."""
+
+    metrics = pexConfig.ListField(
+        doc="Labels of the metrics to compute.",
+        dtype=str,
+        default=[label for label, _, _ in _METRICS],
+        itemCheck=lambda label: label in {entry[0] for entry in _METRICS},
+    )
+
+    measure_PA1 = pexConfig.ConfigurableField(
+        target=PA1Task, doc="Measure task for PA1"
+    )
+    measure_PF1_design = pexConfig.ConfigurableField(
+        target=PF1Task, doc="Measure task for PF1_design"
+    )
+    measure_AM1 = pexConfig.ConfigurableField(
+        target=AMxTask, doc="Measure task for AM1"
+    )
+    measure_AM2 = pexConfig.ConfigurableField(
+        target=AMxTask, doc="Measure task for AM2"
+    )
+    measure_AM3 = pexConfig.ConfigurableField(
+        target=AMxTask, doc="Measure task for AM3"
+    )
+    measure_AD1_design = pexConfig.ConfigurableField(
+        target=ADxTask, doc="Measure task for AD1_design"
+    )
+    measure_AD2_design = pexConfig.ConfigurableField(
+        target=ADxTask, doc="Measure task for AD2_design"
+    )
+    measure_AD3_design = pexConfig.ConfigurableField(
+        target=ADxTask, doc="Measure task for AD3_design"
+    )
+    measure_AF1_design = pexConfig.ConfigurableField(
+        target=AFxTask, doc="Measure task for AF1_design"
+    )
+    measure_AF2_design = pexConfig.ConfigurableField(
+        target=AFxTask, doc="Measure task for AF2_design"
+    )
+    measure_AF3_design = pexConfig.ConfigurableField(
+        target=AFxTask, doc="Measure task for AF3_design"
+    )
+    measure_modelPhotRepGal1 = pexConfig.ConfigurableField(
+        target=ModelPhotRepTask, doc="Measure task for modelPhotRepGal1"
+    )
+    measure_modelPhotRepGal2 = pexConfig.ConfigurableField(
+        target=ModelPhotRepTask, doc="Measure task for modelPhotRepGal2"
+    )
+    measure_modelPhotRepGal3 = pexConfig.ConfigurableField(
+        target=ModelPhotRepTask, doc="Measure task for modelPhotRepGal3"
+    )
+    measure_modelPhotRepGal4 = pexConfig.ConfigurableField(
+        target=ModelPhotRepTask, doc="Measure task for modelPhotRepGal4"
+    )
+    measure_modelPhotRepStar1 = pexConfig.ConfigurableField(
+        target=ModelPhotRepTask, doc="Measure task for modelPhotRepStar1"
+    )
+    measure_modelPhotRepStar2 = pexConfig.ConfigurableField(
+        target=ModelPhotRepTask, doc="Measure task for modelPhotRepStar2"
+    )
+    measure_modelPhotRepStar3 = pexConfig.ConfigurableField(
+        target=ModelPhotRepTask, doc="Measure task for modelPhotRepStar3"
+    )
+    measure_modelPhotRepStar4 = pexConfig.ConfigurableField(
+        target=ModelPhotRepTask, doc="Measure task for modelPhotRepStar4"
+    )
+    measure_psfPhotRepStar1 = pexConfig.ConfigurableField(
+        target=ModelPhotRepTask, doc="Measure task for psfPhotRepStar1"
+    )
+    measure_psfPhotRepStar2 = pexConfig.ConfigurableField(
+        target=ModelPhotRepTask, doc="Measure task for psfPhotRepStar2"
+    )
+    measure_psfPhotRepStar3 = pexConfig.ConfigurableField(
+        target=ModelPhotRepTask, doc="Measure task for psfPhotRepStar3"
+    )
+    measure_psfPhotRepStar4 = pexConfig.ConfigurableField(
+        target=ModelPhotRepTask, doc="Measure task for psfPhotRepStar4"
+    )
+
+    def setDefaults(self):
+        super().setDefaults()
+        for label, _, _ in _METRICS:
+            getattr(self, f"measure_{label}").useCache = True
+        self.measure_PF1_design.threshPA2 = 15.0
+        radii = (5.0, 20.0, 200.0)
+        sweptRadii = (5.0, 20.0)
+        for index, annulus_r in enumerate(radii, start=1):
+            measure = getattr(self, f"measure_AM{index}")
+            measure.annulus_r = annulus_r
+            # Find the pairs of the AM1 and AM2 annuli in a single search.
+            # The AM3 annulus is left out, since its neighbor search covers
+            # the whole tract and would slow down the cheap metrics.
+            if annulus_r in sweptRadii:
+                measure.sweepAnnuli_r = [r for r in sweptRadii if r != annulus_r]
+            for prefix in ("AD", "AF"):
+                measure = getattr(self, f"measure_{prefix}{index}_design")
+                measure.annulus_r = annulus_r
+                measure.threshAD = 30.0 if index == 3 else 20.0
+                measure.threshAF = 10.0
+        snrBins = ((5, 10), (10, 20), (20, 40), (40, 80))
+        for prefix in ("modelPhotRepGal", "modelPhotRepStar", "psfPhotRepStar"):
+            for index, (snrMin, snrMax) in enumerate(snrBins, start=1):
+                measure = getattr(self, f"measure_{prefix}{index}")
+                measure.index = index
+                measure.selectExtended = prefix == "modelPhotRepGal"
+                measure.selectSnrMin = snrMin
+                measure.selectSnrMax = snrMax
+                if prefix == "psfPhotRepStar":
+                    measure.magName = "slot_PsfFlux_mag"
+
+
+class TractMatchedFusedMeasurementTask(pipeBase.PipelineTask):
+    """Compute all the metrics of the matched catalog measurement pipeline
+    in a single quantum.
+
+    Notes
+    -----
+    Each matched catalog is read once, and the filtered catalogs and
+    statistics shared by several metrics are computed once through the
+    process-level `lsst.faro.utils.matched_cache.MatchedCatalogCache`, which
+    is cleared at the end of the quantum. The output datasets and their
+    values are the same as those of the separate
+    `lsst.faro.measurement.TractMatchedMeasurementTask` configurations in
+    ``pipelines/measurement/measurement_matched.yaml``.
+
+    A metric whose measurement raises an exception is logged and skipped,
+    without stopping the other metrics. If the ``shelveName`` of a metric's
+    measurement subtask is set, its input matched catalog is persisted as
+    `lsst.faro.base.CatalogMeasurementBaseTask` does for a single metric.
+    """
+
+    ConfigClass = TractMatchedFusedMeasurementConfig
+    _DefaultName = "tractMatchedFusedMeasurementTask"
+
+    def __init__(self, config, *args, **kwargs):
+        super().__init__(*args, config=config, **kwargs)
+        for label in self.config.metrics:
+            self.makeSubtask(f"measure_{label}")
+
+    def run(self, **matchedCatalogs):
+        """Compute the configured metrics.
+
+        Parameters
+        ----------
+        **matchedCatalogs
+            Matched catalogs, keyed by the name of their input connection.
+
+        Returns
+        -------
+        result : `lsst.pipe.base.Struct`
+            The `lsst.verify.Measurement` of each metric keyed by its label,
+            or `None` if the measurement failed.
+
+        Notes
+        -----
+        Any exception raised by the measurement of a metric is logged, so
+        that a failure of one metric does not lose the others.
+        """
+        entries = {label: (metric, inputName) for label, metric, inputName in _METRICS}
+        measurements = {}
+        try:
+            for label in self.config.metrics:
+                metric, inputName = entries[label]
+                measure = getattr(self, f"measure_{label}")
+                if 'shelveName' in measure.config.keys() and measure.config.shelveName:
+                    # Persist in-memory objects for development and testing,
+                    # as the matchedCatalog input of the single metric task
+                    CatalogMeasurementBaseTask._persistMeasurementInputs(
+                        self, measure.config, measure.config.shelveName,
+                        matchedCatalog=matchedCatalogs[inputName],
+                    )
+                try:
+                    measurements[label] = measure.run(metric, matchedCatalogs[inputName]).measurement
+                except MetricComputationError:
+                    self.log.error("Measurement of %s failed", metric, exc_info=True)
+                    measurements[label] = None
+                except Exception:
+                    self.log.error("Unexpected error in the measurement of %s", metric, exc_info=True)
+                    measurements[label] = None
+        finally:
+            # The cached products are only valid for the catalogs of this
+            # quantum
+            getMatchedCatalogCache().clear()
+        return pipeBase.Struct(**measurements)
+
+    def runQuantum(self, butlerQC, inputRefs, outputRefs):
+        inputs = butlerQC.get(inputRefs)
+        outputs = self.run(**inputs)
+        for label, measurement in outputs.getDict().items():
+            if measurement is not None:
+                butlerQC.put(measurement, getattr(outputRefs, label))
+            else:
+                self.log.debug("Skipping measurement of %s as not applicable.", label)
@@ -22,6 +22,7 @@
 import traceback
 
 import lsst.pipe.base as pipeBase
+import lsst.pex.config as pexConfig
 from lsst.verify.tasks import MetricComputationError
 
 from lsst.faro.base.CatalogMeasurementBase import (
@@ -29,6 +30,7 @@ from lsst.faro.base.CatalogMeasurementBase import (
     CatalogMeasurementBaseConfig,
     CatalogMeasurementBaseTask,
 )
+from lsst.faro.utils.matched_table import readMatchedTable
 
 __all__ = (
     "PatchMatchedMeasurementConnections",
@@ -37,6 +39,9 @@ __all__ = (
     "TractMatchedMeasurementConnections",
     "TractMatchedMeasurementConfig",
     "TractMatchedMeasurementTask",
+    "TractMatchedTableMeasurementConnections",
+    "TractMatchedTableMeasurementConfig",
+    "TractMatchedTableMeasurementTask",
     "PatchMatchedMultiBandMeasurementConnections",
     "PatchMatchedMultiBandMeasurementConfig",
     "PatchMatchedMultiBandMeasurementTask",
@@ -104,6 +109,76 @@ class TractMatchedMeasurementTask(CatalogMeasurementBaseTask):
     _DefaultName = "tractMatchedMeasurementTask"
 
 
+class TractMatchedTableMeasurementConnections(
+    CatalogMeasurementBaseConnections,
+    dimensions=("tract", "instrument", "band", "skymap"),
+):
+    matchedTable = pipeBase.connectionTypes.Input(
+        doc="Input matched catalog, as a table sorted by object ID.",
+        dimensions=("tract", "instrument", "band"),
+        storageClass="ArrowAstropy",
+        name="matchedCatalogTractTable",
+        deferLoad=True,
+    )
+    measurement = pipeBase.connectionTypes.Output(
+        doc="Resulting matched catalog.",
+        dimensions=("tract", "instrument", "band"),
+        storageClass="MetricValue",
+        name="metricvalue_{package}_{metric}",
+    )
+
+
+class TractMatchedTableMeasurementConfig(
+    CatalogMeasurementBaseConfig, pipelineConnections=TractMatchedTableMeasurementConnections
+):
+    """Configuration for TractMatchedTableMeasurementTask."""
+
+    columns = pexConfig.ListField(
+        doc="Columns of the matched table read for the measurement, possibly through aliases. "
+        "The default columns are those used by PA1Task.",
+        dtype=str,
+        default=[
+            "slot_PsfFlux_mag",
+            "base_PsfFlux_snr",
+            "base_ClassificationExtendedness_value",
+            "base_PixelFlags_flag_saturated",
+            "base_PixelFlags_flag_cr",
+            "base_PixelFlags_flag_bad",
+            "base_PixelFlags_flag_edge",
+            "detect_isPrimary",
+        ],
+    )
+
+
+class TractMatchedTableMeasurementTask(CatalogMeasurementBaseTask):
+    """Measure a metric on the columns of a persisted matched table.
+
+    Notes
+    -----
+    The matched tables are written by the matched preparation tasks when
+    ``doWriteTable`` is set. Only ``config.columns`` are read, and passed to
+    the measurement subtask as ``matchedCatalog``; subtasks working on the
+    columns of a matched catalog, such as
+    `lsst.faro.measurement.PA1Task`, can be retargeted.
+    """
+
+    ConfigClass = TractMatchedTableMeasurementConfig
+    _DefaultName = "tractMatchedTableMeasurementTask"
+
+    def runQuantum(self, butlerQC, inputRefs, outputRefs):
+        inputs = butlerQC.get(inputRefs)
+        matchedCatalog = readMatchedTable(inputs["matchedTable"], self.config.columns)
+        outputs = self.run(matchedCatalog=matchedCatalog)
+        if outputs.measurement is not None:
+            butlerQC.put(outputs, outputRefs)
+        else:
+            self.log.debug(
+                "Skipping measurement of %r on %s as not applicable.",
+                self,
+                inputRefs,
+            )
+
+
 class PatchMatchedMultiBandMeasurementConnections(
     CatalogMeasurementBaseConnections,
     dimensions=("tract", "patch", "band", "instrument", "skymap"),
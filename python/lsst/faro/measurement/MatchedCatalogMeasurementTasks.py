@@ -26,14 +26,16 @@ from lsst.pex.config import ChoiceField, Config, Field, ListField
 from lsst.verify import Measurement, Datum
 from lsst.faro.utils.filtermatches import filterMatches
 from lsst.faro.utils.separations import (
-    calcRmsDistances,
-    calcRmsDistancesVsRef,
+    calcRmsDistancesInAnnuli,
+    calcRmsDistancesVsRefVisits,
     astromResiduals,
 )
 from lsst.faro.utils.phot_repeat import photRepeat
+from lsst.faro.utils.matched_cache import getMatchedCatalogCache
 
 
 __all__ = (
+    "MatchedCatalogCacheConfig",
     "PA1Config",
     "PA1Task",
     "PF1Config",
@@ -64,7 +66,21 @@ filter_dict = {
 }
 
 
-class PA1Config(Config):
+class MatchedCatalogCacheConfig(Config):
+    """Config field shared by the tasks using the matched catalog cache.
+    """
+
+    useCache = Field(
+        doc="Reuse the filtered catalog and statistics computed by other tasks "
+        "on the same matched catalog in this process. Only enabled by tasks "
+        "that clear the cache when they are done, such as "
+        "TractMatchedFusedMeasurementTask.",
+        dtype=bool,
+        default=False,
+    )
+
+
+class PA1Config(MatchedCatalogCacheConfig):
     """Config fields for the PA1 photometric repeatability metric.
     """
 
@@ -131,6 +147,7 @@ class PA1Task(Task):
             snrMax=self.config.brightSnrMax,
             snrMin=self.config.brightSnrMin,
             doFlags=False, isPrimary=False,
+            cache=getMatchedCatalogCache() if self.config.useCache else None,
         )
 
         if "magMean" in pa1.keys():
@@ -161,7 +178,7 @@ class PA1Task(Task):
             return Struct(measurement=Measurement("PA1", np.nan * u.mmag))
 
 
-class PF1Config(Config):
+class PF1Config(MatchedCatalogCacheConfig):
     brightSnrMin = Field(
         doc="Minimum median SNR for a source to be considered bright.",
         dtype=float,
@@ -226,6 +243,7 @@ class PF1Task(Task):
             snrMax=self.config.brightSnrMax,
             snrMin=self.config.brightSnrMin,
             doFlags=False, isPrimary=False,
+            cache=getMatchedCatalogCache() if self.config.useCache else None,
         )
 
         if "magResid" in pf1.keys():
@@ -233,11 +251,13 @@ class PF1Task(Task):
             # Now, use all of them.
             # Keep only stars with > 2 observations:
             okrms = pf1["count"] > 2
-            magResid0 = pf1["magResid"]
-            magResid = np.concatenate(magResid0[okrms])
+            magResid = pf1["magResid"]
+            rows = magResid.rowMask(okrms)
+            outliers = np.abs(magResid.values) > pa2_thresh.to_value(magResid.unit)
+            outliers &= rows
 
             percentileAtPA2 = (
-                100 * np.mean(np.abs(magResid.value) > pa2_thresh.value) * u.percent
+                100 * (np.count_nonzero(outliers) / np.count_nonzero(rows)) * u.percent
             )
 
             return Struct(measurement=Measurement("PF1", percentileAtPA2))
@@ -249,18 +269,30 @@ def isSorted(a):
     return all(a[i] <= a[i + 1] for i in range(len(a) - 1))
 
 
+# Conversion of the unit-free angles returned by the separation utilities
+_RAD_TO_MARCSEC = u.radian.to(u.marcsec)
+
+
 def bins(window, n):
     delta = window / n
     return [i * delta for i in range(n + 1)]
 
 
-class AMxConfig(Config):
+class AMxConfig(MatchedCatalogCacheConfig):
     annulus_r = Field(
         doc="Radial distance of the annulus in arcmin (5, 20, or 200 for AM1, AM2, AM3)",
         dtype=float,
         default=5.0,
     )
     width = Field(doc="Width of annulus in arcmin", dtype=float, default=2.0)
+    sweepAnnuli_r = ListField(
+        doc="Radial distances in arcmin of additional annuli, of the same width, whose pairs "
+        "are found in the same neighbor search as annulus_r (AMxTask only). Their RMS "
+        "distances are returned with the measurement, and the pair distances are cached "
+        "for the tasks measuring these annuli.",
+        dtype=float,
+        default=[],
+    )
     bright_mag_cut = Field(
         doc="Bright limit of catalog entries to include", dtype=float, default=17.0
     )
@@ -293,36 +325,41 @@ class AMxTask(Task):
     def run(self, metricName, matchedCatalog):
         self.log.info("Measuring %s", metricName)
 
-        filteredCat = filterMatches(matchedCatalog)
+        cache = getMatchedCatalogCache() if self.config.useCache else None
+        filteredCat = filterMatches(matchedCatalog, asArrays=True, cache=cache)
 
         magRange = (
             np.array([self.config.bright_mag_cut, self.config.faint_mag_cut]) * u.mag
         )
-        D = self.config.annulus_r * u.arcmin
+        radii = [self.config.annulus_r] + list(self.config.sweepAnnuli_r)
         width = self.config.width * u.arcmin
-        annulus = D + (width / 2) * np.array([-1, +1])
+        annuli = [r * u.arcmin + (width / 2) * np.array([-1, +1]) for r in radii]
 
-        rmsDistances = calcRmsDistances(filteredCat, annulus, magRange=magRange)
+        rmsDistancesList = calcRmsDistancesInAnnuli(
+            filteredCat, annuli, magRange=magRange, cache=cache, withUnits=False
+        )
 
-        values, bins = np.histogram(
-            rmsDistances.to(u.marcsec), bins=self.config.bins * u.marcsec
+        return Struct(
+            measurement=self._makeMeasurement(metricName, rmsDistancesList[0]),
+            rmsDistances={r: rms * u.radian for r, rms in zip(radii, rmsDistancesList)},
         )
+
+    def _makeMeasurement(self, metricName, rmsDistances):
+        # RMS distances are in radians, without units
+        rmsDistances = rmsDistances * _RAD_TO_MARCSEC
+        values, bins = np.histogram(rmsDistances, bins=self.config.bins)
         extras = {
-            "bins": Datum(bins, label="binvalues", description="bins"),
+            "bins": Datum(bins * u.marcsec, label="binvalues", description="bins"),
             "values": Datum(
                 values * u.count, label="counts", description="icounts in bins"
             ),
         }
 
         if len(rmsDistances) == 0:
-            return Struct(
-                measurement=Measurement(metricName, np.nan * u.marcsec, extras=extras)
-            )
+            return Measurement(metricName, np.nan * u.marcsec, extras=extras)
 
-        return Struct(
-            measurement=Measurement(
-                metricName, np.median(rmsDistances.to(u.marcsec)), extras=extras
-            )
+        return Measurement(
+            metricName, np.median(rmsDistances) * u.marcsec, extras=extras
         )
 
 
@@ -339,6 +376,8 @@ class ADxTask(Task):
             self.config.faint_mag_cut,
             self.config.annulus_r,
             self.config.width,
+            cache=getMatchedCatalogCache() if self.config.useCache else None,
+            withUnits=False,
         )
 
         afThresh = self.config.threshAF * u.percent
@@ -350,11 +389,11 @@ class ADxTask(Task):
             # absolute value of the difference between each astrometric rms
             #    and the median astrometric RMS
             # absRmsDiffs = np.abs(rmsDistances - np.median(rmsDistances)).to(u.marcsec)
-            absDiffsMarcsec = (sepDistances - np.median(sepDistances)).to(u.marcsec)
+            absDiffsMarcsec = (sepDistances - np.median(sepDistances)) * _RAD_TO_MARCSEC
             return Struct(
                 measurement=Measurement(
                     metricName,
-                    np.percentile(absDiffsMarcsec.value, afPercentile.value)
+                    np.percentile(absDiffsMarcsec, afPercentile.value)
                     * u.marcsec,
                 )
             )
@@ -373,6 +412,8 @@ class AFxTask(Task):
             self.config.faint_mag_cut,
             self.config.annulus_r,
             self.config.width,
+            cache=getMatchedCatalogCache() if self.config.useCache else None,
+            withUnits=False,
         )
 
         adxThresh = self.config.threshAD * u.marcsec
@@ -383,10 +424,10 @@ class AFxTask(Task):
             # absolute value of the difference between each astrometric rms
             #    and the median astrometric RMS
             # absRmsDiffs = np.abs(rmsDistances - np.median(rmsDistances)).to(u.marcsec)
-            absDiffsMarcsec = (sepDistances - np.median(sepDistances)).to(u.marcsec)
+            absDiffsMarcsec = (sepDistances - np.median(sepDistances)) * _RAD_TO_MARCSEC
             percentileAtADx = (
                 100
-                * np.mean(np.abs(absDiffsMarcsec.value) > adxThresh.value)
+                * np.mean(np.abs(absDiffsMarcsec) > adxThresh.value)
                 * u.percent
             )
             return Struct(measurement=Measurement(metricName, percentileAtADx))
@@ -414,30 +455,22 @@ class AB1Task(Task):
         if self.config.ref_filter not in filter_dict:
             raise Exception("Reference filter supplied for AB1 not in dictionary.")
 
-        filteredCat = filterMatches(matchedCatalogMulti)
-        rmsDistancesAll = []
+        filteredCat = filterMatches(matchedCatalogMulti, asArrays=True)
 
         if len(filteredCat) > 0:
 
             filtnum = filter_dict[self.config.ref_filter]
 
-            refVisits = set()
-            for id in filteredCat.ids:
-                grptmp = filteredCat[id]
-                filtmch = grptmp["filt"] == filtnum
-                if len(filtmch) > 0:
-                    refVisits.update(set(grptmp[filtmch]["visit"]))
-
-            refVisits = list(refVisits)
+            refVisits = np.unique(filteredCat["visit"][filteredCat["filt"] == filtnum])
 
             magRange = (
                 np.array([self.config.bright_mag_cut, self.config.faint_mag_cut])
                 * u.mag
             )
-            for rv in refVisits:
-                rmsDistances = calcRmsDistancesVsRef(
-                    filteredCat, rv, magRange=magRange, band=filter_dict[out_id["band"]]
-                )
+            rmsDistancesAll = []
+            for rmsDistances in calcRmsDistancesVsRefVisits(
+                filteredCat, refVisits, magRange=magRange, band=filter_dict[out_id["band"]]
+            ):
                 finiteEntries = np.where(np.isfinite(rmsDistances))[0]
                 if len(finiteEntries) > 0:
                     rmsDistancesAll.append(rmsDistances[finiteEntries])
@@ -454,7 +487,7 @@ class AB1Task(Task):
             return Struct(measurement=Measurement(metricName, np.nan * u.marcsec))
 
 
-class ModelPhotRepConfig(Config):
+class ModelPhotRepConfig(MatchedCatalogCacheConfig):
     """Config fields for the *ModelPhotRep photometric repeatability metrics.
     """
 
@@ -530,6 +563,7 @@ class ModelPhotRepTask(Task):
             magName=self.config.magName,
             extended=self.config.selectExtended,
             doFlags=False, isPrimary=False,
+            cache=getMatchedCatalogCache() if self.config.useCache else None,
         )
 
         name_type = "Gal" if self.config.selectExtended else "Star"
@@ -53,6 +53,28 @@ class PatchMatchedPreparationConnections(
         storageClass="SimpleCatalog",
         name="matchedCatalogPatch",
     )
+    outputTable = pipeBase.connectionTypes.Output(
+        doc="Resulting matched catalog, as a table sorted by object ID.",
+        dimensions=("tract", "patch", "instrument", "band"),
+        storageClass="ArrowAstropy",
+        name="matchedCatalogPatchTable",
+    )
+    outputState = pipeBase.connectionTypes.Output(
+        doc="State of the match in incremental mode: the matched catalog before trimming, "
+        "with its ambiguous objects.",
+        dimensions=("tract", "patch", "instrument", "band"),
+        storageClass="SimpleCatalog",
+        name="matchedCatalogPatchState",
+    )
+    previousCatalog = pipeBase.connectionTypes.Input(
+        doc="State of the match of an earlier run, updated with the new visits in incremental "
+        "mode. If it does not exist yet, all the visits are matched.",
+        dimensions=("tract", "patch", "instrument", "band"),
+        storageClass="SimpleCatalog",
+        name="previousMatchedCatalogPatchState",
+        minimum=0,
+        deferGraphConstraint=True,
+    )
 
 
 class PatchMatchedPreparationConfig(
@@ -76,6 +98,28 @@ class TractMatchedPreparationConnections(
         storageClass="SimpleCatalog",
         name="matchedCatalogTract",
     )
+    outputTable = pipeBase.connectionTypes.Output(
+        doc="Resulting matched catalog, as a table sorted by object ID.",
+        dimensions=("tract", "instrument", "band"),
+        storageClass="ArrowAstropy",
+        name="matchedCatalogTractTable",
+    )
+    outputState = pipeBase.connectionTypes.Output(
+        doc="State of the match in incremental mode: the matched catalog before trimming, "
+        "with its ambiguous objects.",
+        dimensions=("tract", "instrument", "band"),
+        storageClass="SimpleCatalog",
+        name="matchedCatalogTractState",
+    )
+    previousCatalog = pipeBase.connectionTypes.Input(
+        doc="State of the match of an earlier run, updated with the new visits in incremental "
+        "mode. If it does not exist yet, all the visits are matched.",
+        dimensions=("tract", "instrument", "band"),
+        storageClass="SimpleCatalog",
+        name="previousMatchedCatalogTractState",
+        minimum=0,
+        deferGraphConstraint=True,
+    )
 
 
 class TractMatchedPreparationConfig(
@@ -99,6 +143,28 @@ class PatchMatchedMultiBandPreparationConnections(
         storageClass="SimpleCatalog",
         name="matchedCatalogPatchMultiBand",
     )
+    outputTable = pipeBase.connectionTypes.Output(
+        doc="Resulting matched catalog, as a table sorted by object ID.",
+        dimensions=("tract", "patch", "instrument"),
+        storageClass="ArrowAstropy",
+        name="matchedCatalogPatchMultiBandTable",
+    )
+    outputState = pipeBase.connectionTypes.Output(
+        doc="State of the match in incremental mode: the matched catalog before trimming, "
+        "with its ambiguous objects.",
+        dimensions=("tract", "patch", "instrument"),
+        storageClass="SimpleCatalog",
+        name="matchedCatalogPatchMultiBandState",
+    )
+    previousCatalog = pipeBase.connectionTypes.Input(
+        doc="State of the match of an earlier run, updated with the new visits in incremental "
+        "mode. If it does not exist yet, all the visits are matched.",
+        dimensions=("tract", "patch", "instrument"),
+        storageClass="SimpleCatalog",
+        name="previousMatchedCatalogPatchMultiBandState",
+        minimum=0,
+        deferGraphConstraint=True,
+    )
 
 
 class PatchMatchedMultiBandPreparationConfig(
@@ -21,13 +21,14 @@
 
 import numpy as np
 
-import lsst.geom as geom
+from lsst.faro.utils.matched_catalog import groupSum
 
 __all__ = (
     "averageRaFromCat",
     "averageDecFromCat",
     "averageRaDecFromCat",
     "averageRaDec",
+    "groupAverageRaDec",
     "sphDist",
 )
 
@@ -107,15 +108,49 @@ def averageRaDec(ra, dec):
     """
     assert len(ra) == len(dec)
 
-    angleRa = [geom.Angle(r, geom.radians) for r in ra]
-    angleDec = [geom.Angle(d, geom.radians) for d in dec]
-    coords = [
-        geom.SpherePoint(ar, ad, geom.radians) for (ar, ad) in zip(angleRa, angleDec)
-    ]
+    meanRa, meanDec = groupAverageRaDec(ra, dec, [0, len(ra)])
 
-    meanRa, meanDec = geom.averageSpherePoint(coords)
+    return meanRa[0], meanDec[0]
 
-    return meanRa.asRadians(), meanDec.asRadians()
+
+def groupAverageRaDec(ra, dec, offsets):
+    """Calculate the average RA, Dec of each of several groups of positions.
+
+    The unit vectors of the positions of each group are summed, and the
+    direction of the sum is the average position.
+
+    Parameters
+    ----------
+    ra : `numpy.array` [`float`]
+        RA in [radians], sorted by group.
+    dec : `numpy.array` [`float`]
+        Dec in [radians], sorted by group.
+    offsets : `numpy.array` [`int`]
+        Offsets of the groups, such that group ``i`` is
+        ``ra[offsets[i]:offsets[i + 1]]``.
+
+    Returns
+    -------
+    meanRa, meanDec : `numpy.array` [`float`]
+        Average RA in [0, 2pi) and Dec of each group [radians]; NaN for
+        empty groups.
+    """
+    ra = np.asarray(ra, dtype=float)
+    dec = np.asarray(dec, dtype=float)
+    cosDec = np.cos(dec)
+    x = groupSum(cosDec * np.cos(ra), offsets)
+    y = groupSum(cosDec * np.sin(ra), offsets)
+    z = groupSum(np.sin(dec), offsets)
+
+    meanRa = np.arctan2(y, x) % (2 * np.pi)
+    # Tiny negative angles round to 2pi
+    meanRa[meanRa == 2 * np.pi] = 0.0
+    meanDec = np.arctan2(z, np.hypot(x, y))
+
+    empty = np.diff(offsets) == 0
+    meanRa[empty] = np.nan
+    meanDec[empty] = np.nan
+    return meanRa, meanDec
 
 
 def sphDist(ra_mean, dec_mean, ra, dec):
@@ -0,0 +1,174 @@
+# This file is part of faro.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import treecorr
+
+__all__ = ("CorrelationSession",)
+
+
+class CorrelationSession(object):
+    """Compute several correlations between fields measured at the same
+    positions, making the treecorr catalog of each field only once.
+
+    Fields are registered by name with `addScalar` and `addShear`, and the
+    corresponding `treecorr.Catalog` is only made the first time a
+    correlation uses the field.
+
+    Parameters
+    ----------
+    ra : `numpy.array`
+        The right ascension values of entries in the catalog.
+    dec : `numpy.array`
+        The declination values of entries in the catalog.
+    raUnits : `str`, optional
+        Unit of the right ascension values.
+        Valid options are "degrees", "arcmin", "arcsec", "hours" or "radians".
+    decUnits : `str`, optional
+        Unit of the declination values.
+        Valid options are "degrees", "arcmin", "arcsec", "hours" or "radians".
+    **treecorrKwargs
+        Keyword arguments to be passed to `treecorr.KKCorrelation` and
+        `treecorr.GGCorrelation`.
+
+    Notes
+    -----
+    treecorr stores the field values in the cells of its trees, so a tree
+    cannot be shared between different fields. Instead, the session keeps
+    one catalog per field: treecorr caches the tree of a catalog, so a field
+    used by several correlations with the same binning has its tree built
+    once rather than once per correlation.
+    """
+
+    def __init__(
+        self, ra, dec, raUnits="degrees", decUnits="degrees", **treecorrKwargs
+    ):
+        self.ra = ra
+        self.dec = dec
+        self.raUnits = raUnits
+        self.decUnits = decUnits
+        self.treecorrKwargs = treecorrKwargs
+        self._fields = {}
+        self._catalogs = {}
+
+    def addScalar(self, name, k):
+        """Register a scalar (spin-0) field.
+
+        Parameters
+        ----------
+        name : `str`
+            Name of the field.
+        k : `numpy.array`
+            The scalar field.
+        """
+        self._addField(name, dict(k=k))
+
+    def addShear(self, name, g1, g2):
+        """Register a shear-like (spin-2) field.
+
+        Parameters
+        ----------
+        name : `str`
+            Name of the field.
+        g1 : `numpy.array`
+            The first component of the shear-like field.
+        g2 : `numpy.array`
+            The second component of the shear-like field.
+        """
+        self._addField(name, dict(g1=g1, g2=g2))
+
+    def _addField(self, name, field):
+        if name in self._fields:
+            raise ValueError(f"Field {name!r} is already registered.")
+        self._fields[name] = field
+
+    def catalog(self, name):
+        """Return the catalog of a registered field, making it on first use.
+
+        Parameters
+        ----------
+        name : `str`
+            Name of the field.
+
+        Returns
+        -------
+        catalog : `treecorr.Catalog`
+            The catalog of the field at the session positions.
+        """
+        if name not in self._catalogs:
+            self._catalogs[name] = treecorr.Catalog(
+                ra=self.ra,
+                dec=self.dec,
+                ra_units=self.raUnits,
+                dec_units=self.decUnits,
+                **self._fields[name]
+            )
+        return self._catalogs[name]
+
+    def corrSpin0(self, name1, name2=None):
+        """Compute the correlation of at most two registered scalar fields.
+
+        Parameters
+        ----------
+        name1 : `str`
+            Name of the primary scalar field.
+        name2 : `str`, optional
+            Name of the secondary scalar field.
+            Autocorrelation of the primary field is computed if `None`
+            (default).
+
+        Returns
+        -------
+        xy : `treecorr.KKCorrelation`
+            A `treecorr.KKCorrelation` object containing the correlation
+            function.
+        """
+        return self._process(treecorr.KKCorrelation, name1, name2)
+
+    def corrSpin2(self, nameA, nameB=None):
+        """Compute the correlation of at most two registered shear-like
+        fields.
+
+        Parameters
+        ----------
+        nameA : `str`
+            Name of the primary shear-like field.
+        nameB : `str`, optional
+            Name of the secondary shear-like field.
+            Autocorrelation of the primary field is computed if `None`
+            (default).
+
+        Returns
+        -------
+        xy : `treecorr.GGCorrelation`
+            A `treecorr.GGCorrelation` object containing the correlation
+            function.
+        """
+        return self._process(treecorr.GGCorrelation, nameA, nameB)
+
+    def _process(self, correlationClass, nameA, nameB):
+        xy = correlationClass(**self.treecorrKwargs)
+        if nameB is None:
+            # Calculate the auto-correlation
+            xy.process(self.catalog(nameA))
+        else:
+            # Calculate the cross-correlation
+            xy.process(self.catalog(nameA), self.catalog(nameB))
+        return xy
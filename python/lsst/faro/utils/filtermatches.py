@@ -22,6 +22,8 @@
 import numpy as np
 from lsst.afw.table import GroupView
 
+from lsst.faro.utils.matched_catalog import MatchedCatalogArrays
+
 __all__ = ("filterMatches",)
 
 
@@ -35,7 +37,58 @@ def filterMatches(
     psfStars=None,
     photoCalibStars=None,
     astromCalibStars=None,
+    asArrays=False,
+    cache=None,
 ):
+    """Select the matched objects used for repeatability metrics.
+
+    The selection is computed for all objects at once with grouped array
+    reductions over the columns of the matched catalog.
+
+    Parameters
+    ----------
+    matchedCatalog : `lsst.afw.table.base.Catalog`
+        `~lsst.afw.table.base.Catalog` object as created by
+        `~lsst.afw.table.multiMatch` matching of sources from multiple visits.
+    snrMin, snrMax : `float`, optional
+        Range of the median PSF flux SNR of an object.
+    extended : `bool`, optional
+        Select extended objects rather than point sources.
+    doFlags : `bool`, optional
+        Reject objects with any pixel flag set in any visit.
+    isPrimary : `bool`, optional
+        Require ``detect_isPrimary`` in all visits.
+    psfStars, photoCalibStars, astromCalibStars : `bool`, optional
+        Not used.
+    asArrays : `bool`, optional
+        Return a `~lsst.faro.utils.matched_catalog.MatchedCatalogArrays`
+        view of the selected rows of ``matchedCatalog`` instead of a
+        `~lsst.afw.table.GroupView`, which needs a copy of the selected
+        records.
+    cache : `lsst.faro.utils.matched_cache.MatchedCatalogCache`, optional
+        Cache in which to look up and store the selection.
+
+    Returns
+    -------
+    filteredCat : `lsst.afw.table.GroupView` or `MatchedCatalogArrays`
+        The selected objects.
+    """
+
+    if cache is not None:
+        params = dict(
+            snrMin=snrMin,
+            snrMax=snrMax,
+            extended=extended,
+            doFlags=doFlags,
+            isPrimary=isPrimary,
+            asArrays=asArrays,
+        )
+        return cache.get(
+            matchedCatalog,
+            "filterMatches",
+            params,
+            lambda: filterMatches(matchedCatalog, **params),
+        )
 
     if snrMin is None:
         snrMin = 50.0
@@ -55,54 +108,38 @@ def filterMatches(
     if astromCalibStars is None:
         astromCalibStars = False
 
-    matchedCat = GroupView.build(matchedCatalog)
-    magKey = matchedCat.schema.find("slot_PsfFlux_mag").key
-
-    def nMatchFilter(cat):
-        if len(cat) < nMatchesRequired:
-            return False
-        return np.isfinite(cat[magKey]).all()
-
-    def snrFilter(cat):
-        # Note that this also implicitly checks for psfSnr being non-nan.
-        snr = cat["base_PsfFlux_snr"]
-        (ok0,) = np.where(np.isfinite(snr))
-        medianSnr = np.median(snr[ok0])
-        return snrMin <= medianSnr and medianSnr <= snrMax
-
-    def ptsrcFilter(cat):
-        ext = cat["base_ClassificationExtendedness_value"]
-        # Keep only objects that are flagged as "not extended" in *ALL* visits,
-        # (base_ClassificationExtendedness_value = 1 for extended, 0 for point-like)
-        if extended:
-            return np.min(ext) > 0.9
-        else:
-            return np.max(ext) < 0.9
-
-    def flagFilter(cat):
-        if doFlags:
-            flag_sat = cat["base_PixelFlags_flag_saturated"]
-            flag_cr = cat["base_PixelFlags_flag_cr"]
-            flag_bad = cat["base_PixelFlags_flag_bad"]
-            flag_edge = cat["base_PixelFlags_flag_edge"]
-            return np.logical_not(np.any([flag_sat, flag_cr, flag_bad, flag_edge]))
-        else:
-            return True
-
-    def isPrimaryFilter(cat):
-        if isPrimary:
-            flag_isPrimary = cat["detect_isPrimary"]
-            return np.all(flag_isPrimary)
-        else:
-            return True
-
-    def fullFilter(cat):
-        return (
-            nMatchFilter(cat)
-            and snrFilter(cat)
-            and ptsrcFilter(cat)
-            and flagFilter(cat)
-            and isPrimaryFilter(cat)
+    arrays = MatchedCatalogArrays.build(matchedCatalog)
+
+    # Require enough measurements, all with a finite magnitude
+    keep = arrays.sizes >= nMatchesRequired
+    keep &= arrays.countFinite("slot_PsfFlux_mag") == arrays.sizes
+
+    # Note that this also implicitly checks for psfSnr being non-nan.
+    medianSnr = arrays.finiteMedian("base_PsfFlux_snr")
+    keep &= (snrMin <= medianSnr) & (medianSnr <= snrMax)
+
+    # Keep only objects that are flagged as "not extended" in *ALL* visits,
+    # (base_ClassificationExtendedness_value = 1 for extended, 0 for point-like)
+    if extended:
+        keep &= arrays.min("base_ClassificationExtendedness_value") > 0.9
+    else:
+        keep &= arrays.max("base_ClassificationExtendedness_value") < 0.9
+
+    if doFlags:
+        flagged = (
+            arrays["base_PixelFlags_flag_saturated"]
+            | arrays["base_PixelFlags_flag_cr"]
+            | arrays["base_PixelFlags_flag_bad"]
+            | arrays["base_PixelFlags_flag_edge"]
         )
+        keep &= ~arrays.any(flagged)
+
+    if isPrimary:
+        keep &= arrays.all("detect_isPrimary")
+
+    if asArrays:
+        return arrays.where(keep)
 
-    return matchedCat.where(fullFilter)
+    rowMask = np.zeros(arrays.count, dtype=bool)
+    rowMask[arrays.rows] = arrays.broadcast(keep)
+    return GroupView.build(arrays.catalog[rowMask].copy(deep=True))
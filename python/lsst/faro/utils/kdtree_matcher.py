@@ -0,0 +1,327 @@
+# This file is part of faro.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import itertools
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from lsst.afw.table import MultiMatch, SchemaMapper, SimpleCatalog, SimpleRecord, SimpleTable
+
+__all__ = ("KDTreeMultiMatch", "makeMultiMatch", "ambiguousObjects")
+
+
+def ambiguousObjects(matched):
+    """Find the ambiguous objects of a matched catalog.
+
+    An object is ambiguous if several sources of the same visit and
+    detector were matched to it, which is how `KDTreeMultiMatch` and
+    `lsst.afw.table.MultiMatch` detect ambiguous objects while matching.
+
+    Parameters
+    ----------
+    matched : `lsst.afw.table.SimpleCatalog`
+        Contiguous matched catalog, with ``object``, ``visit`` and
+        ``detector`` fields, in which the ambiguous objects were kept.
+
+    Returns
+    -------
+    objects : `numpy.array` [`int`]
+        Sorted IDs of the ambiguous objects.
+    """
+    keys = np.rec.fromarrays([matched["object"], matched["visit"], matched["detector"]])
+    unique, counts = np.unique(keys, return_counts=True)
+    return np.unique(unique["f0"][counts > 1])
+
+
+class KDTreeMultiMatch:
+    """Match catalogs from multiple visits with a k-d tree of the object
+    centroids.
+
+    This is a replacement for `lsst.afw.table.MultiMatch` with the same
+    interface and output schema. Each catalog added is matched against the
+    running centroids of the objects, as unit vectors, with a single k-d
+    tree query; the records are only mapped to the output schema by
+    `finish`.
+
+    Parameters
+    ----------
+    schema : `lsst.afw.table.Schema`
+        Schema of the catalogs to match.
+    dataIdFormat : `dict` [`str`, `type`]
+        Type of each data ID component stored in the output.
+    coordField : `str`, optional
+        Prefix of the coordinate fields.
+    radius : `lsst.geom.Angle`
+        Match radius.
+
+    Notes
+    -----
+    As with `lsst.afw.table.MultiMatch`, each source is matched to the
+    closest object within the radius, the sources of a catalog are not
+    matched to each other, and objects matched by several sources of the
+    same catalog are ambiguous and removed by `finish`. Unlike it, sources
+    are matched against the mean position of the objects rather than the
+    position of their first source.
+
+    The centroids are kept in a few k-d trees of decreasing sizes: the new
+    objects of each catalog get their own small tree, which is merged with
+    the last trees when it grows as large as them, so that adding a catalog
+    does not rebuild a tree over all the objects. The trees hold the
+    centroids as they were built, and are queried with the radius widened
+    by how far the centroids have moved since.
+    """
+
+    def __init__(self, schema, dataIdFormat, coordField="coord", radius=None):
+        if radius is None:
+            raise ValueError("A match radius is required.")
+        self.mapper = SchemaMapper(schema)
+        self.mapper.addMinimalSchema(schema, True)
+        outSchema = self.mapper.editOutputSchema()
+        outSchema.setAliasMap(self.mapper.getInputSchema().getAliasMap())
+        outSchema.addField("object", type=np.int64, doc="Unique ID for joined sources")
+        for name, dataType in dataIdFormat.items():
+            outSchema.addField(name, type=dataType, doc=f"'{name}' data ID component")
+        self.table = SimpleTable.make(self.mapper.getOutputSchema())
+        self.coordField = coordField
+        self.dataIdNames = list(dataIdFormat)
+        # Chord length between unit vectors separated by the radius
+        self.chord = 2*np.sin(0.5*radius.asRadians())
+
+        # Added catalogs and the object ID of each of their records
+        self._chunks = []
+        # Sum of the unit vectors of the sources of each object, its ID, and
+        # its centroid when its k-d tree was built, in buffers grown
+        # geometrically of which the first _nObjects rows are used
+        self._nObjects = 0
+        self._sums = np.zeros((0, 3))
+        self._objectIds = np.zeros(0, dtype=np.int64)
+        self._treeCentroids = np.zeros((0, 3))
+        # Index of the first object of each k-d tree, and the tree
+        self._trees = []
+        # Largest distance of a centroid from its position in its tree
+        self._maxDrift = 0.0
+        self._ambiguous = []
+        self.nextObjId = 1
+
+    def _unitVectors(self, catalog):
+        ra = catalog[self.coordField + "_ra"]
+        dec = catalog[self.coordField + "_dec"]
+        cosDec = np.cos(dec)
+        return np.stack([cosDec*np.cos(ra), cosDec*np.sin(ra), np.sin(dec)], axis=1)
+
+    def seed(self, previousMatched):
+        """Start from the objects of a previously matched catalog.
+
+        Parameters
+        ----------
+        previousMatched : `lsst.afw.table.SimpleCatalog`
+            Matched catalog with the output schema of this match, as returned
+            by ``finish(removeAmbiguous=False)``.
+
+        Notes
+        -----
+        The state of the match is the same as after adding the catalogs of
+        ``previousMatched`` one by one, so that adding the new catalogs then
+        gives the same objects as matching all the catalogs at once. The
+        ambiguous objects of ``previousMatched`` are found again with
+        `ambiguousObjects`, and removed by `finish`.
+        """
+        if previousMatched.schema != self.table.getSchema():
+            raise ValueError("The previous matched catalog does not have the schema of the new matches; "
+                             "it must be rematched from scratch.")
+        if not previousMatched.isContiguous():
+            previousMatched = previousMatched.copy(deep=True)
+        objectIds, objectIndex = np.unique(previousMatched["object"], return_inverse=True)
+        sums = np.zeros((len(objectIds), 3))
+        np.add.at(sums, objectIndex.ravel(), self._unitVectors(previousMatched))
+        self._nObjects = 0
+        self._trees = []
+        self._maxDrift = 0.0
+        self._appendObjects(objectIds, sums)
+        self._updateTrees(0)
+        self._chunks.append((previousMatched, None, None))
+        self._ambiguous.append(ambiguousObjects(previousMatched))
+        self.nextObjId = int(objectIds.max()) + 1 if len(objectIds) else 1
+
+    def add(self, catalog, dataId):
+        """Match a catalog against the objects.
+
+        Parameters
+        ----------
+        catalog : `lsst.afw.table.SourceCatalog`
+            Sources of one visit and detector.
+        dataId : `dict`
+            Data ID of the catalog, with the components of ``dataIdFormat``.
+        """
+        if not catalog.isContiguous():
+            catalog = catalog.copy(deep=True)
+        vectors = self._unitVectors(catalog)
+        objectIds = np.empty(len(catalog), dtype=np.int64)
+
+        index = self._closestObjects(vectors)
+        matched = index >= 0
+        index = index[matched]
+        objectIds[matched] = self._objectIds[index]
+        updated, counts = np.unique(index, return_counts=True)
+        self._ambiguous.append(self._objectIds[updated[counts > 1]])
+        np.add.at(self._sums, index, vectors[matched])
+        if len(updated) > 0:
+            drift = np.linalg.norm(self._centroids(updated) - self._treeCentroids[updated], axis=1)
+            self._maxDrift = max(self._maxDrift, drift.max())
+
+        # Unmatched sources start new objects
+        nNew = np.count_nonzero(~matched)
+        newIds = np.arange(self.nextObjId, self.nextObjId + nNew, dtype=np.int64)
+        self.nextObjId += nNew
+        objectIds[~matched] = newIds
+        start = self._nObjects
+        self._appendObjects(newIds, vectors[~matched])
+        self._updateTrees(start)
+
+        self._chunks.append((catalog, objectIds, dataId))
+
+    def _centroids(self, index):
+        """Unit vectors of the mean positions of objects."""
+        sums = self._sums[index]
+        return sums/np.linalg.norm(sums, axis=1)[:, np.newaxis]
+
+    def _appendObjects(self, objectIds, sums):
+        """Append objects to the buffers, growing them geometrically."""
+        nObjects = self._nObjects + len(objectIds)
+        if nObjects > len(self._objectIds):
+            capacity = max(nObjects, 2*len(self._objectIds), 1024)
+            for name in ("_sums", "_objectIds", "_treeCentroids"):
+                old = getattr(self, name)
+                new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+                new[:self._nObjects] = old[:self._nObjects]
+                setattr(self, name, new)
+        self._objectIds[self._nObjects:nObjects] = objectIds
+        self._sums[self._nObjects:nObjects] = sums
+        self._nObjects = nObjects
+
+    def _updateTrees(self, start):
+        """Build a k-d tree over the objects from ``start``, merging it with
+        the last trees that are not much larger, or rebuild a single tree if
+        the centroids moved too far from their positions in the trees."""
+        if self._maxDrift > self.chord:
+            start = 0
+            self._trees = []
+            self._maxDrift = 0.0
+        if start == self._nObjects:
+            return
+        while self._trees and start - self._trees[-1][0] <= 2*(self._nObjects - start):
+            start = self._trees.pop()[0]
+        centroids = self._centroids(slice(start, self._nObjects))
+        self._treeCentroids[start:self._nObjects] = centroids
+        self._trees.append((start, cKDTree(centroids)))
+
+    def _closestObjects(self, vectors):
+        """Index of the object closest to each unit vector within the radius,
+        or -1."""
+        closest = np.full(len(vectors), -1, dtype=np.int64)
+        if not self._trees or len(vectors) == 0:
+            return closest
+        sources = []
+        candidates = []
+        for start, tree in self._trees:
+            found = tree.query_ball_point(vectors, self.chord + self._maxDrift)
+            lengths = np.fromiter(map(len, found), dtype=np.int64, count=len(found))
+            sources.append(np.repeat(np.arange(len(vectors)), lengths))
+            candidates.append(start + np.fromiter(itertools.chain.from_iterable(found), dtype=np.int64,
+                                                  count=lengths.sum()))
+        sources = np.concatenate(sources)
+        candidates = np.concatenate(candidates)
+        distance = np.linalg.norm(vectors[sources] - self._centroids(candidates), axis=1)
+        within = distance < self.chord
+        sources = sources[within]
+        candidates = candidates[within]
+        order = np.lexsort((distance[within], sources))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = sources[order[1:]] != sources[order[:-1]]
+        closest[sources[order[first]]] = candidates[order[first]]
+        return closest
+
+    def finish(self, removeAmbiguous=True):
+        """Return the matched catalog.
+
+        Parameters
+        ----------
+        removeAmbiguous : `bool`, optional
+            Whether to remove the objects matched by several sources of the
+            same catalog.
+
+        Returns
+        -------
+        result : `lsst.afw.table.SimpleCatalog`
+            Records of all the matched sources, with ``object`` and data ID
+            fields, as returned by `lsst.afw.table.MultiMatch.finish`.
+        """
+        result = SimpleCatalog(self.table)
+        result.reserve(sum(len(catalog) for catalog, _, _ in self._chunks))
+        for catalog, _, dataId in self._chunks:
+            if dataId is None:
+                result.extend(catalog, deep=True)
+            else:
+                result.extend(catalog, mapper=self.mapper)
+        if not result.isContiguous():
+            result = result.copy(deep=True)
+
+        start = 0
+        for catalog, objectIds, dataId in self._chunks:
+            end = start + len(catalog)
+            if dataId is not None:
+                result["object"][start:end] = objectIds
+                for name in self.dataIdNames:
+                    result[name][start:end] = dataId[name]
+            start = end
+
+        if removeAmbiguous and self._ambiguous:
+            ambiguous = np.concatenate(self._ambiguous)
+            if len(ambiguous) > 0:
+                result = result[~np.isin(result["object"], ambiguous)].copy(deep=True)
+        return result
+
+
+def makeMultiMatch(schema, radius, matcher="multiMatch"):
+    """Make the object matching catalogs of visits and detectors.
+
+    Parameters
+    ----------
+    schema : `lsst.afw.table.Schema`
+        Schema of the catalogs to match.
+    radius : `lsst.geom.Angle`
+        Match radius.
+    matcher : `str`, optional
+        Matching backend: ``"multiMatch"`` for `lsst.afw.table.MultiMatch`,
+        or ``"kdTree"`` for `KDTreeMultiMatch`.
+
+    Returns
+    -------
+    mmatch : `lsst.afw.table.MultiMatch` or `KDTreeMultiMatch`
+        Match to which catalogs are added.
+    """
+    dataIdFormat = {"visit": np.int64, "detector": np.int32}
+    if matcher == "kdTree":
+        return KDTreeMultiMatch(schema, dataIdFormat=dataIdFormat, radius=radius)
+    if matcher == "multiMatch":
+        return MultiMatch(schema, dataIdFormat=dataIdFormat, radius=radius, RecordClass=SimpleRecord)
+    raise ValueError(f"Unknown matching backend {matcher!r}.")
@@ -0,0 +1,303 @@
+# This file is part of faro.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Process-level memoization of intermediate products computed from matched
+catalogs.
+
+Many metric tasks run on the same matched catalog in a single worker process,
+and each of them filters the catalog and computes the same per-object
+statistics again. `MatchedCatalogCache` keeps these intermediate products,
+keyed by the input catalog object and by the arguments used to compute them,
+so that later tasks given the same catalog reuse the work of earlier ones.
+"""
+
+import sys
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+__all__ = ("MatchedCatalogCache", "getMatchedCatalogCache")
+
+
+# Returned by lookups of missing entries, so that None can be cached
+_MISSING = object()
+
+
+def _nbytes(value):
+    """Estimate the memory used by a cached value."""
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return value.nbytes + sum(_nbytes(v) for v in value.flat)
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(v) for v in value)
+    if hasattr(value, "getDict"):
+        # lsst.pipe.base.Struct
+        return _nbytes(value.getDict())
+    if hasattr(value, "rows") and hasattr(value, "_columns"):
+        # MatchedCatalogArrays, which keep the catalog they view alive
+        return (
+            value.rows.nbytes + value.offsets.nbytes + value.ids.nbytes
+            + _nbytes(value._columns) + _nbytes(value.catalog)
+        )
+    if hasattr(value, "groups") and hasattr(value, "schema"):
+        # GroupView; the records are copied into a new catalog by filterMatches
+        try:
+            recordSize = value.schema.getRecordSize()
+            return sum(len(group) for group in value.groups) * recordSize
+        except AttributeError:
+            pass
+    if hasattr(value, "isContiguous") and hasattr(value, "schema"):
+        # lsst.afw.table catalog
+        try:
+            return len(value) * value.schema.getRecordSize()
+        except AttributeError:
+            pass
+    if hasattr(value, "colnames"):
+        # astropy.table.Table
+        return sum(_nbytes(np.asarray(value[name])) for name in value.colnames)
+    return sys.getsizeof(value)
+
+
+class MatchedCatalogCache:
+    """Least-recently-used cache of products computed from matched catalogs.
+
+    Entries are keyed by the input object, the name of the product and the
+    parameters used to compute it. Inputs are identified by their ``id``,
+    and held through weak references, so that the cache does not keep the
+    catalogs alive: the entries of an input are dropped when it is garbage
+    collected. Inputs that do not support weak references, such as `dict`,
+    are kept alive by their entries, and their memory is counted in
+    ``maxBytes``.
+
+    Catalogs must not be modified in place while the cache is in use, and
+    the cache should be cleared when the catalogs it was filled from are
+    done with.
+
+    Parameters
+    ----------
+    maxEntries : `int`, optional
+        Maximum number of entries kept.
+    maxBytes : `int`, optional
+        Approximate maximum memory used by the cached values and the inputs
+        they keep alive, in bytes. A value larger than this on its own is
+        not cached.
+    """
+
+    def __init__(self, maxEntries=64, maxBytes=2 * 1024**3):
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        # (value, nbytes) of each entry, in order of use
+        self._entries = OrderedDict()
+        # [reference, nbytes, number of entries] of each input, by id
+        self._inputs = {}
+        self._nbytesTotal = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        """Approximate memory used by the cached values and the inputs they
+        keep alive, in bytes."""
+        return self._nbytesTotal
+
+    def catalogKey(self, catalog):
+        """Return the key identifying ``catalog`` in the cache.
+
+        Parameters
+        ----------
+        catalog : `lsst.afw.table.SimpleCatalog` or any object
+            Input of the cached computation.
+
+        Returns
+        -------
+        key : `int`
+            The ``id`` of ``catalog``.
+        """
+        key = id(catalog)
+        anchor = self._inputs.get(key)
+        if anchor is not None and anchor[0]() is not catalog:
+            # Entries of a dead object whose id was reused
+            self._forget(key)
+        return key
+
+    def get(self, catalog, name, params, compute):
+        """Return a cached product, computing and storing it if missing.
+
+        Parameters
+        ----------
+        catalog : `lsst.afw.table.SimpleCatalog` or any object
+            Input of the computation.
+        name : `str`
+            Name of the product.
+        params : `dict`
+            Parameters of the computation; values must be hashable or numpy
+            arrays.
+        compute : callable
+            Function of no arguments computing the product.
+
+        Returns
+        -------
+        value : any
+            The cached or newly computed product.
+        """
+        key = self._key(catalog, name, params)
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+        value = compute()
+        self._put(key, catalog, value)
+        return value
+
+    def lookup(self, catalog, name, params, default=None):
+        """Return a cached product, or ``default`` if it is not in the cache.
+
+        See `get` for a description of the other parameters.
+        """
+        value = self._lookup(self._key(catalog, name, params))
+        return default if value is _MISSING else value
+
+    def put(self, catalog, name, params, value):
+        """Store a product in the cache.
+
+        See `get` for a description of the parameters.
+        """
+        self._put(self._key(catalog, name, params), catalog, value)
+
+    def _key(self, catalog, name, params):
+        return (self.catalogKey(catalog), name, _freeze(params))
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def _put(self, key, catalog, value):
+        nbytes = _nbytes(value)
+        anchor = self._inputs.get(key[0])
+        if anchor is None:
+            try:
+                reference = weakref.ref(catalog, self._makeCallback(key[0]))
+                inputBytes = 0
+            except TypeError:
+                reference = _StrongReference(catalog)
+                inputBytes = _nbytes(catalog)
+            if nbytes + inputBytes > self.maxBytes:
+                return
+            anchor = self._inputs[key[0]] = [reference, inputBytes, 0]
+            self._nbytesTotal += inputBytes
+        elif nbytes + anchor[1] > self.maxBytes:
+            return
+        if key in self._entries:
+            self._nbytesTotal -= self._entries.pop(key)[1]
+            anchor[2] -= 1
+        self._entries[key] = (value, nbytes)
+        self._nbytesTotal += nbytes
+        anchor[2] += 1
+        self._evict()
+
+    def _makeCallback(self, inputId):
+        """Make the weak reference callback dropping the entries of an
+        input when it is garbage collected."""
+        def callback(reference):
+            anchor = self._inputs.get(inputId)
+            if anchor is not None and anchor[0] is reference:
+                self._forget(inputId)
+        return callback
+
+    def _forget(self, inputId):
+        """Drop the entries of an input."""
+        for key in [key for key in self._entries if key[0] == inputId]:
+            self._nbytesTotal -= self._entries.pop(key)[1]
+        anchor = self._inputs.pop(inputId, None)
+        if anchor is not None:
+            self._nbytesTotal -= anchor[1]
+
+    def _evict(self):
+        """Drop the least recently used entries until within the limits."""
+        while self._entries and (
+            len(self._entries) > self.maxEntries or self._nbytesTotal > self.maxBytes
+        ):
+            key, (_, nbytes) = self._entries.popitem(last=False)
+            self._nbytesTotal -= nbytes
+            anchor = self._inputs[key[0]]
+            anchor[2] -= 1
+            if anchor[2] == 0:
+                # Release an input once it has no entries
+                del self._inputs[key[0]]
+                self._nbytesTotal -= anchor[1]
+
+    def clear(self):
+        """Remove all entries."""
+        self._entries.clear()
+        self._inputs.clear()
+        self._nbytesTotal = 0
+
+
+class _StrongReference:
+    """Reference keeping alive an input that does not support weak
+    references, with the interface of `weakref.ref`."""
+
+    def __init__(self, obj):
+        self._obj = obj
+
+    def __call__(self):
+        return self._obj
+
+
+def _freeze(value):
+    """Convert parameters to a hashable key."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if hasattr(value, "unit") and hasattr(value, "value"):
+        # astropy.units.Quantity
+        return (_freeze(value.value), str(value.unit))
+    if isinstance(value, np.ndarray):
+        return (value.dtype.str, value.shape, value.tobytes())
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+_cache = MatchedCatalogCache()
+
+
+def getMatchedCatalogCache():
+    """Return the cache shared by all tasks in this process.
+
+    Returns
+    -------
+    cache : `MatchedCatalogCache`
+        The process-level cache.
+    """
+    return _cache
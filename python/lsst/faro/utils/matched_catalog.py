@@ -0,0 +1,489 @@
+# This file is part of faro.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import numpy as np
+
+__all__ = (
+    "GroupedValues",
+    "MatchedCatalogArrays",
+    "ObjectVisitIndex",
+    "groupSum",
+    "groupMean",
+    "groupStd",
+    "groupMedian",
+)
+
+
+def _groupIndex(offsets):
+    """Index of the group of each row, given the group offsets."""
+    sizes = np.diff(offsets)
+    return np.repeat(np.arange(len(sizes)), sizes)
+
+
+def groupSum(values, offsets):
+    """Sum the values in each group.
+
+    Parameters
+    ----------
+    values : `numpy.array`
+        Values, sorted by group.
+    offsets : `numpy.array` [`int`]
+        Offsets of the groups, such that group ``i`` is
+        ``values[offsets[i]:offsets[i + 1]]``.
+
+    Returns
+    -------
+    sums : `numpy.array` [`float`]
+        Sum of each group; zero for empty groups.
+    """
+    return np.bincount(
+        _groupIndex(offsets),
+        weights=np.asarray(values, dtype=float),
+        minlength=len(offsets) - 1,
+    )
+
+
+def groupMean(values, offsets):
+    """Mean of the values in each group; NaN for empty groups.
+
+    See `groupSum` for a description of the parameters.
+    """
+    sizes = np.diff(offsets)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return groupSum(values, offsets) / sizes
+
+
+def groupStd(values, offsets, ddof=0):
+    """Standard deviation of the values in each group.
+
+    Parameters
+    ----------
+    values : `numpy.array`
+        Values, sorted by group.
+    offsets : `numpy.array` [`int`]
+        Offsets of the groups.
+    ddof : `int`, optional
+        Delta degrees of freedom, as for `numpy.std`.
+
+    Returns
+    -------
+    std : `numpy.array` [`float`]
+        Standard deviation of each group; NaN for groups with no more than
+        ``ddof`` values.
+    """
+    sizes = np.diff(offsets)
+    mean = groupMean(values, offsets)
+    residuals = np.asarray(values, dtype=float) - np.repeat(mean, sizes)
+    sumSquares = groupSum(residuals**2, offsets)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(sizes > ddof, np.sqrt(sumSquares / (sizes - ddof)), np.nan)
+
+
+def groupMedian(values, offsets):
+    """Median of the values in each group.
+
+    As for `numpy.median`, the median of a group containing a NaN is NaN.
+    Empty groups also give NaN.
+
+    See `groupSum` for a description of the parameters.
+    """
+    values = np.asarray(values, dtype=float)
+    sizes = np.diff(offsets)
+    # NaN values are sorted to the end of each group
+    order = np.lexsort((values, _groupIndex(offsets)))
+    sortedValues = values[order]
+    median = np.full(len(sizes), np.nan)
+    (ok,) = np.where(sizes > 0)
+    low = sortedValues[offsets[ok] + (sizes[ok] - 1) // 2]
+    high = sortedValues[offsets[ok] + sizes[ok] // 2]
+    median[ok] = (low + high) / 2
+    hasNan = np.isnan(sortedValues[offsets[ok] + sizes[ok] - 1])
+    median[ok[hasNan]] = np.nan
+    return median
+
+
+class MatchedCatalogArrays:
+    """Columnar view of a matched catalog, grouped by object.
+
+    This provides the same grouping as `lsst.afw.table.GroupView`, but the
+    rows of all groups are stored contiguously, sorted by group ID, so that
+    per-group statistics can be computed with array operations instead of
+    one Python call per group. Columns are extracted from the catalog the
+    first time they are used.
+
+    Parameters
+    ----------
+    catalog : `lsst.afw.table.SimpleCatalog`, `dict`, or table-like
+        Source of the columns; ``catalog[name]`` must return an array over
+        all rows. An afw catalog must be contiguous.
+    rows : `numpy.array` [`int`]
+        Index into ``catalog`` of each row, sorted by group.
+    offsets : `numpy.array` [`int`]
+        Offsets of the groups, such that the rows of group ``i`` are
+        ``rows[offsets[i]:offsets[i + 1]]``.
+    ids : `numpy.array` [`int`]
+        Group ID of each group, in ascending order.
+
+    Notes
+    -----
+    Use `MatchedCatalogArrays.build` to construct from the output of
+    `lsst.afw.table.MultiMatch.finish`.
+    """
+
+    def __init__(self, catalog, rows, offsets, ids):
+        self.catalog = catalog
+        self.rows = rows
+        self.offsets = offsets
+        self.ids = ids
+        self._columns = {}
+
+    @classmethod
+    def build(cls, catalog, groupField="object"):
+        """Build the view from a matched catalog.
+
+        Parameters
+        ----------
+        catalog : `lsst.afw.table.SimpleCatalog`, `dict`, or table-like
+            Matched catalog, as produced by `lsst.afw.table.MultiMatch`.
+        groupField : `str`, optional
+            Name of the column holding the group ID.
+
+        Returns
+        -------
+        arrays : `MatchedCatalogArrays`
+            Columnar view of the catalog.
+        """
+        if hasattr(catalog, "isContiguous") and not catalog.isContiguous():
+            catalog = catalog.copy(deep=True)
+        groupIds = np.asarray(catalog[groupField])
+        if len(groupIds) > 0 and np.all(groupIds[1:] >= groupIds[:-1]):
+            # Already sorted by group, e.g. a persisted matched table; the
+            # group offsets are found in a single pass.
+            rows = np.arange(len(groupIds))
+            starts = np.flatnonzero(np.concatenate(([True], groupIds[1:] != groupIds[:-1])))
+            ids = groupIds[starts]
+        else:
+            rows = np.argsort(groupIds, kind="stable")
+            ids, starts = np.unique(groupIds[rows], return_index=True)
+        offsets = np.append(starts, len(rows)).astype(np.int64)
+        return cls(catalog, rows, offsets, ids)
+
+    @classmethod
+    def fromGroupView(cls, groupView, names):
+        """Build the view from the groups of a `lsst.afw.table.GroupView`.
+
+        Parameters
+        ----------
+        groupView : `lsst.afw.table.GroupView`
+            GroupView object of matched observations from MultiMatch.
+        names : `list` [`str`]
+            Names of the fields to extract.
+
+        Returns
+        -------
+        arrays : `MatchedCatalogArrays`
+            Columnar view containing only the requested fields.
+
+        Notes
+        -----
+        The fields are gathered with one call per group; building the view
+        from the catalog with `build`, e.g. through
+        `lsst.faro.utils.filtermatches.filterMatches` with ``asArrays=True``,
+        avoids this.
+        """
+        groups = groupView.groups
+        offsets = np.zeros(len(groups) + 1, dtype=np.int64)
+        np.cumsum([len(group) for group in groups], out=offsets[1:])
+        columns = {}
+        for name in names:
+            key = groupView.schema.find(name).key
+            if len(groups) > 0:
+                columns[name] = np.concatenate([group[key] for group in groups])
+            else:
+                columns[name] = np.zeros(0)
+        return cls(columns, np.arange(offsets[-1]), offsets, np.asarray(groupView.ids))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def count(self):
+        """Total number of rows in all groups."""
+        return len(self.rows)
+
+    @property
+    def sizes(self):
+        """Number of rows in each group."""
+        return np.diff(self.offsets)
+
+    @property
+    def groupIndex(self):
+        """Index of the group of each row."""
+        return _groupIndex(self.offsets)
+
+    def __getitem__(self, name):
+        """Return the column ``name``, sorted by group."""
+        if name not in self._columns:
+            self._columns[name] = np.ascontiguousarray(
+                np.asarray(self.catalog[name])[self.rows]
+            )
+        return self._columns[name]
+
+    def where(self, mask):
+        """Select a subset of the groups.
+
+        Parameters
+        ----------
+        mask : `numpy.array` [`bool`]
+            Which groups to keep; one entry per group.
+
+        Returns
+        -------
+        arrays : `MatchedCatalogArrays`
+            View containing only the selected groups.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        sizes = self.sizes[mask]
+        offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        rowMask = np.repeat(mask, self.sizes)
+        subset = type(self)(self.catalog, self.rows[rowMask], offsets, self.ids[mask])
+        for name, column in self._columns.items():
+            subset._columns[name] = column[rowMask]
+        return subset
+
+    def broadcast(self, values):
+        """Repeat one value per group to one value per row."""
+        return np.repeat(values, self.sizes)
+
+    def subsetOffsets(self, rowMask):
+        """Offsets of the groups after selecting a subset of the rows.
+
+        Parameters
+        ----------
+        rowMask : `numpy.array` [`bool`]
+            Which rows to keep; one entry per row, sorted by group.
+
+        Returns
+        -------
+        offsets : `numpy.array` [`int`]
+            Offsets of the groups within the selected rows.
+        """
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.groupIndex[rowMask], minlength=len(self)), out=offsets[1:])
+        return offsets
+
+    def _values(self, column):
+        """Return a column given either its name or its values."""
+        if isinstance(column, str):
+            return self[column]
+        return np.asarray(column)
+
+    # The reductions below take either the name of a column or an array with
+    # one value per row (sorted by group), and return one value per group.
+
+    def sum(self, column):
+        """Sum of ``column`` in each group."""
+        return groupSum(self._values(column), self.offsets)
+
+    def mean(self, column):
+        """Mean of ``column`` in each group."""
+        return groupMean(self._values(column), self.offsets)
+
+    def std(self, column, ddof=0):
+        """Standard deviation of ``column`` in each group."""
+        return groupStd(self._values(column), self.offsets, ddof=ddof)
+
+    def median(self, column):
+        """Median of ``column`` in each group."""
+        return groupMedian(self._values(column), self.offsets)
+
+    def min(self, column):
+        """Minimum of ``column`` in each group; NaN if any is NaN."""
+        if len(self) == 0:
+            return np.zeros(0)
+        return np.minimum.reduceat(self._values(column), self.offsets[:-1])
+
+    def max(self, column):
+        """Maximum of ``column`` in each group; NaN if any is NaN."""
+        if len(self) == 0:
+            return np.zeros(0)
+        return np.maximum.reduceat(self._values(column), self.offsets[:-1])
+
+    def any(self, column):
+        """Whether any value of ``column`` is true in each group."""
+        return groupSum(self._values(column).astype(bool), self.offsets) > 0
+
+    def all(self, column):
+        """Whether all values of ``column`` are true in each group."""
+        return groupSum(~self._values(column).astype(bool), self.offsets) == 0
+
+    def countFinite(self, column):
+        """Number of finite values of ``column`` in each group."""
+        return np.bincount(
+            self.groupIndex[np.isfinite(self._values(column))], minlength=len(self)
+        )
+
+    def finiteMedian(self, column):
+        """Median of the finite values of ``column`` in each group."""
+        values = self._values(column)
+        finite = np.isfinite(values)
+        return groupMedian(values[finite], self.subsetOffsets(finite))
+
+    def _notNanSubset(self, column):
+        """Non-NaN values of ``column`` and the offsets of their groups."""
+        values = self._values(column)
+        notNan = ~np.isnan(values)
+        return values[notNan], self.subsetOffsets(notNan)
+
+    def nansum(self, column):
+        """Sum of the non-NaN values of ``column`` in each group."""
+        return groupSum(*self._notNanSubset(column))
+
+    def nanmean(self, column):
+        """Mean of the non-NaN values of ``column`` in each group."""
+        return groupMean(*self._notNanSubset(column))
+
+    def nanstd(self, column, ddof=0):
+        """Standard deviation of the non-NaN values of ``column`` in each
+        group.
+        """
+        return groupStd(*self._notNanSubset(column), ddof=ddof)
+
+    def nanmedian(self, column):
+        """Median of the non-NaN values of ``column`` in each group."""
+        return groupMedian(*self._notNanSubset(column))
+
+
+class GroupedValues:
+    """Values of the rows of groups, stored flat with a single unit.
+
+    This replaces ragged object arrays of per-group `astropy.units.Quantity`
+    arrays: the unit is applied once to the whole array, when needed.
+
+    Parameters
+    ----------
+    values : `numpy.array` [`float`]
+        Values of all rows, sorted by group.
+    offsets : `numpy.array` [`int`]
+        Offsets of the groups, such that the values of group ``i`` are
+        ``values[offsets[i]:offsets[i + 1]]``.
+    unit : `astropy.units.Unit`, optional
+        Unit of the values.
+    """
+
+    def __init__(self, values, offsets, unit=None):
+        self.values = values
+        self.offsets = offsets
+        self.unit = unit
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def sizes(self):
+        """Number of values in each group."""
+        return np.diff(self.offsets)
+
+    def __getitem__(self, index):
+        """Return the values of group ``index``, with their unit."""
+        values = self.values[self.offsets[index]:self.offsets[index + 1]]
+        return values if self.unit is None else values * self.unit
+
+    def rowMask(self, groupMask):
+        """Repeat one boolean per group to one boolean per value."""
+        return np.repeat(np.asarray(groupMask, dtype=bool), self.sizes)
+
+    def where(self, groupMask):
+        """Select a subset of the groups.
+
+        Parameters
+        ----------
+        groupMask : `numpy.array` [`bool`]
+            Which groups to keep; one entry per group.
+
+        Returns
+        -------
+        subset : `GroupedValues`
+            Values of the selected groups.
+        """
+        sizes = self.sizes[groupMask]
+        offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        return type(self)(self.values[self.rowMask(groupMask)], offsets, self.unit)
+
+    def toQuantity(self):
+        """Return all values as a single `astropy.units.Quantity`."""
+        return self.values * self.unit
+
+
+class ObjectVisitIndex:
+    """Sparse (object, visit) index of the rows of a matched catalog.
+
+    The rows are sorted by a combined (object, visit) key, so that the row of
+    any number of (object, visit) combinations is found with a single
+    `numpy.searchsorted`, instead of scanning the visits of each object.
+
+    Parameters
+    ----------
+    objectIndex : `numpy.array` [`int`]
+        Index of the object of each row.
+    visit : `numpy.array` [`int`]
+        Visit of each row.
+
+    Notes
+    -----
+    If an object has several rows in the same visit, the first one is
+    returned.
+    """
+
+    def __init__(self, objectIndex, visit):
+        self.visits, visitRank = np.unique(np.asarray(visit), return_inverse=True)
+        keys = np.asarray(objectIndex, dtype=np.int64) * len(self.visits) + visitRank
+        self._order = np.argsort(keys, kind="stable")
+        self._keys = keys[self._order]
+
+    def find(self, objectIndex, visit):
+        """Return the row of each (object, visit) combination.
+
+        Parameters
+        ----------
+        objectIndex : `numpy.array` [`int`]
+            Index of the objects.
+        visit : `int` or `numpy.array` [`int`]
+            Visits, or a single visit for all objects.
+
+        Returns
+        -------
+        rows : `numpy.array` [`int`]
+            Row of each combination, or -1 if the object was not observed in
+            the visit.
+        """
+        objectIndex = np.asarray(objectIndex, dtype=np.int64)
+        visit = np.broadcast_to(visit, objectIndex.shape)
+        if len(self._keys) == 0:
+            return np.full(objectIndex.shape, -1, dtype=np.int64)
+        visitRank = np.searchsorted(self.visits, visit)
+        visitRank = np.minimum(visitRank, len(self.visits) - 1)
+        keys = objectIndex * len(self.visits) + visitRank
+        positions = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+        found = (self.visits[visitRank] == visit) & (self._keys[positions] == keys)
+        return np.where(found, self._order[positions], -1)
@@ -0,0 +1,142 @@
+# This file is part of faro.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Columnar (Arrow/Parquet) representation of matched catalogs.
+
+The matched catalogs are persisted as tables sorted by object ID, so that
+the rows of each object are contiguous: the object offsets are recovered in
+a single pass by `lsst.faro.utils.matched_catalog.MatchedCatalogArrays.build`,
+and the row group statistics of the object column allow readers of the
+Parquet files to skip object ranges. The schema aliases of the catalog,
+e.g. ``slot_PsfFlux``, are stored in the table metadata and resolved when
+reading the table.
+"""
+
+import numpy as np
+
+__all__ = ("matchedCatalogToTable", "readMatchedTable", "resolveAlias")
+
+
+def matchedCatalogToTable(catalog, columns=None):
+    """Convert a matched catalog to a table sorted by object ID.
+
+    Parameters
+    ----------
+    catalog : `lsst.afw.table.SimpleCatalog`
+        Matched catalog, as produced by `lsst.afw.table.MultiMatch`.
+    columns : `list` [`str`], optional
+        Columns to keep, with their aliases resolved; all by default. The
+        ``object`` column is always kept.
+
+    Returns
+    -------
+    table : `astropy.table.Table`
+        Table of the matched sources, with one boolean column per flag,
+        sorted by object ID and with the alias map in ``meta["aliases"]``.
+    """
+    if not catalog.isContiguous():
+        catalog = catalog.copy(deep=True)
+    table = catalog.asAstropy(copy=True)
+    if "object" not in table.colnames:
+        # e.g. the empty catalog written when there are too few inputs
+        table["object"] = np.zeros(len(table), dtype=np.int64)
+    aliasMap = catalog.schema.getAliasMap()
+    aliases = {alias: aliasMap[alias] for alias in aliasMap.keys()}
+    if columns is not None:
+        names = ["object"] + [resolveAlias(name, aliases) for name in columns if name != "object"]
+        table = table[list(dict.fromkeys(names))]
+    table = table[np.argsort(table["object"], kind="stable")]
+    table.meta["aliases"] = aliases
+    return table
+
+
+def resolveAlias(name, aliases):
+    """Resolve the aliases of a column name, as `lsst.afw.table.Schema` does.
+
+    Parameters
+    ----------
+    name : `str`
+        Column name, possibly starting with an alias.
+    aliases : `dict` [`str`, `str`]
+        Target of each alias.
+
+    Returns
+    -------
+    name : `str`
+        Name of the column the name refers to.
+    """
+    for _ in range(len(aliases)):
+        for alias in sorted(aliases, key=len, reverse=True):
+            if name == alias or name.startswith(alias + "_"):
+                name = aliases[alias] + name[len(alias):]
+                break
+        else:
+            break
+    return name
+
+
+def readMatchedTable(handle, columns=None):
+    """Read some columns of a persisted matched table.
+
+    Parameters
+    ----------
+    handle : `lsst.daf.butler.DeferredDatasetHandle`
+        Handle of a matched table dataset, with storage class
+        ``ArrowAstropy``.
+    columns : `list` [`str`], optional
+        Columns to read, possibly through aliases; all by default. The
+        ``object`` column is always read.
+
+    Returns
+    -------
+    table : `astropy.table.Table`
+        Table with the ``object`` column and the requested columns, named
+        as requested. If all the columns are read, the columns named through
+        the aliases, e.g. ``slot_PsfFlux_mag``, are added as views of their
+        targets.
+    """
+    if columns is None:
+        table = handle.get()
+        _addAliasColumns(table, table.meta.get("aliases", {}))
+        return table
+
+    table = handle.get(parameters={"columns": ["object"]})
+    aliases = table.meta.get("aliases", {})
+    resolved = {name: resolveAlias(name, aliases) for name in columns if name != "object"}
+    targets = sorted(set(resolved.values()) - {"object"})
+    if targets:
+        data = handle.get(parameters={"columns": targets})
+        for name, target in resolved.items():
+            table[name] = data[target]
+    return table
+
+
+def _addAliasColumns(table, aliases):
+    """Add the columns named through the aliases to a table, as views of
+    the columns they resolve to."""
+    targets = {alias: resolveAlias(alias, aliases) for alias in aliases}
+    for column in list(table.colnames):
+        for alias, target in targets.items():
+            if column != target and not column.startswith(target + "_"):
+                continue
+            name = alias + column[len(target):]
+            if name not in table.colnames and resolveAlias(name, aliases) == column:
+                table.add_column(table[column], name=name, copy=False)
@@ -24,13 +24,17 @@ from lsst.afw.image import PhotoCalib
 from lsst.afw.table import (
     SchemaMapper,
     Field,
-    MultiMatch,
-    SimpleRecord,
+    SimpleCatalog,
+    SimpleTable,
     SourceCatalog,
     updateSourceCoords,
 )
 from lsst.faro.utils.calibrated_catalog import CalibratedCatalog
-from lsst.faro.utils.prefilter import preFilter
+from lsst.faro.utils.kdtree_matcher import KDTreeMultiMatch, makeMultiMatch
+from lsst.faro.utils.prefilter import preFilter, preSelect
+
+import concurrent.futures
+import itertools
 
 import numpy as np
 from astropy.table import join, Table
@@ -45,6 +49,23 @@ __all__ = (
 )
 
 
+# Code of each band, stored in the "filt" field of the matched catalogs
+filter_dict = {
+    "u": 1,
+    "g": 2,
+    "r": 3,
+    "i": 4,
+    "z": 5,
+    "y": 6,
+    "HSC-U": 1,
+    "HSC-G": 2,
+    "HSC-R": 3,
+    "HSC-I": 4,
+    "HSC-Z": 5,
+    "HSC-Y": 6,
+}
+
+
 def matchCatalogs(
         inputs: List[SourceCatalog],
         photoCalibs: List[PhotoCalib],
@@ -53,61 +74,89 @@ def matchCatalogs(
         matchRadius: float,
         config,
         logger=None,
+        wcs=None,
+        box=None,
+        keepSources=True,
+        previousMatched=None,
+        removeAmbiguous=True,
 ):
+    """Calibrate and match source catalogs from multiple visits.
+
+    Parameters
+    ----------
+    inputs : `list` [`lsst.afw.table.SourceCatalog`]
+        Source catalogs of each visit and detector.
+    photoCalibs : `list` [`lsst.afw.image.PhotoCalib`]
+        Photometric calibration of each catalog.
+    astromCalibs : `list` [`lsst.afw.geom.SkyWcs`]
+        Astrometric calibration of each catalog.
+    dataIds : `list`
+        Data ID of each catalog, with visit, detector and band.
+    matchRadius : `lsst.geom.Angle`
+        Match radius.
+    config : `lsst.faro.base.MatchedBaseConfig`
+        Configuration of the source selection and of the worker pool
+        preparing the catalogs.
+    logger : `logging.Logger`, optional
+        Logger.
+    wcs : `lsst.afw.geom.SkyWcs`, optional
+        WCS of the region to match, defining the pixel grid of the cells
+        when ``config.matchCellSize`` is not 0.
+    box : `lsst.geom.Box2D`, optional
+        Bounding box of the region to match, split into cells when
+        ``config.matchCellSize`` is not 0.
+    keepSources : `bool`, optional
+        Whether to concatenate all the calibrated and selected sources in
+        ``srcVis``. This holds a second copy of the sources in memory.
+    previousMatched : `lsst.afw.table.SimpleCatalog`, optional
+        Matched catalog of earlier visits, returned by this function with
+        the same configuration and ``removeAmbiguous=False``. The new
+        sources are matched against its objects and against each other, and
+        the output includes its records; the catalogs of its visits and
+        detectors must not be in ``inputs``. This requires the ``kdTree``
+        matching backend.
+    removeAmbiguous : `bool`, optional
+        Whether to remove the objects matched by several sources of the same
+        visit and detector. They are needed in ``previousMatched`` to find
+        them again when matching more visits.
+
+    Returns
+    -------
+    srcVis : `lsst.afw.table.SourceCatalog` or `None`
+        All the calibrated and selected sources, or `None` if
+        ``keepSources`` is `False`.
+    matchCat : `lsst.afw.table.SimpleCatalog`
+        Matched catalog, as returned by `lsst.afw.table.MultiMatch.finish`.
+
+    Notes
+    -----
+    If ``config.matchCellSize`` is not 0 and ``wcs`` and ``box`` are given,
+    the region is split into square cells, and the sources of each cell and
+    of a margin of two match radii around it are matched separately. See
+    `_matchInCells` for how the objects are stitched across the cells. The
+    cells are not used when matching against ``previousMatched``.
+    """
     schema = inputs[0].schema
-    mapper = SchemaMapper(schema)
-    mapper.addMinimalSchema(schema)
-    mapper.addOutputField(Field[float]("base_PsfFlux_snr", "PSF flux SNR"))
-    mapper.addOutputField(Field[float]("base_PsfFlux_mag", "PSF magnitude"))
-    mapper.addOutputField(
-        Field[float]("base_PsfFlux_magErr", "PSF magnitude uncertainty")
+    prefilterArgs = dict(
+        snrMin=config.snrMin,
+        snrMax=config.snrMax,
+        brightMagCut=config.brightMagCut,
+        faintMagCut=config.faintMagCut,
+        extended=config.selectExtended,
     )
-    # Needed because addOutputField(... 'slot_ModelFlux_mag') will add a field with that literal name
-    aliasMap = schema.getAliasMap()
-    # Possibly not needed since base_GaussianFlux is the default, but this ought to be safe
-    modelName = (
-        aliasMap["slot_ModelFlux"]
-        if "slot_ModelFlux" in aliasMap.keys()
-        else "base_GaussianFlux"
-    )
-    mapper.addOutputField(Field[float](f"{modelName}_mag", "Model magnitude"))
-    mapper.addOutputField(
-        Field[float](f"{modelName}_magErr", "Model magnitude uncertainty")
-    )
-    mapper.addOutputField(Field[float](f"{modelName}_snr", "Model flux snr"))
-    mapper.addOutputField(Field[float]("e1", "Source Ellipticity 1"))
-    mapper.addOutputField(Field[float]("e2", "Source Ellipticity 1"))
-    mapper.addOutputField(Field[float]("psf_e1", "PSF Ellipticity 1"))
-    mapper.addOutputField(Field[float]("psf_e2", "PSF Ellipticity 1"))
-    mapper.addOutputField(Field[np.int32]("filt", "filter code"))
-    newSchema = mapper.getOutputSchema()
-    newSchema.setAliasMap(schema.getAliasMap())
+    prepare = _CatalogPreparer(schema, prefilterArgs)
+    newSchema = prepare.schema
 
     # Create an object that matches multiple catalogs with same schema
-    mmatch = MultiMatch(
-        newSchema,
-        dataIdFormat={"visit": np.int64, "detector": np.int32},
-        radius=matchRadius,
-        RecordClass=SimpleRecord,
-    )
+    matcher = getattr(config, "matcher", "multiMatch")
+    mmatch = makeMultiMatch(newSchema, matchRadius, matcher)
+    if previousMatched is not None and len(previousMatched) > 0:
+        if not isinstance(mmatch, KDTreeMultiMatch):
+            raise ValueError("Matching against a previously matched catalog requires the kdTree matcher.")
+        mmatch.seed(previousMatched)
 
     # create the new extended source catalog
-    srcVis = SourceCatalog(newSchema)
-
-    filter_dict = {
-        "u": 1,
-        "g": 2,
-        "r": 3,
-        "i": 4,
-        "z": 5,
-        "y": 6,
-        "HSC-U": 1,
-        "HSC-G": 2,
-        "HSC-R": 3,
-        "HSC-I": 4,
-        "HSC-Z": 5,
-        "HSC-Y": 6,
-    }
+    srcVis = SourceCatalog(newSchema) if keepSources else None
 
     # Sort by visit, detector, then filter
     vislist = [v["visit"] for v in dataIds]
@@ -116,12 +165,13 @@ def matchCatalogs(
     tab_vids = Table([vislist, ccdlist, filtlist], names=["vis", "ccd", "filt"])
     sortinds = np.argsort(tab_vids, order=("vis", "ccd", "filt"))
 
+    tasks = []
     for ind in sortinds:
         oldSrc = inputs[ind]
         photoCalib = photoCalibs[ind]
-        wcs = astromCalibs[ind]
+        astromCalib = astromCalibs[ind]
         dataId = dataIds[ind]
-        if wcs is None:
+        if astromCalib is None:
             if logger:
                 logger.info("WCS is None for dataId %s.  Skipping...", dataId)
             continue
@@ -136,12 +186,450 @@ def matchCatalogs(
                 dataId["detector"],
                 dataId["visit"],
             )
+        tasks.append((oldSrc, photoCalib, astromCalib, filter_dict[dataId["band"]], dataId))
+
+    dataIdList = [task[4] for task in tasks]
+    cells = None
+    if (getattr(config, "matchCellSize", 0) > 0 and wcs is not None and box is not None
+            and (previousMatched is None or len(previousMatched) == 0)):
+        cells = _MatchCells(wcs, box, config.matchCellSize, matchRadius)
+        if cells.size == 1:
+            cells = None
+
+    if logger and getattr(config, "numWorkers", 1) > 1:
+        logger.verbose(
+            "Preparing %d catalogs with %d %s workers.",
+            len(tasks), config.numWorkers, config.workerPoolType,
+        )
+    prepared = _mapInPool(prepare, [task[:4] for task in tasks], config)
+    if cells is None:
+        _addCatalogs(mmatch, srcVis, prepared, dataIdList)
+
+        # Complete the match, returning a catalog that includes
+        # all matched sources with object IDs that can be used to group them.
+        matchCat = mmatch.finish(removeAmbiguous=removeAmbiguous)
+    else:
+        if srcVis is not None:
+            prepared = _extendSources(srcVis, prepared)
+        matchCat = _matchInCells(prepared, dataIdList, matchRadius, cells, config, logger=logger,
+                                 removeAmbiguous=removeAmbiguous)
+
+    # Create a mapping object that allows the matches to be manipulated
+    # as a mapping of object ID to catalog of sources.
+
+    # I don't think I can persist a group view, so this may need to be called in a subsequent task
+    # allMatches = GroupView.build(matchCat)
+
+    return srcVis, matchCat
+
+
+def _mapInPool(function, argsList, config, nCalls=None):
+    """Apply a function to lists of arguments, in the worker pool
+    configured by ``config.numWorkers`` and ``config.workerPoolType``.
+
+    Parameters
+    ----------
+    function : callable
+        Function to apply; it must be picklable for a process pool.
+    argsList : iterable [`tuple`]
+        Arguments of each call. They are consumed in batches of a few calls
+        per worker, so that an iterator only needs to hold the arguments of
+        the calls in flight.
+    config : `lsst.faro.base.MatchedBaseConfig`
+        Configuration of the worker pool.
+    nCalls : `int`, optional
+        Number of calls; required if ``argsList`` has no length.
+
+    Yields
+    ------
+    result
+        Result of each call, in the order of ``argsList``.
+    """
+    if nCalls is None:
+        nCalls = len(argsList)
+    numWorkers = min(getattr(config, "numWorkers", 1), nCalls)
+    if numWorkers <= 1:
+        for args in argsList:
+            yield function(*args)
+        return
+
+    if config.workerPoolType == "process":
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=numWorkers)
+        # Each chunk of calls sent to a process unpickles the function once,
+        # e.g. rebuilding the schema mapper of a _CatalogPreparer.
+        chunksize = max(1, nCalls // (4 * numWorkers))
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=numWorkers)
+        chunksize = 1
+    # Executor.map submits all of its calls at once
+    argsIter = iter(argsList)
+    batchSize = 2 * numWorkers * chunksize
+    with executor:
+        while True:
+            batch = list(itertools.islice(argsIter, batchSize))
+            if not batch:
+                break
+            # map returns the results in the order of the inputs
+            yield from executor.map(function, *zip(*batch), chunksize=chunksize)
+
+
+class _MatchCells:
+    """Square cells of a pixel grid in which sources are matched separately.
+
+    Parameters
+    ----------
+    wcs : `lsst.afw.geom.SkyWcs`
+        WCS of the pixel grid.
+    box : `lsst.geom.Box2D`
+        Bounding box split into cells. The outer cells extend to infinity,
+        so that every source belongs to one cell.
+    cellSize : `int`
+        Size of the cells in pixels.
+    matchRadius : `lsst.geom.Angle`
+        Match radius; the margin of the cells is twice the match radius.
+    """
+
+    def __init__(self, wcs, box, cellSize, matchRadius):
+        self.wcs = wcs
+        self.x0 = box.getMinX()
+        self.y0 = box.getMinY()
+        self.cellSize = cellSize
+        self.nx = max(1, int(np.ceil(box.getWidth() / cellSize)))
+        self.ny = max(1, int(np.ceil(box.getHeight() / cellSize)))
+        # The sources of an object are within one match radius of its first
+        # source, hence within two match radii of its mean position.
+        self.margin = 2 * matchRadius.asArcseconds() / wcs.getPixelScale().asArcseconds()
+
+    @property
+    def size(self):
+        """Number of cells (`int`)."""
+        return self.nx * self.ny
+
+    def pixels(self, catalog):
+        """Pixel positions of the records of a contiguous catalog."""
+        return self.wcs.skyToPixelArray(catalog["coord_ra"], catalog["coord_dec"], degrees=False)
+
+    def cellOf(self, x, y):
+        """Index of the cell containing each pixel position."""
+        ix = np.clip(np.floor((x - self.x0) / self.cellSize), 0, self.nx - 1).astype(int)
+        iy = np.clip(np.floor((y - self.y0) / self.cellSize), 0, self.ny - 1).astype(int)
+        return iy * self.nx + ix
+
+    def cellsNear(self, x, y):
+        """Indices of the cells which, with their margin, may contain some of
+        the pixel positions."""
+        finite = np.isfinite(x) & np.isfinite(y)
+        if not finite.any():
+            return []
+        x = x[finite]
+        y = y[finite]
+        ix = np.floor((np.array([x.min(), x.max()]) + [-self.margin, self.margin] - self.x0) / self.cellSize)
+        iy = np.floor((np.array([y.min(), y.max()]) + [-self.margin, self.margin] - self.y0) / self.cellSize)
+        ix = np.clip(ix, 0, self.nx - 1).astype(int)
+        iy = np.clip(iy, 0, self.ny - 1).astype(int)
+        return [jy * self.nx + jx for jy in range(iy[0], iy[1] + 1) for jx in range(ix[0], ix[1] + 1)]
+
+    def inCell(self, cell, x, y):
+        """Whether each pixel position is in a cell or in its margin."""
+        iy, ix = divmod(cell, self.nx)
+        xMin = self.x0 + ix * self.cellSize - self.margin if ix > 0 else -np.inf
+        xMax = self.x0 + (ix + 1) * self.cellSize + self.margin if ix < self.nx - 1 else np.inf
+        yMin = self.y0 + iy * self.cellSize - self.margin if iy > 0 else -np.inf
+        yMax = self.y0 + (iy + 1) * self.cellSize + self.margin if iy < self.ny - 1 else np.inf
+        return (x >= xMin) & (x < xMax) & (y >= yMin) & (y < yMax)
+
+
+def _matchCell(catalogs, dataIds, matchRadius, matcher, removeAmbiguous=True):
+    """Match the sources of one cell.
+
+    Parameters
+    ----------
+    catalogs : `list` [`lsst.afw.table.SourceCatalog`]
+        Prepared sources of each visit and detector in the cell and its
+        margin.
+    dataIds : `list`
+        Data ID of each catalog.
+    matchRadius : `lsst.geom.Angle`
+        Match radius.
+    matcher : `str`
+        Matching backend, as accepted by
+        `lsst.faro.utils.kdtree_matcher.makeMultiMatch`.
+    removeAmbiguous : `bool`, optional
+        Whether to remove the ambiguous objects.
+
+    Returns
+    -------
+    matchCat : `lsst.afw.table.SimpleCatalog`
+        Matched catalog of the cell.
+    """
+    mmatch = makeMultiMatch(catalogs[0].schema, matchRadius, matcher)
+    for catalog, dataId in zip(catalogs, dataIds):
+        mmatch.add(catalog=catalog, dataId=dataId)
+    return mmatch.finish(removeAmbiguous=removeAmbiguous)
+
+
+def _matchInCells(catalogs, dataIds, matchRadius, cells, config, logger=None, removeAmbiguous=True):
+    """Match prepared catalogs cell by cell and stitch the objects.
+
+    Parameters
+    ----------
+    catalogs : iterable of `lsst.afw.table.SourceCatalog`
+        Prepared sources of each visit and detector, in matching order.
+    dataIds : `list`
+        Data ID of each catalog.
+    matchRadius : `lsst.geom.Angle`
+        Match radius.
+    cells : `_MatchCells`
+        Cells in which the sources are matched.
+    config : `lsst.faro.base.MatchedBaseConfig`
+        Configuration of the worker pool matching the cells.
+    logger : `logging.Logger`, optional
+        Logger.
+    removeAmbiguous : `bool`, optional
+        Whether to remove the ambiguous objects of each cell.
+
+    Returns
+    -------
+    matchCat : `lsst.afw.table.SimpleCatalog`
+        Matched catalog of all the cells, with globally unique object IDs.
+
+    Notes
+    -----
+    Each cell is matched with the sources within two match radii of it, so
+    that the objects of the cell see all of their sources. An object is
+    owned by the cell containing its mean pixel position, and its object ID
+    is offset to be unique across the cells. The sources near the edges of
+    the cells are then resolved globally by `_stitchRows`: each source is
+    kept in the owned object whose mean position is nearest to it, or, if
+    no owned object has it, in its object of the cell containing it.
+
+    The sources of each cell and its margin are copied as the cell is
+    matched, so that only the prepared catalogs and the cells in flight are
+    resident.
+    """
+    catalogs = [catalog if catalog.isContiguous() else catalog.copy(deep=True) for catalog in catalogs]
+    positions = []
+    cellInputs = [[] for _ in range(cells.size)]
+    for index, catalog in enumerate(catalogs):
+        x, y = cells.pixels(catalog)
+        positions.append((x, y))
+        for cell in cells.cellsNear(x, y):
+            if cells.inCell(cell, x, y).any():
+                cellInputs[cell].append(index)
+
+    matcher = getattr(config, "matcher", "multiMatch")
+    cellList = [cell for cell in range(cells.size) if cellInputs[cell]]
+    argsList = _iterCellArgs(catalogs, positions, dataIds, cells, cellList, cellInputs,
+                             (matchRadius, matcher, removeAmbiguous))
+    if logger:
+        logger.verbose("Matching sources in %d non-empty cell(s) out of %d.", len(cellList), cells.size)
+
+    matchCat = None
+    owned = []
+    distances = []
+    objectOffset = 0
+    for cell, cellCat in zip(cellList, _mapInPool(_matchCell, argsList, config, nCalls=len(cellList))):
+        if matchCat is None:
+            matchCat = SimpleCatalog(cellCat.schema)
+        if len(cellCat) == 0:
+            continue
+        if not cellCat.isContiguous():
+            cellCat = cellCat.copy(deep=True)
+        objects, objectIndex = np.unique(cellCat["object"], return_inverse=True)
+        x, y = cells.pixels(cellCat)
+        counts = np.bincount(objectIndex)
+        meanX = np.bincount(objectIndex, weights=x) / counts
+        meanY = np.bincount(objectIndex, weights=y) / counts
+        cellOwned = (cells.cellOf(meanX, meanY) == cell)[objectIndex]
+        # Keep the rows of the owned objects, and the other rows of the
+        # sources of this cell in case no owned object has them
+        candidates = cellOwned | (cells.cellOf(x, y) == cell)
+        kept = cellCat[candidates].copy(deep=True)
+        kept["object"][:] += objectOffset
+        objectOffset += int(objects[-1])
+        matchCat.extend(kept, True)
+        owned.append(cellOwned[candidates])
+        distances.append(np.hypot(x - meanX[objectIndex], y - meanY[objectIndex])[candidates])
+
+    if matchCat is None:
+        return SimpleCatalog(SimpleTable.makeMinimalSchema())
+    if not matchCat.isContiguous():
+        matchCat = matchCat.copy(deep=True)
+    if len(matchCat) == 0:
+        return matchCat
+
+    _, sources = np.unique(
+        np.rec.fromarrays([matchCat["visit"], matchCat["detector"], matchCat["id"]]),
+        return_inverse=True,
+    )
+    selected = _stitchRows(sources.ravel(), np.concatenate(owned), np.concatenate(distances))
+    if not selected.all():
+        matchCat = matchCat[selected].copy(deep=True)
+    return matchCat
+
+
+def _iterCellArgs(catalogs, positions, dataIds, cells, cellList, cellInputs, matchArgs):
+    """Yield the arguments of `_matchCell` for each cell, copying the
+    sources of the cell and its margin only when they are requested."""
+    for cell in cellList:
+        cellCatalogs = []
+        for index in cellInputs[cell]:
+            x, y = positions[index]
+            cellCatalogs.append(catalogs[index][cells.inCell(cell, x, y)].copy(deep=True))
+        yield (cellCatalogs, [dataIds[index] for index in cellInputs[cell]]) + matchArgs
+
+
+def _stitchRows(sources, owned, distances):
+    """Select one row of each source among the matches of overlapping cells.
+
+    Parameters
+    ----------
+    sources : `numpy.ndarray` [`int`]
+        Index of the source of each row.
+    owned : `numpy.ndarray` [`bool`]
+        Whether the object of each row is owned by the cell it was matched
+        in. The rows of objects that are not owned must come from the cell
+        containing their source.
+    distances : `numpy.ndarray` [`float`]
+        Distance of the source of each row to the mean position of its
+        object.
+
+    Returns
+    -------
+    selected : `numpy.ndarray` [`bool`]
+        Whether each row is selected. Each source is selected once, in the
+        owned object nearest to it, or in the object of the cell containing
+        it if no owned object has it. The selection does not depend on the
+        order of the cells.
+    """
+    order = np.lexsort((distances, ~owned, sources))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = sources[order[1:]] != sources[order[:-1]]
+    selected = np.zeros(len(sources), dtype=bool)
+    selected[order[first]] = True
+    return selected
+
+
+def _extendSources(srcVis, catalogs):
+    """Add prepared catalogs to ``srcVis`` as they are iterated over."""
+    for tmpCat in catalogs:
+        srcVis.extend(tmpCat, False)
+        yield tmpCat
+
+
+def _addCatalogs(mmatch, srcVis, catalogs, dataIds):
+    """Add prepared catalogs to the match, in order, and to ``srcVis`` if
+    it is not `None`."""
+    for tmpCat, dataId in zip(catalogs, dataIds):
+        if srcVis is not None:
+            srcVis.extend(tmpCat, False)
+        mmatch.add(catalog=tmpCat, dataId=dataId)
+
+
+def _makeSchemaMapper(schema):
+    """Make the mapper from the input source schema to the schema of the
+    catalogs to match.
+
+    Parameters
+    ----------
+    schema : `lsst.afw.table.Schema`
+        Schema of the input source catalogs.
+
+    Returns
+    -------
+    mapper : `lsst.afw.table.SchemaMapper`
+        Mapper adding the calibrated quantities to the input schema.
+    newSchema : `lsst.afw.table.Schema`
+        Output schema of the mapper, with the aliases of the input schema.
+    """
+    mapper = SchemaMapper(schema)
+    mapper.addMinimalSchema(schema)
+    mapper.addOutputField(Field[float]("base_PsfFlux_snr", "PSF flux SNR"))
+    mapper.addOutputField(Field[float]("base_PsfFlux_mag", "PSF magnitude"))
+    mapper.addOutputField(
+        Field[float]("base_PsfFlux_magErr", "PSF magnitude uncertainty")
+    )
+    # Needed because addOutputField(... 'slot_ModelFlux_mag') will add a field with that literal name
+    aliasMap = schema.getAliasMap()
+    # Possibly not needed since base_GaussianFlux is the default, but this ought to be safe
+    modelName = (
+        aliasMap["slot_ModelFlux"]
+        if "slot_ModelFlux" in aliasMap.keys()
+        else "base_GaussianFlux"
+    )
+    mapper.addOutputField(Field[float](f"{modelName}_mag", "Model magnitude"))
+    mapper.addOutputField(
+        Field[float](f"{modelName}_magErr", "Model magnitude uncertainty")
+    )
+    mapper.addOutputField(Field[float](f"{modelName}_snr", "Model flux snr"))
+    mapper.addOutputField(Field[float]("e1", "Source Ellipticity 1"))
+    mapper.addOutputField(Field[float]("e2", "Source Ellipticity 1"))
+    mapper.addOutputField(Field[float]("psf_e1", "PSF Ellipticity 1"))
+    mapper.addOutputField(Field[float]("psf_e2", "PSF Ellipticity 1"))
+    mapper.addOutputField(Field[np.int32]("filt", "filter code"))
+    newSchema = mapper.getOutputSchema()
+    newSchema.setAliasMap(schema.getAliasMap())
+    return mapper, newSchema
+
+
+class _CatalogPreparer:
+    """Calibrate and select the sources of one detector catalog before
+    matching.
+
+    Parameters
+    ----------
+    schema : `lsst.afw.table.Schema` or `None`
+        Schema of the input source catalogs. If `None`, the schema mapper is
+        built from the schema of the first catalog prepared.
+    prefilterArgs : `dict`
+        Arguments passed to `lsst.faro.utils.prefilter.preFilter`.
+
+    Notes
+    -----
+    Instances are pickled without their schema mapper, which is rebuilt in
+    each worker process.
+    """
+
+    def __init__(self, schema, prefilterArgs):
+        self.prefilterArgs = prefilterArgs
+        self.mapper, self.schema = (None, None) if schema is None else _makeSchemaMapper(schema)
+
+    def __reduce__(self):
+        return (type(self), (None, self.prefilterArgs))
+
+    def __call__(self, oldSrc, photoCalib, wcs, filtnum):
+        """Prepare one catalog.
+
+        Parameters
+        ----------
+        oldSrc : `lsst.afw.table.SourceCatalog`
+            Source catalog of one visit and detector.
+        photoCalib : `lsst.afw.image.PhotoCalib`
+            Photometric calibration of the catalog.
+        wcs : `lsst.afw.geom.SkyWcs`
+            Astrometric calibration of the catalog.
+        filtnum : `int`
+            Code of the band of the catalog.
+
+        Returns
+        -------
+        tmpCat : `lsst.afw.table.SourceCatalog`
+            Calibrated and selected sources.
+        """
+        if self.mapper is None:
+            self.mapper, self.schema = _makeSchemaMapper(oldSrc.schema)
+
+        # Apply the cuts that do not depend on the calibrations first, so
+        # that only the selected sources are mapped and calibrated; the
+        # magnitude cuts are applied by preFilter below.
+        if not oldSrc.isContiguous():
+            oldSrc = oldSrc.copy(deep=True)
+        oldSrc = oldSrc[preSelect(oldSrc, **self.prefilterArgs)]
 
         # create temporary catalog
-        tmpCat = SourceCatalog(SourceCatalog(newSchema).table)
-        tmpCat.extend(oldSrc, mapper=mapper)
+        tmpCat = SourceCatalog(SourceCatalog(self.schema).table)
+        tmpCat.extend(oldSrc, mapper=self.mapper)
 
-        filtnum = filter_dict[dataId["band"]]
         tmpCat["filt"] = np.repeat(filtnum, len(oldSrc))
 
         tmpCat["base_PsfFlux_snr"][:] = (
@@ -156,31 +644,14 @@ def matchCatalogs(
         )
         photoCalib.instFluxToMagnitude(tmpCat, "slot_ModelFlux", "slot_ModelFlux")
 
-        _, psf_e1, psf_e2 = ellipticityFromCat(oldSrc, slot_shape="slot_PsfShape")
-        _, star_e1, star_e2 = ellipticityFromCat(oldSrc, slot_shape="slot_Shape")
+        _, psf_e1, psf_e2 = ellipticityFromCat(tmpCat, slot_shape="slot_PsfShape")
+        _, star_e1, star_e2 = ellipticityFromCat(tmpCat, slot_shape="slot_Shape")
         tmpCat["e1"][:] = star_e1
         tmpCat["e2"][:] = star_e2
         tmpCat["psf_e1"][:] = psf_e1
         tmpCat["psf_e2"][:] = psf_e2
 
-        tmpCat = preFilter(tmpCat, snrMin=config.snrMin, snrMax=config.snrMax,
-                           brightMagCut=config.brightMagCut, faintMagCut=config.faintMagCut,
-                           extended=config.selectExtended)
-
-        srcVis.extend(tmpCat, False)
-        mmatch.add(catalog=tmpCat, dataId=dataId)
-
-    # Complete the match, returning a catalog that includes
-    # all matched sources with object IDs that can be used to group them.
-    matchCat = mmatch.finish()
-
-    # Create a mapping object that allows the matches to be manipulated
-    # as a mapping of object ID to catalog of sources.
-
-    # I don't think I can persist a group view, so this may need to be called in a subsequent task
-    # allMatches = GroupView.build(matchCat)
-
-    return srcVis, matchCat
+        return preFilter(tmpCat, **self.prefilterArgs)
 
 
 def ellipticityFromCat(cat, slot_shape="slot_Shape"):
@@ -23,11 +23,12 @@ import numpy as np
 import astropy.units as u
 
 from lsst.faro.utils.filtermatches import filterMatches
+from lsst.faro.utils.matched_catalog import GroupedValues, MatchedCatalogArrays
 
 __all__ = ("photRepeat", "calcPhotRepeat")
 
 
-def photRepeat(matchedCatalog, magName=None, nMinPhotRepeat=50, **filterargs):
+def photRepeat(matchedCatalog, magName=None, nMinPhotRepeat=50, cache=None, **filterargs):
     """Measure the photometric repeatability of a set of observations.
 
     Parameters
@@ -39,6 +40,9 @@ def photRepeat(matchedCatalog, magName=None, nMinPhotRepeat=50, **filterargs):
         Name of the magnitude field. Default "slot_PsfFlux_mag".
     nMinPhotRepeat : `int`
         Minimum number of sources required to return a measurement.
+    cache : `lsst.faro.utils.matched_cache.MatchedCatalogCache`, optional
+        Cache in which to look up and store the filtered catalog and the
+        statistics.
     **filterargs
         Additional arguments to pass to `filterMatches` for catalog filtering.
 
@@ -51,12 +55,26 @@ def photRepeat(matchedCatalog, magName=None, nMinPhotRepeat=50, **filterargs):
     """
     if magName is None:
         magName = "slot_PsfFlux_mag"
-    filteredCat = filterMatches(matchedCatalog, **filterargs)
-    magKey = filteredCat.schema.find(magName).key
+    if cache is not None:
+        params = dict(magName=magName, nMinPhotRepeat=nMinPhotRepeat, **filterargs)
+        return cache.get(
+            matchedCatalog,
+            "photRepeat",
+            params,
+            lambda: _photRepeat(
+                filterMatches(matchedCatalog, asArrays=True, cache=cache, **filterargs),
+                magName,
+                nMinPhotRepeat,
+            ),
+        )
+    return _photRepeat(filterMatches(matchedCatalog, asArrays=True, **filterargs), magName, nMinPhotRepeat)
 
+
+def _photRepeat(filteredCat, magName, nMinPhotRepeat):
+    """Compute the statistics of `photRepeat` on a filtered catalog."""
     # Require at least nMinPhotRepeat objects to calculate the repeatability:
     if filteredCat.count > nMinPhotRepeat:
-        phot_resid_meas = calcPhotRepeat(filteredCat, magKey)
+        phot_resid_meas = calcPhotRepeat(filteredCat, magName)
         # Check that the number of stars with >2 visits is >nMinPhotRepeat:
         okcount = phot_resid_meas["count"] > 2
         if np.sum(okcount) > nMinPhotRepeat:
@@ -70,13 +88,16 @@ def photRepeat(matchedCatalog, magName=None, nMinPhotRepeat=50, **filterargs):
 def calcPhotRepeat(matches, magKey):
     """Calculate the photometric repeatability of a set of measurements.
 
+    All the statistics are computed in a single grouped pass over the
+    magnitude column.
+
     Parameters
     ----------
-    matches : `lsst.afw.table.GroupView`
-        `~lsst.afw.table.GroupView` of sources matched between visits using
-        MultiMatch, as provided by `lsst.faro.utils.matcher.matchCatalogs`.
-    magKey : `lsst.afw.table` schema key
-        Magnitude column key in the ``GroupView``.
+    matches : `lsst.afw.table.GroupView` or `MatchedCatalogArrays`
+        Sources matched between visits using MultiMatch, as provided by
+        `lsst.faro.utils.matcher.matchCatalogs`, grouped by object.
+    magKey : `lsst.afw.table` schema key or `str`
+        Magnitude column key in the ``GroupView``, or its name.
         E.g., ``magKey = allMatches.schema.find("slot_ModelFlux_mag").key``
         where ``allMatches`` is the result of `lsst.afw.table.MultiMatch.finish()`.
 
@@ -94,16 +115,25 @@ def calcPhotRepeat(matches, magKey):
         - ``repeatability``: scalar `~astropy.unit.Quantity` of the median ``rms``.
           This is calculated using all sources with more than 2 magnitude
           measurements, and reported in mmag.
-        - ``magResid``: `~astropy.unit.Quantity` array for each input source,
-          containing the magnitude residuals, in mmag, with respect to ``magMean``.
+        - ``magResid``: `~lsst.faro.utils.matched_catalog.GroupedValues` of
+          the magnitude residuals of each input source, in mmag, with
+          respect to ``magMean``.
     """
-    matches_rms = (matches.aggregate(np.nanstd, field=magKey) * u.mag).to(u.mmag)
-    matches_count = matches.aggregate(np.count_nonzero, field=magKey)
-    matches_mean = matches.aggregate(np.mean, field=magKey) * u.mag
-    magResid = []
-    for gp in matches.groups:
-        magResid.append(((gp[magKey] - np.mean(gp[magKey])) * (u.mag)).to(u.mmag))
-    magResid = np.array(magResid, dtype="object")
+    if isinstance(matches, MatchedCatalogArrays):
+        arrays = matches
+        mag = arrays[magKey]
+    else:
+        magName = magKey if isinstance(magKey, str) else matches.schema.find(magKey).field.getName()
+        arrays = MatchedCatalogArrays.fromGroupView(matches, [magName])
+        mag = arrays[magName]
+
+    matches_count = arrays.sum(mag != 0).astype(int)
+    magMean = arrays.mean(mag)
+    matches_rms = (arrays.nanstd(mag) * u.mag).to(u.mmag)
+    matches_mean = magMean * u.mag
+    magResid = GroupedValues(
+        (mag - arrays.broadcast(magMean)) * u.mag.to(u.mmag), arrays.offsets, u.mmag
+    )
     okrms = matches_count > 2
     if np.sum(okrms) > 0:
         return {
@@ -21,7 +21,37 @@
 
 import numpy as np
 
-__all__ = ("preFilter",)
+__all__ = ("preFilter", "preSelect")
+
+
+# Pixel flags rejecting a source
+_FLAGS = (
+    "base_PixelFlags_flag_saturated",
+    "base_PixelFlags_flag_cr",
+    "base_PixelFlags_flag_bad",
+    "base_PixelFlags_flag_edge",
+)
+
+
+def _selectionMask(sourceCatalog, snr, snrMin, snrMax, extended):
+    """Build the mask of the SNR, extendedness, flag and isPrimary cuts,
+    in place over the column arrays of a catalog."""
+    if snrMin is None:
+        snrMin = 50.0
+    if snrMax is None:
+        snrMax = np.inf
+
+    selected = snr > snrMin
+    selected &= snr < snrMax
+    extendedness = sourceCatalog["base_ClassificationExtendedness_value"]
+    if extended:
+        selected &= extendedness > 0.9
+    else:
+        selected &= extendedness < 0.1
+    for flag in _FLAGS:
+        selected &= ~sourceCatalog[flag]
+    selected &= sourceCatalog["detect_isPrimary"]
+    return selected
 
 
 def preFilter(
@@ -36,47 +66,89 @@ def preFilter(
     psfStars=None,
     photoCalibStars=None,
     astromCalibStars=None,
+    returnMask=False,
 ):
+    """Select the calibrated sources used for matching.
 
-    if snrMin is None:
-        snrMin = 50.0
-    if snrMax is None:
-        snrMax = np.inf
-    if extended is None:
-        extended = False
-
-    def filtSNR(cat):
-        oksnr = (cat["base_PsfFlux_snr"] > snrMin) & (cat["base_PsfFlux_snr"] < snrMax)
-        return oksnr
-
-    def filtMag(cat):
-        if (brightMagCut is not None) and (faintMagCut is not None):
-            okmag = (cat["base_PsfFlux_mag"] > brightMagCut) & (cat["base_PsfFlux_mag"] < faintMagCut)
-        else:
-            okmag = (cat["base_PsfFlux_mag"] < 30.0)
-        return okmag
-
-    def filtExtended(cat):
-        if extended:
-            sourceType = (cat["base_ClassificationExtendedness_value"] > 0.9)
-        else:
-            sourceType = (cat["base_ClassificationExtendedness_value"] < 0.1)
-        return sourceType
-
-    def filtFlags(cat):
-        flag_sat = ~cat["base_PixelFlags_flag_saturated"]
-        flag_cr = ~cat["base_PixelFlags_flag_cr"]
-        flag_bad = ~cat["base_PixelFlags_flag_bad"]
-        flag_edge = ~cat["base_PixelFlags_flag_edge"]
-        allflags = flag_sat & flag_cr & flag_bad & flag_edge
-        return allflags
-
-    def filtPrimary(cat):
-        is_primary = cat["detect_isPrimary"]
-        return is_primary
-
-    allfilt = filtSNR(sourceCatalog) & filtExtended(sourceCatalog) &\
-        filtFlags(sourceCatalog) & filtPrimary(sourceCatalog) &\
-        filtMag(sourceCatalog)
-
-    return sourceCatalog[allfilt]
+    Parameters
+    ----------
+    sourceCatalog : `lsst.afw.table.SourceCatalog`
+        Calibrated source catalog, with ``base_PsfFlux_snr`` and
+        ``base_PsfFlux_mag`` fields.
+    snrMin, snrMax : `float`, optional
+        SNR limits; 50 and infinity by default.
+    brightMagCut, faintMagCut : `float`, optional
+        Magnitude limits. If either is `None`, sources fainter than 30 are
+        rejected.
+    extended : `bool`, optional
+        Whether to select extended sources rather than point sources.
+    doFlags, isPrimary, psfStars, photoCalibStars, astromCalibStars : optional
+        Unused.
+    returnMask : `bool`, optional
+        Whether to return the selection mask rather than the selected
+        sources, e.g. to combine it with other selections.
+
+    Returns
+    -------
+    selected : `lsst.afw.table.SourceCatalog` or `numpy.ndarray` [`bool`]
+        Contiguous catalog of the selected sources, or whether each source
+        is selected if ``returnMask`` is `True`.
+
+    Notes
+    -----
+    The mask is taken on the columns of the input, so that only the
+    selected sources are copied.
+    """
+    columns = sourceCatalog
+    if not sourceCatalog.isContiguous():
+        # Read the columns of the cuts record by record rather than copying
+        # the whole catalog
+        columns = {
+            name: np.array([record[name] for record in sourceCatalog])
+            for name in ("base_PsfFlux_snr", "base_PsfFlux_mag",
+                         "base_ClassificationExtendedness_value", "detect_isPrimary") + _FLAGS
+        }
+
+    selected = _selectionMask(columns, columns["base_PsfFlux_snr"], snrMin, snrMax, extended)
+    mag = columns["base_PsfFlux_mag"]
+    if (brightMagCut is not None) and (faintMagCut is not None):
+        selected &= mag > brightMagCut
+        selected &= mag < faintMagCut
+    else:
+        selected &= mag < 30.0
+
+    if returnMask:
+        return selected
+    return sourceCatalog[selected].copy(deep=True)
+
+
+def preSelect(
+    sourceCatalog,
+    snrMin=None,
+    snrMax=None,
+    extended=None,
+    **kwargs,
+):
+    """Select the sources of an uncalibrated catalog that pass the cuts of
+    `preFilter` not depending on calibrated quantities.
+
+    Parameters
+    ----------
+    sourceCatalog : `lsst.afw.table.SourceCatalog`
+        Contiguous source catalog, as measured.
+    snrMin, snrMax : `float`, optional
+        SNR limits, applied to the PSF instFlux over its uncertainty; same
+        defaults as `preFilter`.
+    extended : `bool`, optional
+        Whether to select extended sources rather than point sources.
+    **kwargs
+        Other arguments of `preFilter`, ignored.
+
+    Returns
+    -------
+    selected : `numpy.ndarray` [`bool`]
+        Whether each source passes the SNR, extendedness, flag and
+        isPrimary cuts of `preFilter`.
+    """
+    snr = sourceCatalog["base_PsfFlux_instFlux"] / sourceCatalog["base_PsfFlux_instFluxErr"]
+    return _selectionMask(sourceCatalog, snr, snrMin, snrMax, extended)
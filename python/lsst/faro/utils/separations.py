@@ -22,24 +22,41 @@
 import numpy as np
 import astropy.units as u
 import logging
+from scipy.spatial import cKDTree
 import lsst.geom as geom
 from lsst.faro.utils.filtermatches import filterMatches
-from lsst.faro.utils.coord_util import averageRaFromCat, averageDecFromCat, sphDist
+from lsst.faro.utils.coord_util import groupAverageRaDec, sphDist
+from lsst.faro.utils.matched_catalog import (
+    MatchedCatalogArrays,
+    ObjectVisitIndex,
+    groupMedian,
+    groupStd,
+)
 
 __all__ = (
     "astromRms",
     "astromResiduals",
     "calcRmsDistances",
+    "calcRmsDistancesInAnnuli",
     "calcSepOutliers",
+    "calcPairStatistics",
+    "registerPairReducer",
+    "annulusPairDistances",
+    "annuliPairDistances",
+    "findPairsInAnnulus",
+    "findPairsInAnnuli",
     "matchVisitComputeDistance",
+    "matchVisitComputeDistances",
     "calcRmsDistancesVsRef",
+    "calcRmsDistancesVsRefVisits",
 )
 
 
 def astromRms(
-    matchedCatalog, mag_bright_cut, mag_faint_cut, annulus_r, width, **filterargs
+    matchedCatalog, mag_bright_cut, mag_faint_cut, annulus_r, width, cache=None, withUnits=True,
+    **filterargs
 ):
-    filteredCat = filterMatches(matchedCatalog, **filterargs)
+    filteredCat = filterMatches(matchedCatalog, asArrays=True, cache=cache, **filterargs)
 
     magRange = np.array([mag_bright_cut, mag_faint_cut]) * u.mag
     D = annulus_r * u.arcmin
@@ -50,7 +67,7 @@ def astromRms(
     nMinMeas = 2
     if filteredCat.count > nMinMeas:
         astrom_resid_rms_meas = calcRmsDistances(
-            filteredCat, annulus, magRange=magRange
+            filteredCat, annulus, magRange=magRange, cache=cache, withUnits=withUnits
         )
         return astrom_resid_rms_meas
     else:
@@ -58,9 +75,10 @@ def astromRms(
 
 
 def astromResiduals(
-    matchedCatalog, mag_bright_cut, mag_faint_cut, annulus_r, width, **filterargs
+    matchedCatalog, mag_bright_cut, mag_faint_cut, annulus_r, width, cache=None, withUnits=True,
+    **filterargs
 ):
-    filteredCat = filterMatches(matchedCatalog, **filterargs)
+    filteredCat = filterMatches(matchedCatalog, asArrays=True, cache=cache, **filterargs)
 
     magRange = np.array([mag_bright_cut, mag_faint_cut]) * u.mag
     D = annulus_r * u.arcmin
@@ -70,18 +88,21 @@ def astromResiduals(
     # Require at least 2 measurements to calculate the repeatability:
     nMinMeas = 2
     if filteredCat.count > nMinMeas:
-        astrom_resid_meas = calcSepOutliers(filteredCat, annulus, magRange=magRange)
+        astrom_resid_meas = calcSepOutliers(
+            filteredCat, annulus, magRange=magRange, cache=cache, withUnits=withUnits
+        )
         return astrom_resid_meas
     else:
         return {"nomeas": np.nan * u.marcsec}
 
 
-def calcRmsDistances(groupView, annulus, magRange, verbose=False):
+def calcRmsDistances(groupView, annulus, magRange, verbose=False, cache=None, withUnits=True):
     """Calculate the RMS distance of a set of matched objects over visits.
     Parameters
     ----------
-    groupView : lsst.afw.table.GroupView
-        GroupView object of matched observations from MultiMatch.
+    groupView : `lsst.afw.table.GroupView` or `MatchedCatalogArrays`
+        Matched observations from MultiMatch, grouped by object, e.g. as
+        returned by `filterMatches` with ``asArrays=True``.
     annulus : length-2 `astropy.units.Quantity`
         Distance range (i.e., arcmin) in which to compare objects.
         E.g., `annulus=np.array([19, 21]) * u.arcmin` would consider all
@@ -90,90 +111,63 @@ def calcRmsDistances(groupView, annulus, magRange, verbose=False):
         Magnitude range from which to select objects.
     verbose : bool, optional
         Output additional information on the analysis steps.
+    cache : `lsst.faro.utils.matched_cache.MatchedCatalogCache`, optional
+        Cache in which to look up and store the pair distances.
+    withUnits : `bool`, optional
+        Whether to return `astropy.units.Quantity` in radians, rather than
+        plain arrays in radians.
     Returns
     -------
-    rmsDistances : `astropy.units.Quantity`
+    rmsDistances : `astropy.units.Quantity` or `numpy.array`
         RMS angular separations of a set of matched objects over visits.
     """
-    log = logging.getLogger(__name__)
-
-    # First we make a list of the keys that we want the fields for
-    importantKeys = [
-        groupView.schema.find(name).key
-        for name in [
-            "id",
-            "coord_ra",
-            "coord_dec",
-            "object",
-            "visit",
-            "base_PsfFlux_mag",
-        ]
-    ]
-
-    minMag, maxMag = magRange.to(u.mag).value
+    return calcRmsDistancesInAnnuli(
+        groupView, [annulus], magRange, verbose=verbose, cache=cache, withUnits=withUnits
+    )[0]
 
-    def magInRange(cat):
-        mag = cat["base_PsfFlux_mag"]
-        (w,) = np.where(np.isfinite(mag))
-        medianMag = np.median(mag[w])
-        return minMag <= medianMag and medianMag < maxMag
 
-    groupViewInMagRange = groupView.where(magInRange)
+def calcRmsDistancesInAnnuli(groupView, annuli, magRange, verbose=False, cache=None, withUnits=True):
+    """Calculate the RMS distance of a set of matched objects over visits,
+    for the pairs of objects in each of several annuli.
 
-    # List of lists of id, importantValue
-    matchKeyOutput = [
-        obj[key] for key in importantKeys for obj in groupViewInMagRange.groups
-    ]
-
-    jump = len(groupViewInMagRange)
-
-    ra = matchKeyOutput[1 * jump: 2 * jump]
-    dec = matchKeyOutput[2 * jump: 3 * jump]
-    visit = matchKeyOutput[4 * jump: 5 * jump]
-
-    # Calculate the mean position of each object from its constituent visits
-    # `aggregate` calculates a quantity for each object in the groupView.
-    meanRa = groupViewInMagRange.aggregate(averageRaFromCat)
-    meanDec = groupViewInMagRange.aggregate(averageDecFromCat)
-
-    annulusRadians = arcminToRadians(annulus.to(u.arcmin).value)
-
-    rmsDistances = list()
-    for obj1, (ra1, dec1, visit1) in enumerate(zip(meanRa, meanDec, visit)):
-        dist = sphDist(ra1, dec1, meanRa[obj1 + 1:], meanDec[obj1 + 1:])
-        (objectsInAnnulus,) = np.where(
-            (annulusRadians[0] <= dist) & (dist < annulusRadians[1])
-        )
-        objectsInAnnulus += obj1 + 1
-        for obj2 in objectsInAnnulus:
-            distances = matchVisitComputeDistance(
-                visit[obj1], ra[obj1], dec[obj1], visit[obj2], ra[obj2], dec[obj2]
-            )
-            if not distances:
-                if verbose:
-                    log.debug(
-                        "No matching visits " "found for objs: %d and %d" % obj1, obj2
-                    )
-                continue
-
-            (finiteEntries,) = np.where(np.isfinite(distances))
-            # Need at least 2 distances to get a finite sample stdev
-            if len(finiteEntries) > 1:
-                # ddof=1 to get sample standard deviation (e.g., 1/(n-1))
-                rmsDist = np.std(np.array(distances)[finiteEntries], ddof=1)
-                rmsDistances.append(rmsDist)
+    The pairs of all annuli are found in a single neighbor search, so that
+    the smaller annuli share the enumeration of the largest one.
 
-    # return quantity
-    rmsDistances = np.array(rmsDistances) * u.radian
-    return rmsDistances
+    Parameters
+    ----------
+    groupView : `lsst.afw.table.GroupView` or `MatchedCatalogArrays`
+        Matched observations from MultiMatch, grouped by object, e.g. as
+        returned by `filterMatches` with ``asArrays=True``.
+    annuli : `list` of length-2 `astropy.units.Quantity`
+        Distance ranges (i.e., arcmin) in which to compare objects.
+    magRange : length-2 `astropy.units.Quantity`
+        Magnitude range from which to select objects.
+    verbose : bool, optional
+        Output additional information on the analysis steps.
+    cache : `lsst.faro.utils.matched_cache.MatchedCatalogCache`, optional
+        Cache in which to look up and store the pair distances.
+    withUnits : `bool`, optional
+        Whether to return `astropy.units.Quantity` in radians, rather than
+        plain arrays in radians.
+    Returns
+    -------
+    rmsDistances : `list` [`astropy.units.Quantity` or `numpy.array`]
+        RMS angular separations of the pairs of objects in each annulus.
+    """
+    statistics = calcPairStatistics(
+        groupView, annuli, magRange, ["rmsDistances"], verbose=verbose, cache=cache,
+        withUnits=withUnits,
+    )
+    return [annulusStatistics["rmsDistances"] for annulusStatistics in statistics]
 
 
-def calcSepOutliers(groupView, annulus, magRange, verbose=False):
+def calcSepOutliers(groupView, annulus, magRange, verbose=False, cache=None, withUnits=True):
     """Calculate the RMS distance of a set of matched objects over visits.
     Parameters
     ----------
-    groupView : lsst.afw.table.GroupView
-        GroupView object of matched observations from MultiMatch.
+    groupView : `lsst.afw.table.GroupView` or `MatchedCatalogArrays`
+        Matched observations from MultiMatch, grouped by object, e.g. as
+        returned by `filterMatches` with ``asArrays=True``.
     annulus : length-2 `astropy.units.Quantity`
         Distance range (i.e., arcmin) in which to compare objects.
         E.g., `annulus=np.array([19, 21]) * u.arcmin` would consider all
@@ -182,87 +176,376 @@ def calcSepOutliers(groupView, annulus, magRange, verbose=False):
         Magnitude range from which to select objects.
     verbose : bool, optional
         Output additional information on the analysis steps.
+    cache : `lsst.faro.utils.matched_cache.MatchedCatalogCache`, optional
+        Cache in which to look up and store the pair distances.
+    withUnits : `bool`, optional
+        Whether to return `astropy.units.Quantity` in radians, rather than
+        plain arrays in radians.
     Returns
     -------
-    rmsDistances : `astropy.units.Quantity`
+    rmsDistances : `astropy.units.Quantity` or `numpy.array`
         RMS angular separations of a set of matched objects over visits.
     """
 
+    statistics = calcPairStatistics(
+        groupView, [annulus], magRange, ["sepResiduals"], verbose=verbose, cache=cache,
+        withUnits=withUnits,
+    )
+    return statistics[0]["sepResiduals"]
+
+
+# Reducers of the shared-visit distances of pairs of objects, by name. Each
+# takes the distances in radians, grouped by pair, and the offsets of the
+# pairs, and returns a plain array in radians; units are attached by
+# calcPairStatistics if requested.
+_pairReducers = {}
+
+
+def registerPairReducer(name):
+    """Decorator registering a reducer for `calcPairStatistics`.
+
+    Parameters
+    ----------
+    name : `str`
+        Name under which the reducer is requested.
+    """
+    def decorator(reducer):
+        _pairReducers[name] = reducer
+        return reducer
+
+    return decorator
+
+
+@registerPairReducer("rmsDistances")
+def _rmsDistances(distances, pairOffsets):
+    """RMS of the distances of each pair with at least 2 shared visits."""
+    nDistances = np.diff(pairOffsets)
+    # Need at least 2 distances to get a finite sample stdev
+    # ddof=1 to get sample standard deviation (e.g., 1/(n-1))
+    return groupStd(distances, pairOffsets, ddof=1)[nDistances > 1]
+
+
+@registerPairReducer("sepResiduals")
+def _sepResiduals(distances, pairOffsets):
+    """Absolute deviation of the distances of each pair from their median."""
+    nDistances = np.diff(pairOffsets)
+    pairIndex = np.repeat(np.arange(len(nDistances)), nDistances)
+    # Need at least 3 matched pairs so that the median position makes sense
+    # and get rid of zeros from stars measured against themselves:
+    keep = (nDistances >= 3)[pairIndex] & (distances > 0.0)
+    realDistances = distances[keep]
+    pairIndex = pairIndex[keep]
+    realOffsets = np.zeros(len(nDistances) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pairIndex, minlength=len(nDistances)), out=realOffsets[1:])
+    medianDistances = groupMedian(realDistances, realOffsets)
+
+    return np.abs(realDistances - medianDistances[pairIndex])
+
+
+def calcPairStatistics(groupView, annuli, magRange, reducers, verbose=False, cache=None, withUnits=True):
+    """Compute statistics of the separations of pairs of matched objects over
+    visits, for the pairs in each of several annuli.
+
+    The pairs and their shared-visit distances are computed once for all
+    annuli and reducers, and each requested reducer is applied to them.
+
+    Parameters
+    ----------
+    groupView : `lsst.afw.table.GroupView` or `MatchedCatalogArrays`
+        Matched observations from MultiMatch, grouped by object, e.g. as
+        returned by `filterMatches` with ``asArrays=True``.
+    annuli : `list` of length-2 `astropy.units.Quantity`
+        Distance ranges (i.e., arcmin) in which to compare objects.
+    magRange : length-2 `astropy.units.Quantity`
+        Magnitude range from which to select objects.
+    reducers : `list` [`str`]
+        Names of the statistics to compute, as registered with
+        `registerPairReducer`: ``"rmsDistances"`` for the RMS distance of
+        each pair, ``"sepResiduals"`` for the deviations of the distances
+        from the median distance of each pair.
+    verbose : bool, optional
+        Output additional information on the analysis steps.
+    cache : `lsst.faro.utils.matched_cache.MatchedCatalogCache`, optional
+        Cache in which to look up and store the pair distances and the
+        statistics.
+    withUnits : `bool`, optional
+        Whether to return `astropy.units.Quantity` in radians, rather than
+        plain arrays in radians.
+
+    Returns
+    -------
+    statistics : `list` [`dict`]
+        For each annulus, the statistic computed by each reducer, keyed by
+        its name.
+    """
     log = logging.getLogger(__name__)
 
-    # First we make a list of the keys that we want the fields for
-    importantKeys = [
-        groupView.schema.find(name).key
-        for name in [
-            "id",
-            "coord_ra",
-            "coord_dec",
-            "object",
-            "visit",
-            "base_PsfFlux_mag",
+    for name in reducers:
+        if name not in _pairReducers:
+            raise ValueError(f"Unknown pair reducer: {name}")
+
+    statistics = []
+    for annulus, (obj1, obj2, distances, pairOffsets) in zip(
+        annuli, annuliPairDistances(groupView, annuli, magRange, cache=cache)
+    ):
+        if verbose:
+            for pair in np.where(np.diff(pairOffsets) == 0)[0]:
+                log.debug(
+                    "No matching visits found for objs: %d and %d", obj1[pair], obj2[pair]
+                )
+
+        annulusStatistics = {}
+        for name in reducers:
+            if cache is None:
+                annulusStatistics[name] = _pairReducers[name](distances, pairOffsets)
+            else:
+                annulusStatistics[name] = cache.get(
+                    groupView,
+                    "pairStatistic",
+                    dict(
+                        reducer=name,
+                        annulus=annulus.to(u.arcmin),
+                        magRange=magRange.to(u.mag),
+                    ),
+                    lambda: _pairReducers[name](distances, pairOffsets),
+                )
+        if withUnits:
+            annulusStatistics = {name: value * u.radian for name, value in annulusStatistics.items()}
+        statistics.append(annulusStatistics)
+    return statistics
+
+
+def annulusPairDistances(groupView, annulus, magRange, cache=None):
+    """Find the pairs of objects separated by a distance within an annulus,
+    and compute their separation in each visit shared by both objects.
+
+    Parameters
+    ----------
+    groupView : `lsst.afw.table.GroupView` or `MatchedCatalogArrays`
+        Matched observations from MultiMatch, grouped by object, e.g. as
+        returned by `filterMatches` with ``asArrays=True``.
+    annulus : length-2 `astropy.units.Quantity`
+        Distance range (i.e., arcmin) in which to compare objects.
+    magRange : length-2 `astropy.units.Quantity`
+        Magnitude range from which to select objects.
+    cache : `lsst.faro.utils.matched_cache.MatchedCatalogCache`, optional
+        Cache in which to look up and store the result.
+
+    Returns
+    -------
+    obj1, obj2 : `numpy.array` [`int`]
+        Indices of the objects of each pair, among the objects of
+        ``groupView`` within ``magRange``.
+    distances : `numpy.array` [`float`]
+        Separations in radians in the shared visits, grouped by pair.
+    pairOffsets : `numpy.array` [`int`]
+        Offsets of the pairs in ``distances``.
+    """
+    return annuliPairDistances(groupView, [annulus], magRange, cache=cache)[0]
+
+
+def annuliPairDistances(groupView, annuli, magRange, cache=None):
+    """Compute the pair distances of `annulusPairDistances` for several
+    annuli, with a single neighbor search.
+
+    Parameters
+    ----------
+    groupView : `lsst.afw.table.GroupView` or `MatchedCatalogArrays`
+        Matched observations from MultiMatch, grouped by object, e.g. as
+        returned by `filterMatches` with ``asArrays=True``.
+    annuli : `list` of length-2 `astropy.units.Quantity`
+        Distance ranges (i.e., arcmin) in which to compare objects.
+    magRange : length-2 `astropy.units.Quantity`
+        Magnitude range from which to select objects.
+    cache : `lsst.faro.utils.matched_cache.MatchedCatalogCache`, optional
+        Cache in which to look up and store the result for each annulus.
+
+    Returns
+    -------
+    results : `list` [`tuple`]
+        For each annulus, the ``(obj1, obj2, distances, pairOffsets)``
+        returned by `annulusPairDistances`.
+    """
+    results = [None] * len(annuli)
+    if cache is not None:
+        params = [
+            dict(annulus=annulus.to(u.arcmin), magRange=magRange.to(u.mag))
+            for annulus in annuli
         ]
-    ]
+        for i in range(len(annuli)):
+            results[i] = cache.lookup(groupView, "annulusPairDistances", params[i])
+    missing = [i for i, result in enumerate(results) if result is None]
+    if not missing:
+        return results
 
     minMag, maxMag = magRange.to(u.mag).value
 
-    def magInRange(cat):
-        mag = cat["base_PsfFlux_mag"]
-        (w,) = np.where(np.isfinite(mag))
-        medianMag = np.median(mag[w])
-        return minMag <= medianMag and medianMag < maxMag
+    arrays = _groupArrays(groupView, ["coord_ra", "coord_dec", "visit", "base_PsfFlux_mag"])
+    # Select the objects by their median finite magnitude
+    medianMag = arrays.finiteMedian("base_PsfFlux_mag")
+    arrays = arrays.where((minMag <= medianMag) & (medianMag < maxMag))
 
-    groupViewInMagRange = groupView.where(magInRange)
+    # Calculate the mean position of each object from its constituent visits
+    meanRa, meanDec = groupAverageRaDec(
+        arrays["coord_ra"], arrays["coord_dec"], arrays.offsets
+    )
+
+    annuliRadians = [arcminToRadians(annuli[i].to(u.arcmin).value) for i in missing]
+
+    pairs = findPairsInAnnuli(meanRa, meanDec, annuliRadians)
+    for i, (obj1, obj2) in zip(missing, pairs):
+        distances, pairOffsets = matchVisitComputeDistances(
+            arrays["visit"],
+            arrays["coord_ra"],
+            arrays["coord_dec"],
+            arrays.offsets,
+            obj1,
+            obj2,
+        )
+        results[i] = (obj1, obj2, distances, pairOffsets)
+        if cache is not None:
+            cache.put(groupView, "annulusPairDistances", params[i], results[i])
+    return results
 
-    # List of lists of id, importantValue
-    matchKeyOutput = [
-        obj[key] for key in importantKeys for obj in groupViewInMagRange.groups
-    ]
 
-    jump = len(groupViewInMagRange)
+def findPairsInAnnulus(ra, dec, annulus, chunkSize=10000, maxCandidates=2**20):
+    """Find all pairs of positions whose separation lies within an annulus.
 
-    ra = matchKeyOutput[1 * jump: 2 * jump]
-    dec = matchKeyOutput[2 * jump: 3 * jump]
-    visit = matchKeyOutput[4 * jump: 5 * jump]
+    A k-d tree built on the unit vectors of the positions is used so that only
+    candidate pairs closer than the outer radius of the annulus are examined,
+    instead of computing the distance between every pair of positions.
 
-    # Calculate the mean position of each object from its constituent visits
-    # `aggregate` calulates a quantity for each object in the groupView.
-    meanRa = groupViewInMagRange.aggregate(averageRaFromCat)
-    meanDec = groupViewInMagRange.aggregate(averageDecFromCat)
+    Parameters
+    ----------
+    ra : `numpy.array` [`float`]
+        RA of the positions in radians.
+    dec : `numpy.array` [`float`]
+        Dec of the positions in radians.
+    annulus : length-2 `numpy.array` [`float`]
+        Inner and outer radius of the annulus in radians. Pairs separated by
+        ``annulus[0] <= dist < annulus[1]`` are returned.
+    chunkSize : `int`, optional
+        Maximum number of positions searched at once.
+    maxCandidates : `int`, optional
+        Maximum number of candidate pairs held at once, which bounds the
+        memory used by the search.
 
-    annulusRadians = arcminToRadians(annulus.to(u.arcmin).value)
+    Returns
+    -------
+    obj1, obj2 : `numpy.array` [`int`]
+        Indices of the two members of each pair, with ``obj1 < obj2``,
+        sorted by ``obj1`` and then by ``obj2``.
+    """
+    return findPairsInAnnuli(
+        ra, dec, [annulus], chunkSize=chunkSize, maxCandidates=maxCandidates
+    )[0]
 
-    sepResiduals = list()
-    for obj1, (ra1, dec1, visit1) in enumerate(zip(meanRa, meanDec, visit)):
-        dist = sphDist(ra1, dec1, meanRa[obj1 + 1:], meanDec[obj1 + 1:])
-        (objectsInAnnulus,) = np.where(
-            (annulusRadians[0] <= dist) & (dist < annulusRadians[1])
+
+def findPairsInAnnuli(ra, dec, annuli, chunkSize=10000, maxCandidates=2**20):
+    """Find the pairs of positions whose separation lies within each of
+    several annuli, with a single neighbor search.
+
+    Candidate pairs are enumerated once, up to the largest outer radius, and
+    each one is assigned to every annulus containing its separation. The
+    positions are searched in chunks sized from their number of neighbors
+    within the outer radius, so that the memory used stays bounded even
+    when the outer radius covers the whole field.
+
+    Parameters
+    ----------
+    ra : `numpy.array` [`float`]
+        RA of the positions in radians.
+    dec : `numpy.array` [`float`]
+        Dec of the positions in radians.
+    annuli : `list` of length-2 `numpy.array` [`float`]
+        Inner and outer radius of each annulus in radians. Annuli may
+        overlap.
+    chunkSize : `int`, optional
+        Maximum number of positions searched at once.
+    maxCandidates : `int`, optional
+        Maximum number of candidate pairs held at once, unless a single
+        position has more neighbors than that within the outer radius.
+
+    Returns
+    -------
+    pairs : `list` [`tuple`]
+        For each annulus, the ``(obj1, obj2)`` indices of the pairs, as
+        returned by `findPairsInAnnulus`.
+    """
+    ra = np.asarray(ra, dtype=float)
+    dec = np.asarray(dec, dtype=float)
+    (good,) = np.where(np.isfinite(ra) & np.isfinite(dec))
+    if len(good) < 2 or len(annuli) == 0:
+        return [(np.zeros(0, dtype=int), np.zeros(0, dtype=int)) for _ in annuli]
+
+    xyz = np.column_stack(
+        (
+            np.cos(dec[good]) * np.cos(ra[good]),
+            np.cos(dec[good]) * np.sin(ra[good]),
+            np.sin(dec[good]),
+        )
+    )
+
+    # Chord lengths corresponding to the radii of the annuli. They are padded
+    # slightly so that pairs right at the edge are decided by sphDist below,
+    # exactly as for a direct comparison of all pairs.
+    chordRanges = [
+        (
+            2 * np.sin(min(annulus[0], np.pi) / 2) * (1 - 1e-9) - 1e-15,
+            2 * np.sin(min(annulus[1], np.pi) / 2) * (1 + 1e-9) + 1e-15,
         )
-        objectsInAnnulus += obj1 + 1
-        for obj2 in objectsInAnnulus:
-            distances = matchVisitComputeDistance(
-                visit[obj1], ra[obj1], dec[obj1], visit[obj2], ra[obj2], dec[obj2]
-            )
-            if not distances:
-                if verbose:
-                    log.debug(
-                        "No matching visits found " "for objs: %d and %d" % obj1, obj2
-                    )
-                continue
-
-            (finiteEntries,) = np.where(np.isfinite(distances))
-            # Need at least 3 matched pairs so that the median position makes sense
-            if len(finiteEntries) >= 3:
-                okdist = np.array(distances)[finiteEntries]
-                # Get rid of zeros from stars measured against themselves:
-                (realdist,) = np.where(okdist > 0.0)
-                if np.size(realdist) > 0:
-                    sepResiduals.append(
-                        np.abs(okdist[realdist] - np.median(okdist[realdist]))
-                    )
-
-    if len(sepResiduals) > 0:
-        sepResiduals = np.concatenate(sepResiduals) * u.radian
-    return sepResiduals
+        for annulus in annuli
+    ]
+    # Annuli wider than the positions cannot contain any pair, and would
+    # otherwise make every pair a candidate
+    extent = 2 * np.max(np.linalg.norm(xyz - xyz.mean(axis=0), axis=1))
+    active = [minChord <= extent for minChord, _ in chordRanges]
+    if not any(active):
+        return [(np.zeros(0, dtype=int), np.zeros(0, dtype=int)) for _ in annuli]
+    maxChord = max(outerChord for (_, outerChord), a in zip(chordRanges, active) if a)
+
+    tree = cKDTree(xyz)
+
+    # Count the candidates of each position without building them
+    nCandidates = np.cumsum(tree.query_ball_point(xyz, maxChord, return_length=True))
+
+    obj1Lists = [[] for _ in annuli]
+    obj2Lists = [[] for _ in annuli]
+    start = 0
+    while start < len(good):
+        before = nCandidates[start - 1] if start > 0 else 0
+        stop = np.searchsorted(nCandidates, before + maxCandidates, side="right")
+        stop = min(max(stop, start + 1), start + chunkSize)
+        chunkTree = cKDTree(xyz[start:stop])
+        candidates = chunkTree.sparse_distance_matrix(
+            tree, maxChord, output_type="ndarray"
+        )
+        idx1 = good[candidates["i"] + start]
+        idx2 = good[candidates["j"]]
+        chord = candidates["v"]
+        del candidates
+        keep = np.zeros(len(chord), dtype=bool)
+        for (minChord, outerChord), a in zip(chordRanges, active):
+            if a:
+                keep |= (minChord <= chord) & (chord <= outerChord)
+        keep &= idx1 < idx2
+        idx1 = idx1[keep]
+        idx2 = idx2[keep]
+
+        dist = sphDist(ra[idx1], dec[idx1], ra[idx2], dec[idx2])
+        for annulus, obj1List, obj2List in zip(annuli, obj1Lists, obj2Lists):
+            inAnnulus = (annulus[0] <= dist) & (dist < annulus[1])
+            obj1List.append(idx1[inAnnulus])
+            obj2List.append(idx2[inAnnulus])
+        start = stop
+
+    pairs = []
+    for obj1List, obj2List in zip(obj1Lists, obj2Lists):
+        obj1 = np.concatenate(obj1List)
+        obj2 = np.concatenate(obj2List)
+        order = np.lexsort((obj2, obj1))
+        pairs.append((obj1[order], obj2[order]))
+    return pairs
 
 
 def matchVisitComputeDistance(
@@ -308,89 +591,197 @@ def matchVisitComputeDistance(
     return distances
 
 
+def matchVisitComputeDistances(visit, ra, dec, offsets, obj1, obj2):
+    """Calculate the obj1-obj2 distance in every shared visit for many pairs.
+
+    This is a batched version of `matchVisitComputeDistance`. The
+    measurements of all objects are given as flat arrays, with the
+    measurements of object ``i`` in ``offsets[i]:offsets[i + 1]``. The shared
+    visits of all pairs are found at once with a sorted (object, visit) key,
+    and all distances are computed with a single call to `sphDist`.
+
+    Parameters
+    ----------
+    visit : `numpy.array` of int or str
+        Visit of each measurement.
+    ra : `numpy.array` [`float`]
+        RA of each measurement. [radians]
+    dec : `numpy.array` [`float`]
+        Dec of each measurement. [radians]
+    offsets : `numpy.array` [`int`]
+        Offsets of the measurements of each object; length is the number of
+        objects plus one.
+    obj1 : `numpy.array` [`int`]
+        Index of the first object of each pair.
+    obj2 : `numpy.array` [`int`]
+        Index of the second object of each pair.
+
+    Returns
+    -------
+    distances : `numpy.array` [`float`]
+        Spherical distances (in radians) in the shared visits of each pair,
+        ordered by visit within each pair. Distances are only returned for
+        visits in which both positions are finite.
+    pairOffsets : `numpy.array` [`int`]
+        Offsets of the distances of each pair, such that the distances of
+        pair ``k`` are ``distances[pairOffsets[k]:pairOffsets[k + 1]]``.
+    """
+    ra = np.asarray(ra, dtype=float)
+    dec = np.asarray(dec, dtype=float)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    obj1 = np.asarray(obj1, dtype=np.int64)
+    obj2 = np.asarray(obj2, dtype=np.int64)
+    nPairs = len(obj1)
+    if nPairs == 0 or len(ra) == 0:
+        return np.zeros(0), np.zeros(nPairs + 1, dtype=np.int64)
+
+    # Replace visits by their rank, so that an (object, visit) key fits in a
+    # single integer, and sort the measurements by that key.
+    counts = np.diff(offsets)
+    _, visitRank = np.unique(np.asarray(visit), return_inverse=True)
+    visitRank = visitRank.reshape(-1)
+    nVisits = visitRank.max() + 1
+    key = np.repeat(np.arange(len(counts)), counts) * nVisits + visitRank
+    order = np.argsort(key, kind="stable")
+    sortedKey = key[order]
+
+    # Expand the measurements of obj1 for each pair, in order of visit. As
+    # the measurements are grouped by object, the sorted measurements of
+    # object i also start at offsets[i].
+    counts1 = counts[obj1]
+    pairIndex = np.repeat(np.arange(nPairs), counts1)
+    local = np.arange(len(pairIndex)) - np.repeat(np.cumsum(counts1) - counts1, counts1)
+    rows1 = order[np.repeat(offsets[obj1], counts1) + local]
+
+    # Look up the measurement of obj2 in the same visit
+    target = obj2[pairIndex] * nVisits + visitRank[rows1]
+    pos2 = np.searchsorted(sortedKey, target)
+    found = pos2 < len(sortedKey)
+    found[found] = sortedKey[pos2[found]] == target[found]
+    rows1 = rows1[found]
+    rows2 = order[pos2[found]]
+    pairIndex = pairIndex[found]
+
+    finite = (
+        np.isfinite(ra[rows1])
+        & np.isfinite(dec[rows1])
+        & np.isfinite(ra[rows2])
+        & np.isfinite(dec[rows2])
+    )
+    rows1 = rows1[finite]
+    rows2 = rows2[finite]
+    pairIndex = pairIndex[finite]
+
+    distances = sphDist(ra[rows1], dec[rows1], ra[rows2], dec[rows2])
+    pairOffsets = np.zeros(nPairs + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pairIndex, minlength=nPairs), out=pairOffsets[1:])
+    return distances, pairOffsets
+
+
 def calcRmsDistancesVsRef(groupView, refVisit, magRange, band, verbose=False):
     """Calculate the RMS distance of a set of matched objects over visits.
     Parameters
     ----------
-    groupView : lsst.afw.table.GroupView
-        GroupView object of matched observations from MultiMatch.
+    groupView : `lsst.afw.table.GroupView` or `MatchedCatalogArrays`
+        Matched observations from MultiMatch, grouped by object, e.g. as
+        returned by `filterMatches` with ``asArrays=True``.
+    refVisit : `int`
+        Reference visit.
     magRange : length-2 `astropy.units.Quantity`
         Magnitude range from which to select objects.
+    band : `int`
+        Number of the band of the visits to compare to the reference visit.
     verbose : bool, optional
         Output additional information on the analysis steps.
     Returns
     -------
     rmsDistances : `astropy.units.Quantity`
         RMS angular separations of a set of matched objects over visits.
-    separations : `astropy.units.Quantity`
-        Angular separations of the set a matched objects.
     """
+    return calcRmsDistancesVsRefVisits(groupView, [refVisit], magRange, band)[0]
 
-    minMag, maxMag = magRange.to(u.mag).value
 
-    def magInRange(cat):
-        mag = cat["base_PsfFlux_mag"]
-        (w,) = np.where(np.isfinite(mag))
-        medianMag = np.median(mag[w])
-        return minMag <= medianMag and medianMag < maxMag
+def calcRmsDistancesVsRefVisits(groupView, refVisits, magRange, band):
+    """Calculate the RMS distance of a set of matched objects between each of
+    several reference visits and the other visits in a band.
 
-    groupViewInMagRange = groupView.where(magInRange)
+    The rows of the catalog are indexed by (object, visit) once, so that the
+    positions in the reference visit and in each other visit are gathered for
+    all objects at once.
 
-    # Get lists of the unique objects and visits:
-    uniqObj = groupViewInMagRange.ids
-    uniqVisits = set()
-    for id in uniqObj:
-        for v, f in zip(
-            groupViewInMagRange[id]["visit"], groupViewInMagRange[id]["filt"]
-        ):
-            if f == band:
-                uniqVisits.add(v)
+    Parameters
+    ----------
+    groupView : `lsst.afw.table.GroupView` or `MatchedCatalogArrays`
+        Matched observations from MultiMatch, grouped by object, e.g. as
+        returned by `filterMatches` with ``asArrays=True``.
+    refVisits : `list` [`int`]
+        Reference visits.
+    magRange : length-2 `astropy.units.Quantity`
+        Magnitude range from which to select objects.
+    band : `int`
+        Number of the band of the visits to compare to the reference visits.
 
-    uniqVisits = list(uniqVisits)
+    Returns
+    -------
+    rmsDistances : `list` [`astropy.units.Quantity`]
+        For each reference visit, the RMS angular separation of the objects
+        between the reference visit and each other visit, in the order of
+        increasing visit, or NaN if fewer than 2 objects are in both visits.
+    """
+    minMag, maxMag = magRange.to(u.mag).value
 
-    if not isinstance(refVisit, int):
+    arrays = _groupArrays(groupView, ["coord_ra", "coord_dec", "visit", "filt", "base_PsfFlux_mag"])
+    medianMag = arrays.finiteMedian("base_PsfFlux_mag")
+    arrays = arrays.where((minMag <= medianMag) & (medianMag < maxMag))
+
+    objectIndex = arrays.groupIndex
+    visit = arrays["visit"]
+    ra = arrays["coord_ra"]
+    dec = arrays["coord_dec"]
+    index = ObjectVisitIndex(objectIndex, visit)
+    # Only the first row of an object in a visit is compared
+    (firstRows,) = np.where(index.find(objectIndex, visit) == np.arange(len(visit)))
+    bandVisits = np.unique(visit[arrays["filt"] == band])
+
+    rmsDistancesList = []
+    for refVisit in refVisits:
         refVisit = int(refVisit)
+        visits = bandVisits[bandVisits != refVisit]
+
+        rows = firstRows[np.isin(visit[firstRows], visits)]
+        # Require each object to have a match in the reference visit
+        refRows = index.find(objectIndex[rows], refVisit)
+        rows = rows[refRows >= 0]
+        refRows = refRows[refRows >= 0]
+        distances = sphDist(ra[refRows], dec[refRows], ra[rows], dec[rows])
+
+        # Group the distances by visit, keeping the objects in order
+        order = np.argsort(visit[rows], kind="stable")
+        distances = distances[order]
+        bounds = np.searchsorted(visit[rows][order], visits, side="left")
+        bounds = np.append(bounds, len(distances))
+
+        rmsDistances = np.full(len(visits), np.nan)
+        for i in range(len(visits)):
+            distancesVisit = distances[bounds[i]:bounds[i + 1]]
+            distancesVisit = distancesVisit[np.isfinite(distancesVisit)]
+            # Need at least 2 distances to get a finite sample stdev
+            if len(distancesVisit) > 1:
+                # Calculate the RMS of these offsets:
+                # ddof=1 to get sample standard deviation (e.g., 1/(n-1))
+                pos_rms_rad = np.std(distancesVisit, ddof=1)
+                rmsDistances[i] = geom.radToMas(pos_rms_rad)  # milliarcsec
 
-    if refVisit in uniqVisits:
-        # Remove the reference visit from the set of visits:
-        uniqVisits.remove(refVisit)
-
-    rmsDistances = list()
-
-    # Loop over visits, calculating the RMS for each:
-    for vis in uniqVisits:
-
-        distancesVisit = list()
-
-        for obj in uniqObj:
-            visMatch = np.where(groupViewInMagRange[obj]["visit"] == vis)
-            refMatch = np.where(groupViewInMagRange[obj]["visit"] == refVisit)
-
-            raObj = groupViewInMagRange[obj]["coord_ra"]
-            decObj = groupViewInMagRange[obj]["coord_dec"]
-
-            # Require it to have a match in both the reference and visit image:
-            if np.size(visMatch[0]) > 0 and np.size(refMatch[0]) > 0:
-                distances = sphDist(
-                    raObj[refMatch], decObj[refMatch], raObj[visMatch], decObj[visMatch]
-                )
-
-                distancesVisit.append(distances)
-
-        finiteEntries = np.where(np.isfinite(distancesVisit))[0]
-        # Need at least 2 distances to get a finite sample stdev
-        if len(finiteEntries) > 1:
-            # Calculate the RMS of these offsets:
-            # ddof=1 to get sample standard deviation (e.g., 1/(n-1))
-            pos_rms_rad = np.std(np.array(distancesVisit)[finiteEntries], ddof=1)
-            pos_rms_mas = geom.radToMas(pos_rms_rad)  # milliarcsec
-            rmsDistances.append(pos_rms_mas)
+        rmsDistancesList.append(rmsDistances * u.marcsec)
+    return rmsDistancesList
 
-        else:
-            rmsDistances.append(np.nan)
 
-    rmsDistances = np.array(rmsDistances) * u.marcsec
-    return rmsDistances
+def _groupArrays(groupView, names):
+    """Return the columnar view of matched objects, building it from the
+    ``names`` fields of a `lsst.afw.table.GroupView` if needed."""
+    if isinstance(groupView, MatchedCatalogArrays):
+        return groupView
+    return MatchedCatalogArrays.fromGroupView(groupView, names)
 
 
 def radiansToMilliarcsec(rad):
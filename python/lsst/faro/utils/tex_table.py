@@ -23,6 +23,8 @@ import astropy.units as u
 import numpy as np
 import treecorr
 
+from lsst.faro.utils.correlation import CorrelationSession
+
 
 __all__ = (
     "TraceSize",
@@ -326,9 +328,12 @@ class RhoStatistics(object):
         A dictionary with keys 0..5, containing one `treecorr.KKCorrelation`
         object (key 0) and five `treecorr.GGCorrelation` objects corresponding
         to Rho statistic indices. rho0 corresponds to autocorrelation function
-        of PSF size residuals.
+        of PSF size residuals. If ``rhoIndices`` is passed when calling the
+        functor, only those statistics are computed and returned.
     """
 
+    rhoIndices = (0, 1, 2, 3, 4, 5)
+
     def __init__(
         self,
         ixxColumn,
@@ -385,7 +390,13 @@ class RhoStatistics(object):
         self.psfTraceSizeFunc = TraceSize(self.ixxPsfColumn, self.iyyPsfColumn)
         self.kwargs = kwargs
 
-    def __call__(self, catalog):
+    def __call__(self, catalog, rhoIndices=None):
+        if rhoIndices is None:
+            rhoIndices = self.rhoIndices
+        unknown = set(rhoIndices) - set(self.rhoIndices)
+        if unknown:
+            raise ValueError(f"Unknown Rho statistic indices: {sorted(unknown)}")
+
         e1 = self.e1Func(catalog)
         e2 = self.e2Func(catalog)
         e1Res = self.e1ResidsFunc(catalog)
@@ -405,35 +416,35 @@ class RhoStatistics(object):
         e1SizeRes = e1 * SizeRes
         e2SizeRes = e2 * SizeRes
 
-        # Package the arguments to capture auto-/cross-correlations for the
-        # Rho statistics.
+        # Name the fields that are auto-/cross-correlated for the Rho
+        # statistics.
         args = {
-            0: (SizeRes, None),
-            1: (e1Res, e2Res, None, None),
-            2: (e1, e2, e1Res, e2Res),
-            3: (e1SizeRes, e2SizeRes, None, None),
-            4: (e1Res, e2Res, e1SizeRes, e2SizeRes),
-            5: (e1, e2, e1SizeRes, e2SizeRes),
+            0: ("sizeRes", None),
+            1: ("eRes", None),
+            2: ("e", "eRes"),
+            3: ("eSizeRes", None),
+            4: ("eRes", "eSizeRes"),
+            5: ("e", "eSizeRes"),
         }
 
         ra = catalog[self.raColumn][isFinite] * 60.0  # arcmin
         dec = catalog[self.decColumn][isFinite] * 60.0  # arcmin
 
-        # Pass the appropriate arguments to the correlator and build a dict
-        rhoStats = {
-            rhoIndex: corrSpin2(
-                ra,
-                dec,
-                *(args[rhoIndex]),
-                raUnits="arcmin",
-                decUnits="arcmin",
-                **self.kwargs
-            )
-            for rhoIndex in range(1, 6)
-        }
-        rhoStats[0] = corrSpin0(
-            ra, dec, *(args[0]), raUnits="arcmin", decUnits="arcmin", **self.kwargs
+        # Share the catalog of each field between the correlations using it
+        session = CorrelationSession(
+            ra, dec, raUnits="arcmin", decUnits="arcmin", **self.kwargs
         )
+        session.addScalar("sizeRes", SizeRes)
+        session.addShear("e", e1, e2)
+        session.addShear("eRes", e1Res, e2Res)
+        session.addShear("eSizeRes", e1SizeRes, e2SizeRes)
+
+        # Pass the appropriate arguments to the correlator and build a dict
+        # of the requested statistics only
+        rhoStats = {}
+        for rhoIndex in sorted(set(rhoIndices)):
+            corrFunc = session.corrSpin0 if rhoIndex == 0 else session.corrSpin2
+            rhoStats[rhoIndex] = corrFunc(*(args[rhoIndex]))
 
         return rhoStats
 
@@ -591,7 +602,7 @@ def calculateTEx(catalog, config, currentBand):
         shearConvention=config.shearConvention,
         **treecorrKwargs
     )
-    xy = rhoStatisticsFunc(catalog)[config.rhoStat]
+    xy = rhoStatisticsFunc(catalog, rhoIndices=[config.rhoStat])[config.rhoStat]
 
     radius = np.exp(xy.meanlogr) * u.arcmin
     if config.rhoStat == 0:
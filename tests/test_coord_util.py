@@ -31,6 +31,7 @@ from lsst.faro.utils.coord_util import (averageRaFromCat,
                                         averageDecFromCat,
                                         averageRaDecFromCat,
                                         averageRaDec,
+                                        groupAverageRaDec,
                                         sphDist)
 
 
@@ -91,6 +92,27 @@ class CoordUtilTest(unittest.TestCase):
         self.assertAlmostEqual(result[0], expected[0], places=15)
         self.assertAlmostEqual(result[1], expected[1], places=15)
 
+    def test_groupAverageRaDec(self):
+        """Test average RA and declination of several groups at once."""
+        twoPi = 2 * np.pi
+        # Groups symmetric about their average position, whose declination
+        # is that of the sum of the unit vectors, and a single position
+        ra = [1.1, 0.9, 0.1, twoPi - 0.1, 6.0,
+              0.05, twoPi - 0.05, 0.05, twoPi - 0.05]
+        dec = [0.5, 0.5, 0.2, 0.2, -0.3,
+               0.1, 0.1, -0.1, -0.1]
+        offsets = np.array([0, 2, 2, 4, 5, 9])
+        expectedRa = [1.0, np.nan, 0.0, 6.0, 0.0]
+        expectedDec = [np.arctan(np.tan(0.5) / np.cos(0.1)), np.nan,
+                       np.arctan(np.tan(0.2) / np.cos(0.1)), -0.3, 0.0]
+        meanRa, meanDec = groupAverageRaDec(ra, dec, offsets)
+        np.testing.assert_allclose(meanRa, expectedRa, rtol=0, atol=1e-14)
+        np.testing.assert_allclose(meanDec, expectedDec, rtol=0, atol=1e-14)
+
+        # Groups crossing RA=0 average to RA in [0, 2pi), on either side
+        meanRa, _ = groupAverageRaDec([0.3, twoPi - 0.1, 0.1, twoPi - 0.3], [0., 0., 0., 0.], [0, 2, 4])
+        np.testing.assert_allclose(meanRa, [0.1, twoPi - 0.1], rtol=0, atol=1e-14)
+
     def test_sphDist(self):
         """Test great circle angular separation calculation."""
         expected = np.fabs(np.radians(np.linspace(-10., 10., 101)))
@@ -0,0 +1,86 @@
+# This file is part of faro.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Unit tests for the selection of matched objects.
+"""
+
+import unittest
+import os
+import numpy as np
+
+from lsst.afw.table import SimpleCatalog, GroupView
+from lsst.faro.utils.filtermatches import filterMatches
+
+TESTDIR = os.path.abspath(os.path.dirname(__file__))
+DATADIR = os.path.join(TESTDIR, 'data')
+
+
+class FilterMatchesTest(unittest.TestCase):
+    """Test the selection of matched objects."""
+
+    def load_data(self):
+        '''Helper to load data to process.'''
+        cat_file = 'matchedCatalogTract_0_i.fits.gz'
+        return SimpleCatalog.readFits(os.path.join(DATADIR, cat_file))
+
+    def selectPerGroup(self, catalog, snrMin):
+        '''Reference selection, evaluated one group at a time.'''
+        matches = GroupView.build(catalog)
+        magKey = matches.schema.find('slot_PsfFlux_mag').key
+        snrKey = matches.schema.find('base_PsfFlux_snr').key
+        extKey = matches.schema.find('base_ClassificationExtendedness_value').key
+        flagKeys = [matches.schema.find('base_PixelFlags_flag_' + flag).key
+                    for flag in ('saturated', 'cr', 'bad', 'edge')]
+        primaryKey = matches.schema.find('detect_isPrimary').key
+
+        def select(cat):
+            if len(cat) < 2 or not np.isfinite(cat[magKey]).all():
+                return False
+            snr = cat[snrKey]
+            medianSnr = np.median(snr[np.isfinite(snr)])
+            if not snrMin <= medianSnr:
+                return False
+            if not np.max(cat[extKey]) < 0.9:
+                return False
+            if any(np.any(cat[key]) for key in flagKeys):
+                return False
+            return np.all(cat[primaryKey])
+
+        return matches.where(select)
+
+    def test_filterMatches(self):
+        """Test that the selection matches a per-group evaluation."""
+        catalog = self.load_data()
+        expected = self.selectPerGroup(catalog, 50)
+
+        result = filterMatches(catalog, snrMin=50)
+        np.testing.assert_array_equal(result.ids, expected.ids)
+        self.assertEqual(sum(len(group) for group in result.groups),
+                         sum(len(group) for group in expected.groups))
+
+        arrays = filterMatches(catalog, snrMin=50, asArrays=True)
+        np.testing.assert_array_equal(arrays.ids, expected.ids)
+        np.testing.assert_array_equal(arrays.sizes, [len(group) for group in expected.groups])
+
+
+if __name__ == "__main__":
+    unittest.main()
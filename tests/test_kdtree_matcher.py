@@ -0,0 +1,119 @@
+# This file is part of faro.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for the k-d tree matching backend.
+"""
+
+import unittest
+import numpy as np
+
+import lsst.geom as geom
+from lsst.afw.table import SourceCatalog, SourceTable
+
+from lsst.faro.utils.kdtree_matcher import ambiguousObjects, makeMultiMatch
+
+
+class KDTreeMultiMatchTest(unittest.TestCase):
+    """Test that the k-d tree backend groups sources as MultiMatch does."""
+
+    def makeCatalogs(self, nVisits=4, nObjects=100, seed=31415):
+        rng = np.random.default_rng(seed)
+        ra = rng.uniform(1.0, 1.002, nObjects)
+        dec = rng.uniform(-0.3, -0.298, nObjects)
+        scatter = np.radians(0.02/3600)
+        schema = SourceTable.makeMinimalSchema()
+        catalogs = []
+        for visit in range(nVisits):
+            catalog = SourceCatalog(schema)
+            catalog.reserve(nObjects)
+            for i in range(nObjects):
+                record = catalog.addNew()
+                record.setId(i + 1)
+                record.setCoord(geom.SpherePoint(ra[i] + rng.normal(0, scatter),
+                                                 dec[i] + rng.normal(0, scatter),
+                                                 geom.radians))
+            catalogs.append((catalog, {"visit": visit, "detector": 0}))
+        return schema, catalogs
+
+    def addDuplicate(self, catalog, index, offset=0.1):
+        """Add a source close to another one, making its object
+        ambiguous."""
+        coord = catalog[index].getCoord()
+        record = catalog.addNew()
+        record.setId(len(catalog))
+        record.setCoord(geom.SpherePoint(coord.getRa(),
+                                         coord.getDec() + geom.Angle(offset, geom.arcseconds)))
+
+    def match(self, matcher):
+        schema, catalogs = self.makeCatalogs()
+        mmatch = makeMultiMatch(schema, geom.Angle(0.5, geom.arcseconds), matcher)
+        for catalog, dataId in catalogs:
+            mmatch.add(catalog=catalog, dataId=dataId)
+        return mmatch.finish().copy(deep=True)
+
+    def test_sameGroups(self):
+        reference = self.match("multiMatch")
+        result = self.match("kdTree")
+        self.assertEqual(result.schema, reference.schema)
+        self.assertEqual(len(result), len(reference))
+
+        def groups(catalog):
+            return sorted(
+                tuple(sorted(zip(catalog["visit"][catalog["object"] == obj],
+                                 catalog["id"][catalog["object"] == obj])))
+                for obj in np.unique(catalog["object"])
+            )
+
+        self.assertEqual(groups(result), groups(reference))
+
+    def test_incremental(self):
+        """Test that matching new visits against the state of an earlier
+        match gives the same catalog as matching all the visits at once."""
+        schema, catalogs = self.makeCatalogs(nVisits=5)
+        # An object made ambiguous by a visit of the earlier match
+        self.addDuplicate(catalogs[1][0], 0)
+        radius = geom.Angle(0.5, geom.arcseconds)
+
+        full = makeMultiMatch(schema, radius, "kdTree")
+        for catalog, dataId in catalogs:
+            full.add(catalog=catalog, dataId=dataId)
+        reference = full.finish().copy(deep=True)
+
+        earlier = makeMultiMatch(schema, radius, "kdTree")
+        for catalog, dataId in catalogs[:3]:
+            earlier.add(catalog=catalog, dataId=dataId)
+        state = earlier.finish(removeAmbiguous=False).copy(deep=True)
+        np.testing.assert_array_equal(ambiguousObjects(state), [1])
+
+        later = makeMultiMatch(schema, radius, "kdTree")
+        later.seed(state)
+        for catalog, dataId in catalogs[3:]:
+            later.add(catalog=catalog, dataId=dataId)
+        result = later.finish().copy(deep=True)
+
+        self.assertEqual(len(result), len(reference))
+        self.assertNotIn(1, result["object"])
+        for name in ("object", "visit", "detector", "id", "coord_ra", "coord_dec"):
+            np.testing.assert_array_equal(result[name], reference[name])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+# This file is part of faro.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for the helpers of the matched catalog preparation tasks.
+"""
+
+import unittest
+import numpy as np
+
+import lsst.afw.geom as afwGeom
+import lsst.geom as geom
+from lsst.afw.table import SimpleCatalog, SimpleTable
+
+from lsst.faro.base.MatchedCatalogBase import MatchedBaseTask
+
+
+class MatchedBaseTaskTest(unittest.TestCase):
+    """Test the selection of the records and inputs of a matched catalog."""
+
+    def test_inBox(self):
+        wcs = afwGeom.makeSkyWcs(
+            crpix=geom.Point2D(0.0, 0.0),
+            crval=geom.SpherePoint(1.0, -0.3, geom.radians),
+            cdMatrix=afwGeom.makeCdMatrix(scale=0.2*geom.arcseconds),
+        )
+        box = geom.Box2D(geom.Point2D(10.0, 20.0), geom.Point2D(110.0, 220.0))
+        x = np.array([10.01, 109.99, 9.99, 110.01, 50.0, 50.0, 50.0, 50.0])
+        y = np.array([100.0, 100.0, 100.0, 100.0, 20.01, 219.99, 19.99, 220.01])
+        catalog = SimpleCatalog(SimpleTable.makeMinimalSchema())
+        for xi, yi in zip(x, y):
+            catalog.addNew().setCoord(wcs.pixelToSky(xi, yi))
+        catalog = catalog.copy(deep=True)
+
+        inBox = MatchedBaseTask.inBox(catalog, wcs, box)
+        expected = [box.contains(geom.Point2D(xi, yi)) for xi, yi in zip(x, y)]
+        np.testing.assert_array_equal(inBox, expected)
+        np.testing.assert_array_equal(inBox, [True, True, False, False, True, True, False, False])
+
+    def test_selectNewInputs(self):
+        schema = SimpleTable.makeMinimalSchema()
+        visitKey = schema.addField("visit", type=np.int64, doc="Visit.")
+        detectorKey = schema.addField("detector", type=np.int32, doc="Detector.")
+        previousCatalog = SimpleCatalog(schema)
+        for visit, detector in [(1, 0), (1, 0), (2, 1)]:
+            record = previousCatalog.addNew()
+            record.set(visitKey, visit)
+            record.set(detectorKey, detector)
+
+        dataIds = [{"visit": visit, "detector": detector}
+                   for visit, detector in [(1, 0), (1, 1), (2, 1), (3, 0)]]
+        sourceCatalogs = ["src10", "src11", "src21", "src30"]
+        photoCalibs = ["photo10", "photo11", "photo21", "photo30"]
+        astromCalibs = ["wcs10", "wcs11", "wcs21", "wcs30"]
+        selected = MatchedBaseTask.selectNewInputs(
+            previousCatalog, sourceCatalogs, photoCalibs, astromCalibs, dataIds
+        )
+        self.assertEqual(
+            selected,
+            (["src11", "src30"], ["photo11", "photo30"], ["wcs11", "wcs30"], [dataIds[1], dataIds[3]]),
+        )
+
+        selected = MatchedBaseTask.selectNewInputs(
+            SimpleCatalog(schema), sourceCatalogs, photoCalibs, astromCalibs, dataIds
+        )
+        self.assertEqual(selected, (sourceCatalogs, photoCalibs, astromCalibs, dataIds))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+# This file is part of faro.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for the matched catalog cache.
+"""
+
+import gc
+import unittest
+import weakref
+import numpy as np
+
+from lsst.faro.utils.matched_cache import MatchedCatalogCache
+
+
+class Catalog(dict):
+    """Catalog of columns supporting weak references, as afw catalogs do."""
+
+
+class MatchedCatalogCacheTest(unittest.TestCase):
+    """Test lookup and eviction in MatchedCatalogCache."""
+
+    def makeCatalog(self, nRows=100, seed=0):
+        """Make a minimal matched catalog."""
+        rng = np.random.default_rng(seed)
+        return {
+            "id": np.arange(nRows),
+            "object": rng.integers(0, 10, nRows),
+            "coord_ra": rng.uniform(0, 0.1, nRows),
+            "coord_dec": rng.uniform(0, 0.1, nRows),
+        }
+
+    def test_identityKey(self):
+        """Test that entries are keyed by the identity of the input."""
+        cache = MatchedCatalogCache()
+        catalog = Catalog(self.makeCatalog())
+        calls = []
+
+        def compute():
+            calls.append(None)
+            return np.zeros(10)
+
+        first = cache.get(catalog, "product", {"snrMin": 50}, compute)
+        self.assertIs(cache.get(catalog, "product", {"snrMin": 50}, compute), first)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        cache.get(catalog, "product", {"snrMin": 100}, compute)
+        cache.get(Catalog(catalog), "product", {"snrMin": 50}, compute)
+        self.assertEqual(len(calls), 3)
+
+        view = object()
+        first = cache.get(view, "product", {}, lambda: np.zeros(1))
+        self.assertIs(cache.get(view, "product", {}, lambda: np.ones(1)), first)
+        self.assertIsNot(cache.get(object(), "product", {}, lambda: np.ones(1)), first)
+
+    def test_weakReferences(self):
+        """Test that the cache does not keep weakly referenceable inputs
+        alive, and counts the memory of the other inputs."""
+        cache = MatchedCatalogCache()
+        catalog = Catalog(self.makeCatalog())
+        reference = weakref.ref(catalog)
+        cache.get(catalog, "product", {}, lambda: np.zeros(10))
+        self.assertEqual((len(cache), cache.nbytes), (1, 80))
+        del catalog
+        gc.collect()
+        self.assertIsNone(reference())
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+        catalog = self.makeCatalog()
+        catalogBytes = sum(column.nbytes for column in catalog.values())
+        cache.get(catalog, "product", {}, lambda: np.zeros(10))
+        cache.get(catalog, "other", {}, lambda: np.zeros(10))
+        self.assertEqual(cache.nbytes, catalogBytes + 160)
+        cache.clear()
+        self.assertEqual(cache.nbytes, 0)
+
+        cache = MatchedCatalogCache(maxBytes=catalogBytes)
+        cache.get(catalog, "product", {}, lambda: np.zeros(10))
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+    def test_cachedNone(self):
+        """Test that a cached None is not taken for a missing entry."""
+        cache = MatchedCatalogCache()
+        catalog = Catalog(self.makeCatalog())
+        calls = []
+
+        def compute():
+            calls.append(None)
+            return None
+
+        self.assertIsNone(cache.get(catalog, "product", {}, compute))
+        self.assertIsNone(cache.get(catalog, "product", {}, compute))
+        self.assertEqual(len(calls), 1)
+        self.assertIsNone(cache.lookup(catalog, "other", {}))
+        self.assertEqual(cache.lookup(catalog, "other", {}, default=0), 0)
+
+    def test_eviction(self):
+        """Test the limits on the number of entries and on memory."""
+        catalog = Catalog(self.makeCatalog())
+        cache = MatchedCatalogCache(maxEntries=2)
+        for index in range(3):
+            cache.get(catalog, "product", {"index": index}, lambda: np.zeros(10))
+        self.assertEqual(len(cache), 2)
+        # The least recently used entry was evicted
+        cache.get(catalog, "product", {"index": 0}, lambda: np.zeros(10))
+        self.assertEqual(cache.misses, 4)
+
+        cache = MatchedCatalogCache(maxBytes=1000)
+        for index in range(3):
+            cache.get(catalog, "product", {"index": index}, lambda: np.zeros(50))
+        self.assertEqual(len(cache), 2)
+        self.assertLessEqual(cache.nbytes, 1000)
+        cache.get(catalog, "large", {}, lambda: np.zeros(1000))
+        self.assertEqual(len(cache), 2)
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
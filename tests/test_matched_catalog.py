@@ -0,0 +1,127 @@
+# This file is part of faro.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for the columnar matched catalog representation.
+"""
+
+import unittest
+import numpy as np
+import astropy.units as u
+
+from lsst.faro.utils.matched_catalog import GroupedValues, MatchedCatalogArrays, ObjectVisitIndex
+
+
+class MatchedCatalogArraysTest(unittest.TestCase):
+    """Test grouped reductions of MatchedCatalogArrays."""
+
+    def makeCatalog(self, seed=8675309):
+        """Make a minimal matched catalog with unsorted object IDs."""
+        rng = np.random.default_rng(seed)
+        nObjects = 50
+        sizes = rng.integers(1, 8, nObjects)
+        objectIds = rng.permutation(np.arange(100, 100 + nObjects))
+        catalog = {
+            "object": np.repeat(objectIds, sizes),
+            "mag": rng.normal(20., 0.1, sizes.sum()),
+            "flag": rng.random(sizes.sum()) < 0.1,
+        }
+        catalog["mag"][rng.random(sizes.sum()) < 0.1] = np.nan
+        order = rng.permutation(sizes.sum())
+        return {name: column[order] for name, column in catalog.items()}
+
+    def groups(self, catalog, name):
+        """Split a column into per-object arrays, by increasing object ID."""
+        return [catalog[name][catalog["object"] == objId]
+                for objId in np.unique(catalog["object"])]
+
+    def test_build(self):
+        """Test grouping by object."""
+        catalog = self.makeCatalog()
+        arrays = MatchedCatalogArrays.build(catalog)
+        np.testing.assert_array_equal(arrays.ids, np.unique(catalog["object"]))
+        self.assertEqual(arrays.count, len(catalog["object"]))
+        for group, mag in zip(self.groups(catalog, "mag"),
+                              np.split(arrays["mag"], arrays.offsets[1:-1])):
+            np.testing.assert_array_equal(group, mag)
+
+    def test_reductions(self):
+        """Test grouped reductions against numpy on each group."""
+        catalog = self.makeCatalog()
+        arrays = MatchedCatalogArrays.build(catalog)
+        groups = self.groups(catalog, "mag")
+        np.testing.assert_allclose(arrays.mean("mag"), [np.mean(g) for g in groups])
+        np.testing.assert_allclose(arrays.median("mag"), [np.median(g) for g in groups])
+        np.testing.assert_allclose(arrays.nanmean("mag"), [np.nanmean(g) for g in groups])
+        np.testing.assert_allclose(arrays.nanstd("mag"), [np.nanstd(g) for g in groups])
+        np.testing.assert_allclose(arrays.nanmedian("mag"), [np.nanmedian(g) for g in groups])
+        np.testing.assert_array_equal(arrays.countFinite("mag"),
+                                      [np.sum(np.isfinite(g)) for g in groups])
+        np.testing.assert_array_equal(arrays.max("mag"), [np.max(g) for g in groups])
+
+        flags = self.groups(catalog, "flag")
+        np.testing.assert_array_equal(arrays.any("flag"), [np.any(f) for f in flags])
+        np.testing.assert_array_equal(arrays.all("flag"), [np.all(f) for f in flags])
+
+    def test_where(self):
+        """Test selecting a subset of the groups."""
+        catalog = self.makeCatalog()
+        arrays = MatchedCatalogArrays.build(catalog)
+        # Extract a column first, so that the cached column is subset too
+        arrays["mag"]
+        mask = arrays.sizes > 3
+        subset = arrays.where(mask)
+        self.assertEqual(len(subset), np.sum(mask))
+        np.testing.assert_array_equal(subset.ids, arrays.ids[mask])
+        np.testing.assert_array_equal(subset.median("mag"), arrays.median("mag")[mask])
+        np.testing.assert_array_equal(subset.all("flag"), arrays.all("flag")[mask])
+
+
+class GroupedValuesTest(unittest.TestCase):
+    """Test the flat per-group values."""
+
+    def test_where(self):
+        values = GroupedValues(np.arange(10.), np.array([0, 3, 3, 7, 10]), u.mmag)
+        self.assertEqual(len(values), 4)
+        np.testing.assert_array_equal(values[2], [3., 4., 5., 6.] * u.mmag)
+        mask = np.array([True, False, False, True])
+        np.testing.assert_array_equal(values.rowMask(mask), np.arange(10) % 7 < 3)
+        subset = values.where(mask)
+        np.testing.assert_array_equal(subset.offsets, [0, 3, 6])
+        np.testing.assert_array_equal(subset.toQuantity(), [0., 1., 2., 7., 8., 9.] * u.mmag)
+
+
+class ObjectVisitIndexTest(unittest.TestCase):
+    """Test lookups in ObjectVisitIndex."""
+
+    def test_find(self):
+        objectIndex = np.array([2, 0, 1, 0, 2, 1, 0])
+        visit = np.array([10, 12, 10, 10, 12, 14, 12])
+        index = ObjectVisitIndex(objectIndex, visit)
+
+        rows = index.find([0, 0, 0, 1, 1, 2, 2, 3], 10)
+        np.testing.assert_array_equal(rows, [3, 3, 3, 2, 2, 0, 0, -1])
+        # The first row of a repeated (object, visit) is returned
+        rows = index.find([0, 1, 2, 2, 1], [12, 12, 12, 11, 20])
+        np.testing.assert_array_equal(rows, [1, -1, 4, -1, -1])
+
+
+if __name__ == "__main__":
+    unittest.main()
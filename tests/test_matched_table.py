@@ -0,0 +1,129 @@
+# This file is part of faro.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for the columnar persisted matched catalogs.
+"""
+
+import unittest
+import numpy as np
+from astropy.table import Table
+
+from lsst.faro.utils.matched_catalog import MatchedCatalogArrays
+from lsst.faro.utils.matched_table import readMatchedTable, resolveAlias
+from lsst.faro.utils.phot_repeat import photRepeat
+
+
+class InMemoryHandle:
+    """Stand-in for a deferred dataset handle of an ArrowAstropy table."""
+
+    def __init__(self, table):
+        self.table = table
+        self.reads = []
+
+    def get(self, parameters=None):
+        columns = (parameters or {}).get("columns", self.table.colnames)
+        self.reads.append(list(columns))
+        return self.table[columns]
+
+
+class MatchedTableTest(unittest.TestCase):
+    """Test reading sorted matched tables."""
+
+    def makeTable(self):
+        rng = np.random.default_rng(12345)
+        sizes = rng.integers(1, 6, 30)
+        table = Table({
+            "object": np.repeat(np.arange(1, 31), sizes),
+            "base_PsfFlux_mag": rng.normal(20., 0.1, sizes.sum()),
+            "base_PsfFlux_snr": rng.uniform(10, 1000, sizes.sum()),
+        })
+        table.meta["aliases"] = {"slot_PsfFlux": "base_PsfFlux"}
+        return table
+
+    def test_resolveAlias(self):
+        aliases = {"slot_PsfFlux": "base_PsfFlux", "slot_Psf": "base_Other",
+                   "slot_Shape": "slot_Other", "slot_Other": "base_SdssShape"}
+        self.assertEqual(resolveAlias("slot_PsfFlux_mag", aliases), "base_PsfFlux_mag")
+        self.assertEqual(resolveAlias("slot_Psf_flag", aliases), "base_Other_flag")
+        self.assertEqual(resolveAlias("slot_Shape_xx", aliases), "base_SdssShape_xx")
+        self.assertEqual(resolveAlias("slot_PsfFluxes", aliases), "slot_PsfFluxes")
+        self.assertEqual(resolveAlias("object", aliases), "object")
+
+    def test_readMatchedTable(self):
+        table = self.makeTable()
+        handle = InMemoryHandle(table)
+        subset = readMatchedTable(handle, ["slot_PsfFlux_mag"])
+        self.assertEqual(subset.colnames, ["object", "slot_PsfFlux_mag"])
+        self.assertEqual(handle.reads, [["object"], ["base_PsfFlux_mag"]])
+        np.testing.assert_array_equal(subset["slot_PsfFlux_mag"], table["base_PsfFlux_mag"])
+
+        # Reading all the columns also resolves the aliases
+        full = readMatchedTable(InMemoryHandle(table))
+        self.assertEqual(full.colnames, table.colnames + ["slot_PsfFlux_mag", "slot_PsfFlux_snr"])
+        np.testing.assert_array_equal(full["slot_PsfFlux_snr"], table["base_PsfFlux_snr"])
+
+    def test_photRepeat(self):
+        """Test that PA1 can be measured on the columns read from a table."""
+        rng = np.random.default_rng(2718)
+        sizes = rng.integers(3, 6, 80)
+        nRows = sizes.sum()
+        table = Table({
+            "object": np.repeat(np.arange(1, 81), sizes),
+            "base_PsfFlux_mag": np.repeat(rng.uniform(17., 21., 80), sizes) + rng.normal(0., 0.01, nRows),
+            "base_PsfFlux_snr": rng.uniform(300., 1000., nRows),
+            "base_PsfFlux_instFlux": rng.uniform(1., 2., nRows),
+            "base_ClassificationExtendedness_value": np.zeros(nRows),
+        })
+        for flag in ("saturated", "cr", "bad", "edge"):
+            table["base_PixelFlags_flag_" + flag] = np.zeros(nRows, dtype=bool)
+        table["detect_isPrimary"] = np.ones(nRows, dtype=bool)
+        table.meta["aliases"] = {"slot_PsfFlux": "base_PsfFlux"}
+
+        handle = InMemoryHandle(table)
+        columns = ["slot_PsfFlux_mag", "base_PsfFlux_snr", "base_ClassificationExtendedness_value",
+                   "base_PixelFlags_flag_saturated", "base_PixelFlags_flag_cr",
+                   "base_PixelFlags_flag_bad", "base_PixelFlags_flag_edge", "detect_isPrimary"]
+        subset = readMatchedTable(handle, columns)
+        self.assertNotIn("base_PsfFlux_instFlux", handle.reads[-1])
+
+        reference = table.copy()
+        reference["slot_PsfFlux_mag"] = reference["base_PsfFlux_mag"]
+        result = photRepeat(subset, snrMin=200.)
+        expected = photRepeat(reference, snrMin=200.)
+        self.assertIn("repeatability", result)
+        self.assertEqual(result["repeatability"], expected["repeatability"])
+        np.testing.assert_array_equal(result["rms"], expected["rms"])
+
+    def test_sortedBuild(self):
+        """Test that sorted tables give the same groups as unsorted ones."""
+        table = self.makeTable()
+        arrays = MatchedCatalogArrays.build(table)
+        np.testing.assert_array_equal(arrays.rows, np.arange(len(table)))
+        shuffled = table[np.random.default_rng(1).permutation(len(table))]
+        reference = MatchedCatalogArrays.build(shuffled)
+        np.testing.assert_array_equal(arrays.ids, reference.ids)
+        np.testing.assert_array_equal(arrays.offsets, reference.offsets)
+        np.testing.assert_allclose(arrays.mean("base_PsfFlux_mag"),
+                                   reference.mean("base_PsfFlux_mag"), rtol=1e-12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+# This file is part of faro.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for matching catalogs in cells and in worker pools.
+"""
+
+import types
+import unittest
+import numpy as np
+
+import lsst.afw.geom as afwGeom
+import lsst.geom as geom
+from lsst.afw.table import SourceCatalog, SourceTable
+
+from lsst.faro.utils.matcher import _mapInPool, _matchCell, _matchInCells, _MatchCells, _stitchRows
+
+
+def _power(x, y):
+    """Function applied in the worker pools, picklable for processes."""
+    return x**y
+
+
+class MapInPoolTest(unittest.TestCase):
+    """Test that the worker pools give the results of serial calls."""
+
+    def test_mapInPool(self):
+        argsList = [(x, y) for x in range(10) for y in range(3)]
+        expected = [x**y for x, y in argsList]
+        config = types.SimpleNamespace(numWorkers=1, workerPoolType="thread")
+        self.assertEqual(list(_mapInPool(_power, argsList, config)), expected)
+        for workerPoolType in ("thread", "process"):
+            config = types.SimpleNamespace(numWorkers=4, workerPoolType=workerPoolType)
+            self.assertEqual(list(_mapInPool(_power, argsList, config)), expected)
+        self.assertEqual(list(_mapInPool(_power, [], config)), [])
+        # Iterators are consumed as the results are requested
+        argsIter = iter(argsList)
+        results = _mapInPool(_power, argsIter, config, nCalls=len(argsList))
+        self.assertEqual(next(results), expected[0])
+        self.assertGreater(len(list(argsIter)), 0)
+        results.close()
+
+
+class StitchRowsTest(unittest.TestCase):
+    """Test the selection of the rows of the sources matched in several
+    cells."""
+
+    def test_stitchRows(self):
+        # Source 0 is in owned objects of two cells, source 1 only in an
+        # object owned by another cell, source 2 in both kinds, and source 3
+        # in a single owned object.
+        sources = np.array([0, 1, 2, 0, 2, 3])
+        owned = np.array([True, False, False, True, True, True])
+        distances = np.array([0.3, 0.1, 0.1, 0.2, 0.5, 0.4])
+        expected = np.array([False, True, False, True, True, True])
+        np.testing.assert_array_equal(_stitchRows(sources, owned, distances), expected)
+
+        # The selection does not depend on the order of the cells
+        order = np.array([3, 4, 5, 0, 1, 2])
+        np.testing.assert_array_equal(
+            _stitchRows(sources[order], owned[order], distances[order]), expected[order]
+        )
+
+
+class MatchInCellsTest(unittest.TestCase):
+    """Test that matching in cells gives the objects of a single match."""
+
+    def setUp(self):
+        self.wcs = afwGeom.makeSkyWcs(
+            crpix=geom.Point2D(0.0, 0.0),
+            crval=geom.SpherePoint(1.0, -0.3, geom.radians),
+            cdMatrix=afwGeom.makeCdMatrix(scale=0.2*geom.arcseconds),
+        )
+        self.box = geom.Box2D(geom.Point2D(0.0, 0.0), geom.Point2D(400.0, 400.0))
+        self.cellSize = 100
+        self.radius = geom.Angle(0.5, geom.arcseconds)
+
+    def makeCatalogs(self, nVisits=4, nObjects=100, seed=27182, onEdges=False, scatter=0.1):
+        rng = np.random.default_rng(seed)
+        x = rng.uniform(0.0, 400.0, nObjects)
+        y = rng.uniform(0.0, 400.0, nObjects)
+        # Objects straddling the cell boundaries, whose sources fall in
+        # either cell
+        nEdge = nObjects//2 if onEdges else nObjects//4
+        x[:nEdge] = rng.choice([100.0, 200.0, 300.0], nEdge)
+        y[nEdge:2*nEdge] = rng.choice([100.0, 200.0, 300.0], nEdge)
+        schema = SourceTable.makeMinimalSchema()
+        catalogs = []
+        dataIds = []
+        for visit in range(nVisits):
+            catalog = SourceCatalog(schema)
+            catalog.reserve(nObjects)
+            for i in range(nObjects):
+                record = catalog.addNew()
+                record.setId(i + 1)
+                record.setCoord(self.wcs.pixelToSky(x[i] + rng.normal(0, scatter),
+                                                    y[i] + rng.normal(0, scatter)))
+            catalogs.append(catalog)
+            dataIds.append({"visit": visit, "detector": 0})
+        return catalogs, dataIds
+
+    @staticmethod
+    def groups(catalog):
+        return sorted(
+            tuple(sorted(zip(catalog["visit"][catalog["object"] == obj],
+                             catalog["id"][catalog["object"] == obj])))
+            for obj in np.unique(catalog["object"])
+        )
+
+    def checkMatch(self, matcher, **kwargs):
+        catalogs, dataIds = self.makeCatalogs(**kwargs)
+        cells = _MatchCells(self.wcs, self.box, self.cellSize, self.radius)
+        self.assertEqual(cells.size, 16)
+
+        # Some objects have sources in two cells
+        cellIds = np.array([cells.cellOf(*cells.pixels(catalog)) for catalog in catalogs])
+        self.assertTrue((cellIds != cellIds[0]).any(axis=0).sum() > 0)
+
+        reference = _matchCell(catalogs, dataIds, self.radius, matcher)
+        config = types.SimpleNamespace(numWorkers=1, matcher=matcher)
+        result = _matchInCells(iter(catalogs), dataIds, self.radius, cells, config)
+
+        self.assertEqual(len(result), len(reference))
+        self.assertEqual(len(np.unique(result["object"])), len(np.unique(reference["object"])))
+        self.assertEqual(self.groups(result), self.groups(reference))
+
+    def test_multiMatch(self):
+        self.checkMatch("multiMatch")
+
+    def test_kdTree(self):
+        self.checkMatch("kdTree")
+
+    def test_straddlingObjects(self):
+        # All the objects are on cell edges, with sources on both sides and
+        # means in either cell
+        for matcher in ("multiMatch", "kdTree"):
+            with self.subTest(matcher=matcher):
+                self.checkMatch(matcher, nVisits=6, onEdges=True, scatter=0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+# This file is part of faro.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for the selection of the sources to match.
+"""
+
+import unittest
+import numpy as np
+
+from lsst.faro.utils.prefilter import preFilter, preSelect
+
+
+class ColumnCatalog:
+    """Stand-in for a `lsst.afw.table.SourceCatalog`, indexed by column
+    name or by a mask over the records, which counts its deep copies."""
+
+    def __init__(self, columns, contiguous=True, copies=None):
+        self.columns = columns
+        self.contiguous = contiguous
+        self.copies = [] if copies is None else copies
+
+    def isContiguous(self):
+        return self.contiguous
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield {name: column[i] for name, column in self.columns.items()}
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if not self.contiguous:
+                raise RuntimeError("Record data is not contiguous in memory.")
+            return self.columns[key]
+        return ColumnCatalog({name: column[key] for name, column in self.columns.items()},
+                             contiguous=False, copies=self.copies)
+
+    def __setitem__(self, name, column):
+        self.columns[name] = column
+
+    def copy(self, deep=False):
+        self.copies.append(len(self))
+        return ColumnCatalog({name: column.copy() for name, column in self.columns.items()},
+                             copies=self.copies)
+
+
+class PrefilterTest(unittest.TestCase):
+    """Test the cuts applied to the sources before schema mapping."""
+
+    def makeCatalog(self, n=1000, seed=161803):
+        rng = np.random.default_rng(seed)
+        catalog = ColumnCatalog({
+            "base_PsfFlux_instFlux": rng.uniform(1., 2000., n),
+            "base_PsfFlux_instFluxErr": np.ones(n),
+            "base_PsfFlux_mag": rng.uniform(15., 31., n),
+            "base_ClassificationExtendedness_value": rng.choice([0., 0.5, 1.], n),
+            "detect_isPrimary": rng.uniform(size=n) < 0.9,
+        })
+        for flag in ("saturated", "cr", "bad", "edge"):
+            catalog["base_PixelFlags_flag_" + flag] = rng.uniform(size=n) < 0.05
+        catalog["base_PsfFlux_snr"] = catalog["base_PsfFlux_instFlux"] / catalog["base_PsfFlux_instFluxErr"]
+        return catalog
+
+    def expectedCuts(self, catalog, snrMin, snrMax, extended):
+        snr = catalog["base_PsfFlux_snr"]
+        extendedness = catalog["base_ClassificationExtendedness_value"]
+        flagged = (catalog["base_PixelFlags_flag_saturated"] | catalog["base_PixelFlags_flag_cr"]
+                   | catalog["base_PixelFlags_flag_bad"] | catalog["base_PixelFlags_flag_edge"])
+        return ((snr > snrMin) & (snr < snrMax)
+                & ((extendedness > 0.9) if extended else (extendedness < 0.1))
+                & ~flagged & catalog["detect_isPrimary"])
+
+    def test_preSelect(self):
+        catalog = self.makeCatalog()
+        np.testing.assert_array_equal(preSelect(catalog), self.expectedCuts(catalog, 50., np.inf, False))
+        np.testing.assert_array_equal(
+            preSelect(catalog, snrMin=100., snrMax=1000., extended=True, faintMagCut=20.),
+            self.expectedCuts(catalog, 100., 1000., True),
+        )
+
+
+    def test_preFilterMask(self):
+        catalog = self.makeCatalog()
+        mask = preFilter(catalog, returnMask=True)
+        np.testing.assert_array_equal(
+            mask, self.expectedCuts(catalog, 50., np.inf, False) & (catalog["base_PsfFlux_mag"] < 30.)
+        )
+        # The cuts of preSelect are those of preFilter without magnitudes
+        np.testing.assert_array_equal(mask, preSelect(catalog) & (catalog["base_PsfFlux_mag"] < 30.))
+
+        mask = preFilter(catalog, snrMin=10., brightMagCut=17., faintMagCut=21.5, returnMask=True)
+        mag = catalog["base_PsfFlux_mag"]
+        np.testing.assert_array_equal(
+            mask, self.expectedCuts(catalog, 10., np.inf, False) & (mag > 17.) & (mag < 21.5)
+        )
+        self.assertEqual(catalog.copies, [])
+
+    def test_preFilterCatalog(self):
+        """Test that only the selected sources are copied, once."""
+        catalog = self.makeCatalog()
+        mask = preFilter(catalog, snrMin=10., returnMask=True)
+        self.assertGreater(mask.sum(), 0)
+        selected = preFilter(catalog, snrMin=10.)
+        self.assertEqual(catalog.copies, [mask.sum()])
+        for name, column in catalog.columns.items():
+            np.testing.assert_array_equal(selected[name], column[mask])
+
+        subset = catalog[np.arange(len(catalog)) % 2 == 0]
+        self.assertFalse(subset.isContiguous())
+        np.testing.assert_array_equal(preFilter(subset, snrMin=10., returnMask=True), mask[::2])
+        selected = preFilter(subset, snrMin=10.)
+        self.assertEqual(catalog.copies[1:], [mask[::2].sum()])
+        np.testing.assert_array_equal(selected["base_PsfFlux_mag"],
+                                      catalog["base_PsfFlux_mag"][::2][mask[::2]])
+
+
+if __name__ == "__main__":
+    unittest.main()
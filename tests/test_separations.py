@@ -0,0 +1,209 @@
+# This file is part of faro.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (http://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Unit tests for the astrometric separation utilities.
+"""
+
+import tracemalloc
+import types
+import unittest
+import numpy as np
+import astropy.units as u
+
+from lsst.faro.utils.coord_util import sphDist
+from lsst.faro.utils.matched_catalog import MatchedCatalogArrays
+from lsst.faro.utils.separations import (annuliPairDistances,
+                                        findPairsInAnnulus,
+                                        findPairsInAnnuli,
+                                        matchVisitComputeDistance,
+                                        matchVisitComputeDistances)
+
+
+class FakeGroup(dict):
+    """Columns of the sources of one matched object."""
+
+    def __len__(self):
+        return len(self["visit"])
+
+
+class FakeGroupView:
+    """Stand-in for a `lsst.afw.table.GroupView` of matched sources."""
+
+    def __init__(self, groups):
+        self.groups = groups
+        self.ids = np.arange(1, len(groups) + 1)
+        self.schema = types.SimpleNamespace(
+            find=lambda name: types.SimpleNamespace(key=name)
+        )
+
+
+class SeparationsTest(unittest.TestCase):
+    """Test astrometric separation utility functions."""
+
+    def makePositions(self, n=1000, seed=12345):
+        """Make random positions in a small patch of sky."""
+        rng = np.random.default_rng(seed)
+        ra = rng.uniform(np.radians(30.), np.radians(31.), n)
+        dec = rng.uniform(np.radians(-0.5), np.radians(0.5), n)
+        return ra, dec
+
+    def test_findPairsInAnnulus(self):
+        """Test that the k-d tree pair search matches a brute force search."""
+        ra, dec = self.makePositions()
+        annulus = np.radians(np.array([4., 6.]) / 60.)
+
+        expected1 = []
+        expected2 = []
+        for obj1 in range(len(ra)):
+            dist = sphDist(ra[obj1], dec[obj1], ra[obj1 + 1:], dec[obj1 + 1:])
+            (objectsInAnnulus,) = np.where((annulus[0] <= dist) & (dist < annulus[1]))
+            expected1.extend([obj1] * len(objectsInAnnulus))
+            expected2.extend(objectsInAnnulus + obj1 + 1)
+
+        obj1, obj2 = findPairsInAnnulus(ra, dec, annulus, chunkSize=123)
+        self.assertGreater(len(obj1), 0)
+        np.testing.assert_array_equal(obj1, expected1)
+        np.testing.assert_array_equal(obj2, expected2)
+
+    def test_findPairsInAnnulusWrap(self):
+        """Test that pairs straddling RA=0 are found."""
+        ra = np.array([1.e-4, 2 * np.pi - 1.e-4, np.nan])
+        dec = np.zeros(3)
+        obj1, obj2 = findPairsInAnnulus(ra, dec, np.array([0., 1.e-3]))
+        np.testing.assert_array_equal(obj1, [0])
+        np.testing.assert_array_equal(obj2, [1])
+
+    def test_findPairsInAnnuli(self):
+        """Test that a single search over several annuli matches separate
+        searches."""
+        ra, dec = self.makePositions()
+        annuli = [np.radians(np.array([r - 1., r + 1.]) / 60.) for r in (5., 20., 2.)]
+
+        pairs = findPairsInAnnuli(ra, dec, annuli, chunkSize=123)
+        self.assertEqual(len(pairs), len(annuli))
+        for annulus, (obj1, obj2) in zip(annuli, pairs):
+            expected1, expected2 = findPairsInAnnulus(ra, dec, annulus)
+            self.assertGreater(len(obj1), 0)
+            np.testing.assert_array_equal(obj1, expected1)
+            np.testing.assert_array_equal(obj2, expected2)
+
+    def test_findPairsInAnnulusLarge(self):
+        """Test that an annulus as wide as the field, as for AM3, keeps the
+        candidate pairs bounded."""
+        rng = np.random.default_rng(2468)
+        n = 5000
+        ra = rng.uniform(np.radians(30.), np.radians(34.), n)
+        dec = rng.uniform(np.radians(-2.), np.radians(2.), n)
+        annulus = np.radians(np.array([199., 201.]) / 60.)
+
+        tracemalloc.start()
+        try:
+            obj1, obj2 = findPairsInAnnulus(ra, dec, annulus, maxCandidates=2**18)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        # All n*(n-1) candidate pairs at once would take several hundred MB
+        self.assertLess(peak, 64 * 2**20)
+
+        nPairs = 0
+        for i in range(n):
+            dist = sphDist(ra[i], dec[i], ra[i + 1:], dec[i + 1:])
+            nPairs += np.count_nonzero((annulus[0] <= dist) & (dist < annulus[1]))
+        self.assertGreater(len(obj1), 0)
+        self.assertEqual(len(obj1), nPairs)
+        dist = sphDist(ra[obj1], dec[obj1], ra[obj2], dec[obj2])
+        self.assertTrue(np.all((annulus[0] <= dist) & (dist < annulus[1])))
+
+        # An annulus wider than the positions has no pairs
+        ra = rng.uniform(np.radians(30.), np.radians(31.7), 20000)
+        dec = rng.uniform(np.radians(-0.85), np.radians(0.85), 20000)
+        obj1, obj2 = findPairsInAnnulus(ra, dec, annulus)
+        self.assertEqual(len(obj1), 0)
+
+    def test_annuliPairDistancesMagRange(self):
+        """Test that objects are selected by their median finite
+        magnitude, from a GroupView or from grouped arrays."""
+        rng = np.random.default_rng(4321)
+        ra, dec = self.makePositions(n=200)
+        mags = rng.uniform(16., 23., len(ra))
+        mags[:3] = 20.
+        groups = []
+        for i in range(len(ra)):
+            nVisits = rng.integers(2, 5)
+            mag = mags[i] + rng.normal(0., 0.01, nVisits)
+            if i == 0:
+                mag[:] = np.nan
+            elif i == 1:
+                mag[0] = np.inf
+            groups.append(FakeGroup({
+                "coord_ra": ra[i] + rng.normal(0., 1.e-7, nVisits),
+                "coord_dec": dec[i] + rng.normal(0., 1.e-7, nVisits),
+                "visit": np.arange(nVisits),
+                "base_PsfFlux_mag": mag,
+            }))
+        annuli = [np.array([4., 6.]) * u.arcmin, np.array([19., 21.]) * u.arcmin]
+        magRange = np.array([17., 21.5]) * u.mag
+
+        results = annuliPairDistances(FakeGroupView(groups), annuli, magRange)
+
+        inRange = [groups[i] for i in range(1, len(groups)) if 17. <= mags[i] < 21.5]
+        expected = annuliPairDistances(FakeGroupView(inRange), annuli,
+                                       np.array([-np.inf, np.inf]) * u.mag)
+        for result, reference in zip(results, expected):
+            self.assertGreater(len(result[0]), 0)
+            for values, referenceValues in zip(result, reference):
+                np.testing.assert_array_equal(values, referenceValues)
+
+        # The same objects, as grouped arrays built from the columns
+        catalog = {name: np.concatenate([group[name] for group in groups]) for name in groups[0]}
+        catalog["object"] = np.repeat(np.arange(len(groups)), [len(group) for group in groups])
+        arrays = MatchedCatalogArrays.build(catalog)
+        for result, reference in zip(annuliPairDistances(arrays, annuli, magRange), results):
+            for values, referenceValues in zip(result, reference):
+                np.testing.assert_array_equal(values, referenceValues)
+
+    def test_matchVisitComputeDistances(self):
+        """Test the batched shared-visit distances against the per-pair
+        calculation."""
+        rng = np.random.default_rng(54321)
+        counts = rng.integers(1, 10, 200)
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        visit = np.concatenate([rng.choice(np.arange(1000, 1025), n, replace=False)
+                                for n in counts])
+        ra = rng.uniform(0., 1.e-3, len(visit))
+        dec = rng.uniform(0., 1.e-3, len(visit))
+        ra[rng.random(len(ra)) < 0.05] = np.nan
+        obj1 = rng.integers(0, len(counts), 500)
+        obj2 = rng.integers(0, len(counts), 500)
+
+        distances, pairOffsets = matchVisitComputeDistances(visit, ra, dec, offsets, obj1, obj2)
+        self.assertEqual(len(pairOffsets), len(obj1) + 1)
+        for pair, (i, j) in enumerate(zip(obj1, obj2)):
+            sl1 = slice(offsets[i], offsets[i + 1])
+            sl2 = slice(offsets[j], offsets[j + 1])
+            expected = matchVisitComputeDistance(visit[sl1], ra[sl1], dec[sl1],
+                                                 visit[sl2], ra[sl2], dec[sl2])
+            np.testing.assert_array_equal(distances[pairOffsets[pair]:pairOffsets[pair + 1]],
+                                          expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
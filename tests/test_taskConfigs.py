@@ -23,10 +23,13 @@
 """
 
 import unittest
+from unittest import mock
 
+import lsst.pipe.base as pipeBase
 from lsst.faro.measurement import (AMxTask, ADxTask, AFxTask,
                                    PA1Task, PF1Task,
-                                   TExTask, AB1Task, WPerpTask)
+                                   TExTask, AB1Task, WPerpTask,
+                                   TractMatchedFusedMeasurementTask)
 
 
 class ConfigTest(unittest.TestCase):
@@ -155,6 +158,37 @@ class ConfigTest(unittest.TestCase):
         task = WPerpTask(config=expected)
         self.check_config(task, expected, default, field_list)
 
+    def test_fused_config(self):
+        """Test the default subtask configs of the fused matched task"""
+        config = TractMatchedFusedMeasurementTask.ConfigClass()
+        self.assertEqual(len(config.metrics), 23)
+        self.assertEqual(config.measure_AM3.annulus_r, 200.0)
+        self.assertEqual(config.measure_AD3_design.threshAD, 30.0)
+        self.assertEqual(config.measure_AF1_design.threshAD, 20.0)
+        self.assertEqual(config.measure_modelPhotRepGal2.selectSnrMin, 10)
+        self.assertTrue(config.measure_modelPhotRepGal2.selectExtended)
+        self.assertFalse(config.measure_modelPhotRepStar4.selectExtended)
+        self.assertEqual(config.measure_psfPhotRepStar4.magName, "slot_PsfFlux_mag")
+
+        config.metrics = ["PA1", "AM1"]
+        task = TractMatchedFusedMeasurementTask(config=config)
+        self.assertEqual(task.measure_AM1.config.annulus_r, 5.0)
+        self.assertFalse(hasattr(task, "measure_AM2"))
+
+    def test_fused_errors(self):
+        """Test that an error in one metric of the fused task does not stop
+        the others"""
+        config = TractMatchedFusedMeasurementTask.ConfigClass()
+        config.metrics = ["PA1", "PF1_design", "AM1"]
+        task = TractMatchedFusedMeasurementTask(config=config)
+        task.measure_PA1.run = mock.Mock(return_value=pipeBase.Struct(measurement="PA1 measurement"))
+        task.measure_PF1_design.run = mock.Mock(side_effect=ZeroDivisionError)
+        task.measure_AM1.run = mock.Mock(return_value=pipeBase.Struct(measurement="AM1 measurement"))
+        result = task.run(matchedCatalog=None, matchedCatalogAstrom=None)
+        self.assertEqual(result.PA1, "PA1 measurement")
+        self.assertIsNone(result.PF1_design)
+        self.assertEqual(result.AM1, "AM1 measurement")
+
 
 if __name__ == "__main__":
     unittest.main()
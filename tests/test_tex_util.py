@@ -29,7 +29,7 @@ import numpy as np
 from lsst.afw.table import SimpleCatalog
 from lsst.faro.utils.tex import (TraceSize, PsfTraceSizeDiff,
                                  E1, E2, E1Resids, E2Resids,
-                                 RhoStatistics)
+                                 RhoStatistics, CorrelationSession, corrSpin2)
 
 TESTDIR = os.path.abspath(os.path.dirname(__file__))
 DATADIR = os.path.join(TESTDIR, 'data')
@@ -125,6 +125,61 @@ class TEXUtilTest(unittest.TestCase):
         self.assertAlmostEqual(np.mean(result[4].xip), expected[4], places=7)
         self.assertAlmostEqual(np.mean(result[5].xip), expected[5], places=7)
 
+    def testSelectedRhoStats(self):
+        """Compute only the requested Rho statistics."""
+
+        cat = self.loadData()
+        treecorrKwargs = dict(nbins=5,
+                              min_sep=0.25,
+                              max_sep=1,
+                              sep_units='arcmin',
+                              brute=True)
+        rhoStatistics = RhoStatistics('slot_Shape', 'slot_PsfShape', **treecorrKwargs)
+        result = rhoStatistics(cat, rhoIndices=[2, 0])
+
+        self.assertEqual(sorted(result.keys()), [0, 2])
+        self.assertAlmostEqual(np.mean(result[0].xi), 0.2344471639428089, places=7)
+        self.assertAlmostEqual(np.mean(result[2].xip), -0.0021045081490440086, places=7)
+
+        with self.assertRaises(ValueError):
+            rhoStatistics(cat, rhoIndices=[6])
+
+    def testCorrelationSession(self):
+        """Reuse the catalog of a field between correlations."""
+
+        cat = self.loadData()
+        e1 = E1('slot_PsfShape')(cat)
+        e2 = E2('slot_PsfShape')(cat)
+        e1Res = E1Resids('slot_Shape', 'slot_PsfShape')(cat)
+        e2Res = E2Resids('slot_Shape', 'slot_PsfShape')(cat)
+        isFinite = np.isfinite(e1Res) & np.isfinite(e2Res)
+        ra = cat['coord_ra'][isFinite]
+        dec = cat['coord_dec'][isFinite]
+
+        treecorrKwargs = dict(nbins=5,
+                              min_sep=0.25,
+                              max_sep=1,
+                              sep_units='arcmin',
+                              brute=True)
+        session = CorrelationSession(ra, dec, raUnits='radians', decUnits='radians',
+                                     **treecorrKwargs)
+        session.addShear('e', e1[isFinite], e2[isFinite])
+        session.addShear('eRes', e1Res[isFinite], e2Res[isFinite])
+
+        auto = session.corrSpin2('eRes')
+        cross = session.corrSpin2('e', 'eRes')
+        self.assertIs(session.catalog('eRes'), session.catalog('eRes'))
+
+        expected = corrSpin2(ra, dec, e1Res[isFinite], e2Res[isFinite],
+                             raUnits='radians', decUnits='radians', **treecorrKwargs)
+        np.testing.assert_allclose(auto.xip, expected.xip)
+        expected = corrSpin2(ra, dec, e1[isFinite], e2[isFinite], e1Res[isFinite], e2Res[isFinite],
+                             raUnits='radians', decUnits='radians', **treecorrKwargs)
+        np.testing.assert_allclose(cross.xip, expected.xip)
+
+        with self.assertRaises(ValueError):
+            session.addShear('e', e1, e2)
+
 
 if __name__ == "__main__":
     unittest.main()